@@ -68,5 +68,19 @@ const API = {
     async getGeoDistribution(params = {}) {
         const queryString = new URLSearchParams(params).toString();
         return await this.request(`/geo-distribution${queryString ? '?' + queryString : ''}`);
+    },
+
+    // 訂閱即時推送（Server-Sent Events），handlers 以事件類型（session / alert）為鍵
+    // 回傳 EventSource，呼叫 close() 取消訂閱；斷線時瀏覽器會自動重連
+    subscribeLive(params = {}, handlers = {}) {
+        const queryString = new URLSearchParams(params).toString();
+        const source = new EventSource(`${this.baseURL}/stream${queryString ? '?' + queryString : ''}`);
+
+        for (const [eventType, handler] of Object.entries(handlers)) {
+            source.addEventListener(eventType, (event) => handler(JSON.parse(event.data)));
+        }
+        source.onerror = () => console.warn('Live feed connection lost, reconnecting...');
+
+        return source;
     }
 };
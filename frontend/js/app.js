@@ -49,11 +49,55 @@ function app() {
         successMessage: '',
         successTimer: null,
 
+        // 即時推送
+        liveFeed: null,
+        liveRefreshTimer: null,
+
         // 初始化
         async init() {
             dayjs.extend(window.dayjs_plugin_relativeTime);
             await this.loadAvailableDates();
             await this.loadData();
+            this.startLiveFeed();
+        },
+
+        // 訂閱新的會話與警報，取代輪詢
+        startLiveFeed() {
+            if (this.liveFeed || typeof EventSource === 'undefined') {
+                return;
+            }
+            const onEvent = () => this.scheduleLiveRefresh();
+            this.liveFeed = API.subscribeLive({}, { session: onEvent, alert: onEvent });
+        },
+
+        // 有新資料時重新載入目前的分頁（合併短時間內的多個事件，只在查看今天的資料時）
+        scheduleLiveRefresh(delay = 3000) {
+            const today = new Date().toISOString().split('T')[0];
+            if (this.selectedDate !== today || this.liveRefreshTimer) {
+                return;
+            }
+
+            this.liveRefreshTimer = setTimeout(async () => {
+                this.liveRefreshTimer = null;
+                try {
+                    switch (this.currentTab) {
+                        case 'dashboard':
+                            await this.loadDashboard();
+                            break;
+                        case 'sessions':
+                            // 只有在第一頁時更新，避免翻頁時內容跳動
+                            if (this.pagination.sessions.offset === 0) {
+                                await this.loadSessions();
+                            }
+                            break;
+                        case 'alerts':
+                            await this.loadAlerts();
+                            break;
+                    }
+                } catch (error) {
+                    console.error('Live refresh error:', error);
+                }
+            }, delay);
         },
 
         // 顯示錯誤訊息（自動消失）
@@ -0,0 +1,247 @@
+"""
+JSON 編解碼微基準測試
+
+以 query_api/DATA_FORMAT.md 定義的 session 格式產生合成資料，
+量測管線上每個序列化節點使用標準庫 json 與 codec 模組的耗時：
+
+1. ingestion_api  publish_sessions   原始 session   → bytes (dumps)
+2. analytics_worker process_batch    stream bytes   → dict  (loads)
+3. loader         save_to_jsonl      處理後 session → 一行 JSONL (dumps)
+4. query_api      read_jsonl_file    一行 JSONL     → dict  (loads)
+
+另外以 --stream-size 比較 sessions_stream entry 在 v1（JSON）與 v2（精簡格式）下的大小。
+
+執行：
+    python bench_codec.py                # 預設 5000 筆
+    python bench_codec.py -n 20000 -r 5
+    JSON_CODEC=msgspec python bench_codec.py
+    python bench_codec.py --stream-size
+"""
+
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+import codec
+
+ATTACK_TYPES = ["sqli", "xss", "lfi", "rfi", "cmd_exec", "php_code_injection", "index", "unknown"]
+TOOLS = ["sqlmap", "nikto", "nmap", "gobuster", None]
+COUNTRIES = [("Taiwan", "TW"), ("United States", "US"), ("China", "CN"), ("Germany", "DE"), ("Brasil", "BR")]
+
+
+def make_raw_session(index: int, rng: random.Random = random) -> Dict[str, Any]:
+    """產生一筆 agent 上傳格式的原始 session"""
+    start = datetime(2025, 10, 26) + timedelta(seconds=index * 7)
+    path_count = rng.randint(1, 12)
+    attack_types = [rng.choice(ATTACK_TYPES) for _ in range(path_count)]
+    tool = rng.choice(TOOLS)
+
+    return {
+        "sess_uuid": str(uuid.UUID(int=rng.getrandbits(128))),
+        "peer_ip": f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        "peer_port": rng.randint(1024, 65535),
+        "user_agent": f"{tool}/1.7.2" if tool else "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+        "snare_uuid": "snare-001",
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(seconds=rng.randint(0, 120))).isoformat(),
+        "attack_types": attack_types,
+        "paths": [
+            {
+                "path": f"/login.php?id={rng.randint(1, 999)} UNION SELECT username,password FROM users--",
+                "method": rng.choice(["GET", "POST", "HEAD"]),
+                "timestamp": (start + timedelta(seconds=i)).isoformat(),
+                "response_status": rng.choice([200, 404, 500]),
+                "attack_type": attack_type,
+                "headers": {
+                    "Host": "honeypot.local",
+                    "User-Agent": f"{tool}/1.7.2" if tool else "Mozilla/5.0",
+                    "Accept": "*/*",
+                    "Connection": "close"
+                },
+                "cookies": {"sess_uuid": "abc"},
+                "query_params": {"id": str(rng.randint(1, 999))},
+                "post_data": ""
+            }
+            for i, attack_type in enumerate(attack_types)
+        ]
+    }
+
+
+def make_processed_session(index: int, rng: random.Random = random) -> Dict[str, Any]:
+    """產生一筆經過 normalize → enrich → evaluate 後的完整 session"""
+    session = make_raw_session(index, rng)
+    attack_types = session["attack_types"]
+    risk_score = rng.randint(0, 100)
+    threat_level = "CRITICAL" if risk_score >= 70 else "HIGH" if risk_score >= 50 else "MEDIUM" if risk_score >= 30 else "LOW"
+    tool = session["user_agent"].split("/")[0] if "/" in session["user_agent"] and not session["user_agent"].startswith("Mozilla") else None
+    country, country_code = rng.choice(COUNTRIES)
+    processed_at = (datetime(2025, 10, 26) + timedelta(seconds=index * 7)).isoformat()
+
+    session.update({
+        "processed_at": processed_at,
+        "attack_count": {t: attack_types.count(t) for t in set(attack_types)},
+        "total_requests": len(session["paths"]),
+        "unique_attack_types": len(set(attack_types)),
+        "has_malicious_activity": True,
+        "location": {
+            "country": country, "country_code": country_code, "city": "Taipei",
+            "zip_code": "", "latitude": 25.033, "longitude": 121.5654
+        },
+        "threat_intelligence": {
+            "severity": threat_level.lower(), "confidence": 0.8,
+            "attack_categories": ["Web Application Attack", "Remote Code Execution"],
+            "is_automated": True, "is_targeted": False, "threat_actor_type": "unknown"
+        },
+        "attack_patterns": {
+            "attack_sequence": attack_types,
+            "repeated_attacks": {t: attack_types.count(t) for t in set(attack_types)},
+            "escalation_detected": False,
+            "pattern_signature": "->".join(sorted(set(attack_types)))
+        },
+        "user_agent_info": {
+            "is_bot": False, "is_scanner": tool is not None, "is_browser": tool is None,
+            "tool_identified": tool, "suspicious": tool is not None
+        },
+        "request_patterns": {
+            "http_methods": {"GET": 1, "POST": 1}, "status_codes": {"200": 1, "500": 1},
+            "unique_paths": len(session["paths"]), "path_diversity": 1.0, "has_repeated_paths": False
+        },
+        "payload_analysis": {
+            "has_sql_keywords": True, "has_xss_patterns": False, "has_command_injection": False,
+            "has_path_traversal": False, "has_encoded_content": False,
+            "suspicious_patterns": ["sql_keywords"]
+        },
+        "ip_reputation": {
+            "is_private": False, "is_tor": False, "is_vpn": False, "is_cloud": False,
+            "reputation_score": 0.5, "notes": []
+        },
+        "temporal_patterns": {
+            "duration_seconds": 12.0, "request_rate": 2.5, "time_of_day": "afternoon", "is_prolonged": False
+        },
+        "behavior_tags": ["severity:high", "automated_attack", "scanner_detected", "sql_injection_attempt"],
+        "attack_phases": ["exploitation"],
+        "risk_score": risk_score,
+        "risk_breakdown": {
+            "severity_score": 24, "complexity_score": 4, "automation_score": 13,
+            "payload_score": 5, "targeting_score": 5, "persistence_score": 0
+        },
+        "threat_level": threat_level,
+        "priority": "P2-HIGH",
+        "confidence_score": 0.83,
+        "exploitation_likelihood": "MEDIUM",
+        "impact_assessment": {
+            "confidentiality": "HIGH", "integrity": "HIGH", "availability": "NONE",
+            "scope": "APPLICATION", "financial_risk": "HIGH", "reputation_risk": "HIGH"
+        },
+        "recommendations": [
+            f"🚨 立即封鎖來源 IP: {session['peer_ip']}",
+            "📊 進行深度取證分析",
+            "🛡️ 修補 SQL 注入漏洞：使用參數化查詢",
+            "📝 記錄此事件到 SIEM 系統"
+        ],
+        "requires_review": risk_score >= 60,
+        "alert_level": threat_level if threat_level in ("CRITICAL", "HIGH") else "INFO"
+    })
+    return session
+
+
+def timeit(func: Callable[[], Any], repeat: int) -> float:
+    """回傳 repeat 次中最快的一次（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(count: int, repeat: int) -> List[Dict[str, Any]]:
+    rng = random.Random(42)
+    raw_sessions = [make_raw_session(i, rng) for i in range(count)]
+    processed_sessions = [make_processed_session(i, rng) for i in range(count)]
+
+    # 各節點的輸入資料
+    stream_payloads = [json.dumps(s).encode("utf-8") for s in raw_sessions]
+    jsonl_lines_bytes = [codec.dumps(s) for s in processed_sessions]
+    jsonl_lines_str = [json.dumps(s, ensure_ascii=False) for s in processed_sessions]
+
+    stages = [
+        (
+            "publish_sessions (dumps)",
+            lambda: [json.dumps(s).encode("utf-8") for s in raw_sessions],
+            lambda: [codec.dumps(s) for s in raw_sessions],
+        ),
+        (
+            "process_batch (loads)",
+            lambda: [json.loads(p) for p in stream_payloads],
+            lambda: [codec.loads(p) for p in stream_payloads],
+        ),
+        (
+            "save_to_jsonl (dumps)",
+            lambda: [(json.dumps(s, ensure_ascii=False) + "\n").encode("utf-8") for s in processed_sessions],
+            lambda: [codec.dumps(s) + b"\n" for s in processed_sessions],
+        ),
+        (
+            "read_jsonl_file (loads)",
+            lambda: [json.loads(line) for line in jsonl_lines_str],
+            lambda: [codec.loads(line) for line in jsonl_lines_bytes],
+        ),
+    ]
+
+    results = []
+    for name, baseline, candidate in stages:
+        t_std = timeit(baseline, repeat)
+        t_codec = timeit(candidate, repeat)
+        results.append({
+            "stage": name,
+            "stdlib_us": t_std / count * 1e6,
+            "codec_us": t_codec / count * 1e6,
+            "speedup": t_std / t_codec if t_codec else float("inf"),
+        })
+    return results
+
+
+def stream_entry_sizes(count: int) -> None:
+    """比較 v1 JSON 與 v2 精簡格式的 stream entry payload 大小"""
+    import stream_message
+
+    rng = random.Random(42)
+    raw_sessions = [make_raw_session(i, rng) for i in range(count)]
+
+    legacy = sum(len(codec.dumps(s)) for s in raw_sessions)
+
+    stream_message.STREAM_ENCODING = "compact"
+    compact = 0
+    for session in raw_sessions:
+        fields = stream_message.encode_message(session)
+        compact += sum(len(k) + len(v) for k, v in fields.items())
+        assert stream_message.decode_message({k.encode(): v for k, v in fields.items()}) == session
+
+    print(f"msgpack={stream_message.MSGPACK_AVAILABLE} zstd={stream_message.ZSTD_AVAILABLE}")
+    print(f"v1 json      : {legacy / count:8.1f} bytes/entry")
+    print(f"v2 compact   : {compact / count:8.1f} bytes/entry ({legacy / compact:.2f}x sessions per GB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON codec microbenchmark")
+    parser.add_argument("-n", "--count", type=int, default=5000, help="合成 session 數量")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每個節點重複次數（取最快）")
+    parser.add_argument("--stream-size", action="store_true", help="比較 stream entry 大小")
+    args = parser.parse_args()
+
+    if args.stream_size:
+        stream_entry_sizes(args.count)
+        return
+
+    print(f"codec backend: {codec.BACKEND}, sessions: {args.count}")
+    print(f"{'stage':<28}{'stdlib µs/op':>14}{'codec µs/op':>14}{'speedup':>10}")
+    for row in run(args.count, args.repeat):
+        print(f"{row['stage']:<28}{row['stdlib_us']:>14.2f}{row['codec_us']:>14.2f}{row['speedup']:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+JSONL 寫入基準測試
+
+比較 sessions/sec：
+- legacy：舊版 save_to_jsonl，每個 session 都 mkdir、以 append 模式開檔、json.dump 後關檔
+- writer：JsonlWriter，保持 file handle 開啟，每批次緩衝後一次寫出（可選 fsync 頻率）
+
+執行：
+    python bench_writer.py                    # 預設 20000 筆，批次 100
+    python bench_writer.py -n 50000 -b 500
+"""
+
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from bench_codec import make_processed_session
+from codec import dumps
+from jsonl_writer import JsonlWriter
+
+DATE = "2025-10-26"
+
+
+def legacy_save(data_dir: Path, session: Dict[str, Any]) -> None:
+    """舊版 save_to_jsonl 的寫入路徑"""
+    processed_dir = data_dir / "processed" / DATE
+    processed_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(processed_dir / "sessions.jsonl", "a", encoding="utf-8") as f:
+        json.dump(session, f, ensure_ascii=False)
+        f.write("\n")
+
+    alert_level = session.get('alert_level', 'INFO')
+    if alert_level in ['CRITICAL', 'HIGH']:
+        alerts_dir = data_dir / "alerts" / DATE
+        alerts_dir.mkdir(parents=True, exist_ok=True)
+        with open(alerts_dir / f"{alert_level.lower()}_alerts.jsonl", "a", encoding="utf-8") as f:
+            json.dump(session, f, ensure_ascii=False)
+            f.write("\n")
+
+
+def run_legacy(data_dir: Path, sessions: List[Dict[str, Any]]) -> float:
+    started = time.perf_counter()
+    for session in sessions:
+        legacy_save(data_dir, session)
+    return time.perf_counter() - started
+
+
+def run_writer(data_dir: Path, sessions: List[Dict[str, Any]], batch_size: int, fsync_interval_s: float) -> float:
+    writer = JsonlWriter(str(data_dir), buffered=True, fsync_interval_s=fsync_interval_s)
+    started = time.perf_counter()
+    for start in range(0, len(sessions), batch_size):
+        for session in sessions[start:start + batch_size]:
+            line = dumps(session) + b"\n"
+            writer.append(DATE, Path("processed") / DATE / "sessions.jsonl", line)
+            alert_level = session.get('alert_level', 'INFO')
+            if alert_level in ['CRITICAL', 'HIGH']:
+                writer.append(DATE, Path("alerts") / DATE / f"{alert_level.lower()}_alerts.jsonl", line)
+        writer.flush()
+    writer.close()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSONL writer benchmark")
+    parser.add_argument("-n", "--count", type=int, default=20000, help="session 數量")
+    parser.add_argument("-b", "--batch-size", type=int, default=100, help="每批次 session 數（對應 BATCH_SIZE）")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    sessions = [make_processed_session(i, rng) for i in range(args.count)]
+
+    cases = [
+        ("legacy (open per session)", lambda d: run_legacy(d, sessions)),
+        ("writer, fsync never", lambda d: run_writer(d, sessions, args.batch_size, -1)),
+        ("writer, fsync every 1s", lambda d: run_writer(d, sessions, args.batch_size, 1.0)),
+        ("writer, fsync every batch", lambda d: run_writer(d, sessions, args.batch_size, 0)),
+    ]
+
+    print(f"sessions: {args.count}, batch size: {args.batch_size}")
+    print(f"{'path':<28}{'seconds':>10}{'sessions/sec':>16}")
+    for name, func in cases:
+        data_dir = Path(tempfile.mkdtemp(prefix="bench_writer_"))
+        try:
+            elapsed = func(data_dir)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        print(f"{name:<28}{elapsed:>10.3f}{args.count / elapsed:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+HyperLogLog 基數估計模組
+
+analytics_worker 與 query_api 各保留一份相同的副本（每個服務都是獨立的 Docker build context）。
+worker 以它記錄每天每個國家的來源 IP，query_api 合併多天的 sketch 估計不重複 IP 數，
+不必保存或讀取完整的 IP 集合。
+
+- 精度 P=12（4096 個暫存器），標準誤差約 1.6%；基數小時以 linear counting 修正，幾乎是精確值
+- 合併 = 逐個暫存器取最大值，與加入順序、分成幾段無關
+- encode() 輸出 zlib 壓縮後的 base64 字串（稀疏時只有幾十個字元），可直接放進 JSON
+"""
+
+import base64
+import hashlib
+import math
+import zlib
+from typing import Iterable, Optional
+
+P = 12
+M = 1 << P
+_ALPHA = 0.7213 / (1 + 1.079 / M)
+# 暫存器值最大為 64-P+1 < 128，每個位元組的最高位元可以拿來做逐位元組比較
+_HIGH_BITS = int.from_bytes(b"\x80" * M, "big")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: Optional[bytearray] = None):
+        self.registers = registers if registers is not None else bytearray(M)
+
+    def add(self, value: str) -> None:
+        x = _hash64(value)
+        index = x >> (64 - P)
+        rest = x & ((1 << (64 - P)) - 1)
+        # 剩餘 64-P 位元中第一個 1 的位置（從 1 起算）
+        rank = (64 - P) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[str]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        # 以大整數一次比較所有暫存器：(a | 0x80) - b 的最高位元為 1 表示 a >= b
+        a = int.from_bytes(self.registers, "big")
+        b = int.from_bytes(other.registers, "big")
+        mask = ((((a | _HIGH_BITS) - b) & _HIGH_BITS) >> 7) * 0xFF
+        self.registers = bytearray(((a & mask) | (b & ~mask)).to_bytes(M, "big"))
+
+    def count(self) -> int:
+        registers = bytes(self.registers)
+        zeros = registers.count(0)
+        estimate = _ALPHA * M * M / sum(registers.count(rank) * 2.0 ** -rank for rank in range(max(registers) + 1))
+        if estimate <= 2.5 * M and zeros:
+            estimate = M * math.log(M / zeros)
+        return int(round(estimate))
+
+    def encode(self) -> str:
+        return base64.b64encode(zlib.compress(bytes(self.registers))).decode("ascii")
+
+    @classmethod
+    def decode(cls, data: str) -> "HyperLogLog":
+        registers = bytearray(zlib.decompress(base64.b64decode(data)))
+        if len(registers) != M:
+            raise ValueError(f"HyperLogLog sketch has {len(registers)} registers, expected {M}")
+        return cls(registers)
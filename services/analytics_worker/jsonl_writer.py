@@ -0,0 +1,182 @@
+"""
+JSONL 批次寫入模組
+
+保持每日檔案的 file handle 開啟，將一個批次的寫入緩衝起來，在 ACK 前一次寫出：
+- 每個檔案每批次只有一次 write()（O_APPEND，多進程同時寫入也不會交錯）
+- UTC 日期切換時關閉前一天的 handle（rotate）
+- flush() 在批次 ACK 前呼叫；fsync 依 JSONL_FSYNC_INTERVAL_S 的頻率執行
+- append() 帶 index_entry 時，寫出後在 <檔名>.idx 追加索引行（位置 + 過濾欄位，見 session_index.py）
+"""
+
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from session_index import IndexEntry, index_path, format_entries
+
+logger = logging.getLogger(__name__)
+
+# fsync 頻率（秒）：0 = 每次 flush 都 fsync，負數 = 從不 fsync（交給作業系統）
+JSONL_FSYNC_INTERVAL_S = float(os.getenv("JSONL_FSYNC_INTERVAL_S", 1.0))
+
+
+def _write_all(handle, data: bytes) -> None:
+    """無緩衝 FileIO 可能只寫出部分資料，寫到完為止"""
+    view = memoryview(data)
+    while view:
+        written = handle.write(view)
+        view = view[written:]
+
+
+class JsonlWriter:
+    """
+    以日期分區的 JSONL 追加寫入器
+
+    用法：
+        writer.append("2025-10-26", Path("processed/2025-10-26/sessions.jsonl"), line)
+        writer.flush()   # 批次結束、ACK 前
+    """
+
+    def __init__(self, base_dir: str, buffered: bool = True, fsync_interval_s: float = JSONL_FSYNC_INTERVAL_S):
+        self.base_dir = Path(base_dir)
+        self.buffered = buffered
+        self.fsync_interval_s = fsync_interval_s
+        self.date: Optional[str] = None
+
+        self._handles: Dict[Path, object] = {}
+        self._buffers: Dict[Path, List[bytes]] = {}
+        self._index_entries: Dict[Path, List[Optional[IndexEntry]]] = {}
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+
+        # 最近一次 flush 寫入的位置：{path: [(offset, length), ...]}，供索引使用
+        self.last_flush_offsets: Dict[Path, List[Tuple[int, int]]] = {}
+
+    def _get_handle(self, file_path: Path):
+        handle = self._handles.get(file_path)
+        if handle is None:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            handle = open(file_path, "ab", buffering=0)
+            self._handles[file_path] = handle
+        return handle
+
+    def rotate(self, date: str) -> None:
+        """切換日期：寫出緩衝並關閉前一天的 file handle"""
+        if date == self.date:
+            return
+        if self.date is not None:
+            self.flush(fsync=True)
+            self.close_handles()
+            logger.info(f"🔁 Rotated JSONL files: {self.date} → {date}")
+        self.date = date
+
+    def append(self, date: str, relative_path: Path, line: bytes, index_entry: Optional[IndexEntry] = None) -> None:
+        """
+        追加一行（line 需包含結尾的換行符）
+
+        buffered=False 時立即寫出（不 fsync）。
+
+        Args:
+            index_entry: 索引欄位（session_index_entry() 的結果），None 表示這一行不建立索引
+        """
+        self.rotate(date)
+        file_path = self.base_dir / relative_path
+
+        if self.buffered:
+            self._buffers.setdefault(file_path, []).append(line)
+            self._index_entries.setdefault(file_path, []).append(index_entry)
+        else:
+            handle = self._get_handle(file_path)
+            _write_all(handle, line)
+            if index_entry is not None:
+                self._write_index(file_path, [index_entry], [(handle.tell() - len(line), len(line))])
+            self._unsynced = True
+
+    def _write_index(self, file_path: Path, entries: List[Optional[IndexEntry]], positions: List[Tuple[int, int]]) -> None:
+        """資料寫出後追加索引（索引落後資料時，讀取端只是查不到尚未索引的那幾筆）"""
+        data = format_entries((entry, offset, length) for entry, (offset, length) in zip(entries, positions))
+        if data:
+            _write_all(self._get_handle(index_path(file_path)), data)
+
+    def flush(self, fsync: Optional[bool] = None) -> bool:
+        """
+        寫出所有緩衝，依頻率 fsync
+
+        Args:
+            fsync: 強制（True）或跳過（False）fsync，None 依 JSONL_FSYNC_INTERVAL_S 決定
+
+        Returns:
+            bool: 是否全部寫出成功（失敗時呼叫端不應 ACK）
+        """
+        self.last_flush_offsets = {}
+        ok = True
+
+        for file_path, lines in list(self._buffers.items()):
+            if not lines:
+                continue
+            data = b"".join(lines)
+            try:
+                handle = self._get_handle(file_path)
+                _write_all(handle, data)
+                # O_APPEND：寫入後的位置即檔尾，整段資料的起點 = 檔尾 - 長度
+                end = handle.tell()
+                offset = end - len(data)
+                positions = []
+                for line in lines:
+                    positions.append((offset, len(line)))
+                    offset += len(line)
+                self.last_flush_offsets[file_path] = positions
+
+                entries = self._index_entries.get(file_path, [])
+                if any(entry is not None for entry in entries):
+                    self._write_index(file_path, entries, positions)
+                self._unsynced = True
+            except OSError as e:
+                logger.error(f"❌ Error writing {file_path}: {e}")
+                self._close_handle(file_path)
+                ok = False
+
+        self._buffers.clear()
+        self._index_entries.clear()
+
+        if fsync is None:
+            fsync = (
+                self.fsync_interval_s >= 0
+                and time.monotonic() - self._last_fsync >= self.fsync_interval_s
+            )
+
+        if fsync and self._unsynced:
+            for file_path, handle in list(self._handles.items()):
+                try:
+                    os.fsync(handle.fileno())
+                except OSError as e:
+                    logger.error(f"❌ Error syncing {file_path}: {e}")
+                    ok = False
+            self._last_fsync = time.monotonic()
+            self._unsynced = False
+
+        return ok
+
+    def discard(self) -> None:
+        """丟棄尚未寫出的緩衝（批次處理失敗時使用）"""
+        self._buffers.clear()
+        self._index_entries.clear()
+
+    def _close_handle(self, file_path: Path) -> None:
+        handle = self._handles.pop(file_path, None)
+        if handle is not None:
+            try:
+                handle.close()
+            except OSError:
+                pass
+
+    def close_handles(self) -> None:
+        for file_path in list(self._handles):
+            self._close_handle(file_path)
+
+    def close(self) -> None:
+        """寫出緩衝、fsync 並關閉所有檔案"""
+        self.flush(fsync=True)
+        self.close_handles()
@@ -11,12 +11,124 @@ from pathlib import Path
 from typing import Dict, Any, List
 from datetime import datetime
 
+from codec import dumps, loads
+from jsonl_writer import JsonlWriter, JSONL_FSYNC_INTERVAL_S
+from parquet_store import ParquetSessionWriter, PYARROW_AVAILABLE, read_sessions as read_parquet_sessions
+from session_index import rebuild_index, session_index_entry
+from sqlite_store import SqliteSessionStore, read_sessions as read_database_sessions, list_dates
+from summary_aggregator import (
+    DailySummaryAggregator,
+    build_state,
+    render_statistics,
+    render_threat_intelligence,
+    render_dashboard,
+    render_geo,
+    render_sketches,
+    write_statistics,
+    write_threat_intelligence,
+    write_dashboard,
+    write_geo,
+    write_sketches,
+    load_partial_states,
+    bootstrap_from_sessions,
+    partials_dir
+)
+
 logger = logging.getLogger(__name__)
 
 # 配置
 DATA_DIR = os.getenv("DATA_DIR", "/app/data")
-OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "jsonl")  # jsonl, json, or database
-BATCH_WRITE = os.getenv("BATCH_WRITE", "false").lower() == "true"
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "jsonl")  # jsonl, json, parquet, or database
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join(DATA_DIR, "database", "sessions.db"))
+BATCH_WRITE = os.getenv("BATCH_WRITE", "true").lower() == "true"  # 批次緩衝，在 ACK 前一次寫出
+
+# 本進程的每日摘要聚合器（由 init_summary_aggregator 建立）
+_aggregator = None
+
+# 本進程的 JSONL 寫入器（保持 file handle 開啟）
+_writer = None
+
+# 本進程的 SQLite 儲存（OUTPUT_FORMAT=database）
+_database_store = None
+
+# 本進程的 Parquet 寫入器（OUTPUT_FORMAT=parquet，由 init_storage 建立）
+_parquet_writer = None
+_consumer_name = "worker"
+
+if OUTPUT_FORMAT == "parquet" and not PYARROW_AVAILABLE:
+    logger.warning("pyarrow not available, OUTPUT_FORMAT=parquet falling back to JSONL")
+    OUTPUT_FORMAT = "jsonl"
+
+
+def init_storage(consumer_name: str) -> None:
+    """設定本進程的消費者名稱（Parquet 檔名的一部分，每個 worker 進程呼叫一次）"""
+    global _consumer_name
+    _consumer_name = consumer_name
+
+
+def get_writer() -> JsonlWriter:
+    """取得本進程的 JSONL 寫入器"""
+    global _writer
+    if _writer is None:
+        _writer = JsonlWriter(DATA_DIR, buffered=BATCH_WRITE)
+    return _writer
+
+
+def get_parquet_writer() -> ParquetSessionWriter:
+    """取得本進程的 Parquet 寫入器"""
+    global _parquet_writer
+    if _parquet_writer is None:
+        _parquet_writer = ParquetSessionWriter(DATA_DIR, _consumer_name, fsync=JSONL_FSYNC_INTERVAL_S >= 0)
+    return _parquet_writer
+
+
+def get_database_store() -> SqliteSessionStore:
+    """取得本進程的 SQLite 儲存"""
+    global _database_store
+    if _database_store is None:
+        _database_store = SqliteSessionStore(DATABASE_PATH)
+    return _database_store
+
+
+def flush_writes() -> bool:
+    """
+    寫出本批次緩衝的資料（在批次 ACK 前呼叫）
+
+    Returns:
+        bool: 是否成功，失敗時不應 ACK
+    """
+    ok = True
+    if _database_store is not None:
+        ok = _database_store.flush() and ok
+    if _parquet_writer is not None:
+        ok = _parquet_writer.flush() and ok
+    if _writer is not None:
+        ok = _writer.flush() and ok
+    return ok
+
+
+def discard_writes() -> None:
+    """丟棄本批次尚未寫出的資料"""
+    if _database_store is not None:
+        _database_store.discard()
+    if _parquet_writer is not None:
+        _parquet_writer.discard()
+    if _writer is not None:
+        _writer.discard()
+
+
+def close_writer() -> None:
+    """寫出並關閉所有檔案（關閉前呼叫）"""
+    global _writer, _parquet_writer, _database_store
+    if _database_store is not None:
+        _database_store.close()
+        _database_store = None
+    if _parquet_writer is not None:
+        _parquet_writer.close()
+        _parquet_writer = None
+    if _writer is not None:
+        _writer.close()
+        _writer = None
 
 def read_jsonl_file(file_path: Path) -> List[Dict[str, Any]]:
     """讀取 JSONL 檔案"""
@@ -26,17 +138,41 @@ def read_jsonl_file(file_path: Path) -> List[Dict[str, Any]]:
         return sessions
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with open(file_path, 'rb') as f:
             for line in f:
                 line = line.strip()
                 if line:
-                    sessions.append(json.loads(line))
+                    sessions.append(loads(line))
         return sessions
     except Exception as e:
         logger.error(f"Error reading JSONL file {file_path}: {e}")
         return []
 
 
+def read_day_sessions(date: str) -> List[Dict[str, Any]]:
+    """讀取某天所有已保存的 session（sessions.jsonl、Parquet 檔案與資料庫）"""
+    processed_dir = Path(DATA_DIR) / "processed" / date
+    sessions = read_jsonl_file(processed_dir / "sessions.jsonl")
+    if PYARROW_AVAILABLE:
+        sessions.extend(read_parquet_sessions(processed_dir))
+    sessions.extend(read_database_sessions(Path(DATABASE_PATH), date))
+    return sessions
+
+
+def list_database_dates() -> List[str]:
+    """資料庫中有資料的日期"""
+    return list_dates(Path(DATABASE_PATH))
+
+
+def has_day_sessions(date: str) -> bool:
+    processed_dir = Path(DATA_DIR) / "processed" / date
+    if (processed_dir / "sessions.jsonl").exists():
+        return True
+    if processed_dir.exists() and any(processed_dir.glob("sessions-*.parquet")):
+        return True
+    return date in list_database_dates()
+
+
 def save_session(session: Dict[str, Any]) -> bool:
     """
     保存單個 session 資料
@@ -52,6 +188,8 @@ def save_session(session: Dict[str, Any]) -> bool:
             return save_to_jsonl(session)
         elif OUTPUT_FORMAT == "json":
             return save_to_json(session)
+        elif OUTPUT_FORMAT == "parquet":
+            return save_to_parquet(session)
         elif OUTPUT_FORMAT == "database":
             return save_to_database(session)
         else:
@@ -69,32 +207,25 @@ def save_to_jsonl(session: Dict[str, Any]) -> bool:
 
     檔案組織：
     - data/processed/YYYY-MM-DD/sessions.jsonl
+    - data/processed/YYYY-MM-DD/sessions.jsonl.idx（sess_uuid → offset / length 與過濾欄位索引）
     - data/alerts/YYYY-MM-DD/high_risk.jsonl (高風險警報)
+
+    BATCH_WRITE=true 時只寫入緩衝，由 flush_writes() 在批次 ACK 前寫出。
     """
     try:
-        # 建立目錄結構
         today = datetime.utcnow().strftime("%Y-%m-%d")
-        processed_dir = Path(DATA_DIR) / "processed" / today
-        processed_dir.mkdir(parents=True, exist_ok=True)
+        writer = get_writer()
 
-        # 主檔案：所有 session
-        main_file = processed_dir / "sessions.jsonl"
+        # 只序列化一次，主檔案與警報檔案共用
+        line = dumps(session) + b"\n"
 
-        with open(main_file, "a", encoding="utf-8") as f:
-            json.dump(session, f, ensure_ascii=False)
-            f.write("\n")
+        # 主檔案：所有 session
+        writer.append(today, Path("processed") / today / "sessions.jsonl", line, index_entry=session_index_entry(session))
 
         # 如果是高風險，額外保存到警報檔案
         alert_level = session.get('alert_level', 'INFO')
         if alert_level in ['CRITICAL', 'HIGH']:
-            alerts_dir = Path(DATA_DIR) / "alerts" / today
-            alerts_dir.mkdir(parents=True, exist_ok=True)
-
-            alert_file = alerts_dir / f"{alert_level.lower()}_alerts.jsonl"
-
-            with open(alert_file, "a", encoding="utf-8") as f:
-                json.dump(session, f, ensure_ascii=False)
-                f.write("\n")
+            writer.append(today, Path("alerts") / today / f"{alert_level.lower()}_alerts.jsonl", line)
 
         logger.debug(f"✅ Saved session {session.get('sess_uuid', 'unknown')} to JSONL")
         return True
@@ -104,6 +235,33 @@ def save_to_jsonl(session: Dict[str, Any]) -> bool:
         return False
 
 
+def save_to_parquet(session: Dict[str, Any]) -> bool:
+    """
+    保存為 Parquet 欄式格式
+
+    檔案組織：
+    - data/processed/YYYY-MM-DD/sessions-<HH>-<consumer>-s<seg>.parquet（每小時或依大小滾動）
+    - data/alerts/YYYY-MM-DD/{critical,high}_alerts.jsonl（警報仍為 JSONL）
+
+    只寫入緩衝，由 flush_writes() 在批次 ACK 前寫出一個 part 檔。
+    """
+    try:
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        get_parquet_writer().append(today, session)
+
+        alert_level = session.get('alert_level', 'INFO')
+        if alert_level in ['CRITICAL', 'HIGH']:
+            line = dumps(session) + b"\n"
+            get_writer().append(today, Path("alerts") / today / f"{alert_level.lower()}_alerts.jsonl", line)
+
+        logger.debug(f"✅ Saved session {session.get('sess_uuid', 'unknown')} to Parquet")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Error saving to Parquet: {e}", exc_info=True)
+        return False
+
+
 def save_to_json(session: Dict[str, Any]) -> bool:
     """
     保存為獨立 JSON 檔案
@@ -132,26 +290,26 @@ def save_to_json(session: Dict[str, Any]) -> bool:
 
 def save_to_database(session: Dict[str, Any]) -> bool:
     """
-    保存到資料庫（PostgreSQL/MongoDB/Elasticsearch）
+    保存到嵌入式 SQLite 資料庫（不需要外部資料庫服務）
 
-    這是一個占位實作，實際使用時需要配置資料庫連接
+    資料表：
+    - sessions：熱欄位 + 完整 session（document）
+    - session_paths / session_attack_types：子表
+    - data/alerts/YYYY-MM-DD/{critical,high}_alerts.jsonl（警報仍為 JSONL）
 
-    未來實作：
-    - PostgreSQL: 關聯式資料庫，適合結構化查詢
-    - MongoDB: 文件資料庫，適合靈活的 schema
-    - Elasticsearch: 搜尋引擎，適合全文搜尋和分析
+    只寫入緩衝，由 flush_writes() 在批次 ACK 前以一個交易寫入。
     """
     try:
-        # TODO: 實作資料庫保存邏輯
-        # 範例：
-        # import psycopg2
-        # conn = psycopg2.connect(DATABASE_URL)
-        # cursor = conn.cursor()
-        # cursor.execute("INSERT INTO sessions (...) VALUES (...)")
-        # conn.commit()
+        today = datetime.utcnow().strftime("%Y-%m-%d")
+        get_database_store().append(today, session)
 
-        logger.warning("Database storage not implemented yet, falling back to JSONL")
-        return save_to_jsonl(session)
+        alert_level = session.get('alert_level', 'INFO')
+        if alert_level in ['CRITICAL', 'HIGH']:
+            line = dumps(session) + b"\n"
+            get_writer().append(today, Path("alerts") / today / f"{alert_level.lower()}_alerts.jsonl", line)
+
+        logger.debug(f"✅ Saved session {session.get('sess_uuid', 'unknown')} to database")
+        return True
 
     except Exception as e:
         logger.error(f"❌ Error saving to database: {e}", exc_info=True)
@@ -160,7 +318,7 @@ def save_to_database(session: Dict[str, Any]) -> bool:
 
 def save_statistics(sessions: List[Dict[str, Any]]) -> bool:
     """
-    保存統計摘要
+    保存統計摘要（以完整的 session 列表重新計算）
 
     生成每日統計報告：
     - 總 session 數
@@ -168,108 +326,16 @@ def save_statistics(sessions: List[Dict[str, Any]]) -> bool:
     - 風險等級分布
     - TOP 攻擊來源 IP
     - 威脅趨勢
+
+    Worker 的批次處理走增量路徑（update_daily_summary），這裡保留給完整重算使用。
     """
     try:
         if not sessions:
             return True
 
         today = datetime.utcnow().strftime("%Y-%m-%d")
-        stats_dir = Path(DATA_DIR) / "statistics" / today
-        stats_dir.mkdir(parents=True, exist_ok=True)
-
-        # 計算統計數據
-        stats = {
-            'date': today,
-            'total_sessions': len(sessions),
-            'attack_type_distribution': {},
-            'threat_level_distribution': {},
-            'risk_score_distribution': {
-                'critical': 0,
-                'high': 0,
-                'medium': 0,
-                'low': 0,
-                'info': 0
-            },
-            'top_source_ips': {},
-            'top_user_agents': {},
-            'alert_counts': {
-                'CRITICAL': 0,
-                'HIGH': 0,
-                'MEDIUM': 0,
-                'LOW': 0,
-                'INFO': 0
-            },
-            'average_risk_score': 0.0,
-            'requires_review_count': 0
-        }
-
-        total_risk = 0
-
-        for session in sessions:
-            # 攻擊類型
-            for attack_type in session.get('attack_types', []):
-                stats['attack_type_distribution'][attack_type] = \
-                    stats['attack_type_distribution'].get(attack_type, 0) + 1
-
-            # 威脅等級
-            threat_level = session.get('threat_level', 'INFO')
-            stats['threat_level_distribution'][threat_level] = \
-                stats['threat_level_distribution'].get(threat_level, 0) + 1
-
-            # 風險分數
-            risk_score = session.get('risk_score', 0)
-            total_risk += risk_score
-
-            if risk_score >= 70:
-                stats['risk_score_distribution']['critical'] += 1
-            elif risk_score >= 50:
-                stats['risk_score_distribution']['high'] += 1
-            elif risk_score >= 30:
-                stats['risk_score_distribution']['medium'] += 1
-            elif risk_score >= 15:
-                stats['risk_score_distribution']['low'] += 1
-            else:
-                stats['risk_score_distribution']['info'] += 1
-
-            # 來源 IP
-            peer_ip = session.get('peer_ip', 'unknown')
-            stats['top_source_ips'][peer_ip] = \
-                stats['top_source_ips'].get(peer_ip, 0) + 1
-
-            # User Agent
-            user_agent = session.get('user_agent', 'unknown')
-            stats['top_user_agents'][user_agent] = \
-                stats['top_user_agents'].get(user_agent, 0) + 1
-
-            # 警報等級
-            alert_level = session.get('alert_level', 'INFO')
-            stats['alert_counts'][alert_level] = \
-                stats['alert_counts'].get(alert_level, 0) + 1
-
-            # 需要審查
-            if session.get('requires_review', False):
-                stats['requires_review_count'] += 1
-
-        # 平均風險分數
-        stats['average_risk_score'] = round(total_risk / len(sessions), 2)
-
-        # 排序 TOP 10
-        stats['top_source_ips'] = dict(sorted(
-            stats['top_source_ips'].items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:10])
-
-        stats['top_user_agents'] = dict(sorted(
-            stats['top_user_agents'].items(),
-            key=lambda x: x[1],
-            reverse=True
-        )[:10])
-
-        # 保存統計報告
-        stats_file = stats_dir / "summary.json"
-        with open(stats_file, "w", encoding="utf-8") as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2)
+        stats = render_statistics(build_state(sessions), today)
+        write_statistics(stats)
 
         logger.info(f"📊 Saved statistics: {stats['total_sessions']} sessions, avg risk: {stats['average_risk_score']}")
         return True
@@ -281,7 +347,7 @@ def save_statistics(sessions: List[Dict[str, Any]]) -> bool:
 
 def save_threat_intelligence_feed(sessions: List[Dict[str, Any]]) -> bool:
     """
-    生成威脅情報 Feed
+    生成威脅情報 Feed（以完整的 session 列表重新計算）
 
     格式：
     - IP 黑名單
@@ -293,79 +359,10 @@ def save_threat_intelligence_feed(sessions: List[Dict[str, Any]]) -> bool:
             return True
 
         today = datetime.utcnow().strftime("%Y-%m-%d")
-        intel_dir = Path(DATA_DIR) / "threat_intelligence" / today
-        intel_dir.mkdir(parents=True, exist_ok=True)
-
-        # 收集威脅情報
-        malicious_ips = set()
-        attack_signatures = set()
-        malicious_user_agents = set()
-        malicious_payloads = []
-
-        for session in sessions:
-            # 只收集高風險的情報
-            risk_score = session.get('risk_score', 0)
-            if risk_score < 50:
-                continue
-
-            # 惡意 IP
-            peer_ip = session.get('peer_ip')
-            if peer_ip and peer_ip != '0.0.0.0':
-                malicious_ips.add(peer_ip)
-
-            # 攻擊簽名
-            attack_patterns = session.get('attack_patterns', {})
-            signature = attack_patterns.get('pattern_signature', '')
-            if signature:
-                attack_signatures.add(signature)
-
-            # 掃描工具
-            ua_info = session.get('user_agent_info', {})
-            if ua_info.get('is_scanner', False):
-                user_agent = session.get('user_agent')
-                if user_agent:
-                    malicious_user_agents.add(user_agent)
-
-            # 惡意 Payload (sample)
-            payload_analysis = session.get('payload_analysis', {})
-            suspicious_patterns = payload_analysis.get('suspicious_patterns', [])
-            if suspicious_patterns:
-                for path in session.get('paths', [])[:3]:  # 只取前3個
-                    malicious_payloads.append({
-                        'path': path.get('path'),
-                        'method': path.get('method'),
-                        'attack_type': path.get('attack_type'),
-                        'patterns': suspicious_patterns
-                    })
-
-        # 保存 IP 黑名單
-        ip_blacklist_file = intel_dir / "malicious_ips.txt"
-        with open(ip_blacklist_file, "w", encoding="utf-8") as f:
-            for ip in sorted(malicious_ips):
-                f.write(f"{ip}\n")
-
-        # 保存攻擊簽名
-        signatures_file = intel_dir / "attack_signatures.txt"
-        with open(signatures_file, "w", encoding="utf-8") as f:
-            for sig in sorted(attack_signatures):
-                f.write(f"{sig}\n")
-
-        # 保存威脅情報摘要
-        intel_summary = {
-            'date': today,
-            'malicious_ips_count': len(malicious_ips),
-            'malicious_ips': list(malicious_ips),
-            'attack_signatures_count': len(attack_signatures),
-            'attack_signatures': list(attack_signatures),
-            'malicious_user_agents': list(malicious_user_agents),
-            'sample_payloads': malicious_payloads[:20]  # 只保存 20 個樣本
-        }
-
-        intel_file = intel_dir / "threat_intelligence.json"
-        with open(intel_file, "w", encoding="utf-8") as f:
-            json.dump(intel_summary, f, ensure_ascii=False, indent=2)
+        intel = render_threat_intelligence(build_state(sessions), today)
+        write_threat_intelligence(intel)
 
-        logger.info(f"🔒 Saved threat intelligence: {len(malicious_ips)} IPs, {len(attack_signatures)} signatures")
+        logger.info(f"🔒 Saved threat intelligence: {intel['malicious_ips_count']} IPs, {intel['attack_signatures_count']} signatures")
         return True
 
     except Exception as e:
@@ -456,31 +453,111 @@ def get_storage_stats() -> Dict[str, Any]:
         return {'error': str(e)}
 
 
-def update_daily_summary(date: str):
-    """讀取當天的所有 session 並重新計算統計數據"""
-    logger.info(f"🔄 Updating daily summary for {date}...")
+def init_summary_aggregator(consumer_name: str) -> DailySummaryAggregator:
+    """初始化本進程的每日摘要聚合器（每個 worker 進程呼叫一次）"""
+    global _aggregator
+    _aggregator = DailySummaryAggregator(consumer_name)
+    return _aggregator
+
+
+def update_daily_summary(date: str, sessions: List[Dict[str, Any]]) -> bool:
+    """
+    以本批次的 session 增量更新當天的統計與威脅情報（O(batch)）
+
+    Args:
+        date: 日期 (YYYY-MM-DD)
+        sessions: 本批次成功保存的 session
+    """
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = DailySummaryAggregator("worker")
+
     try:
-        # 讀取當天的所有 session
-        sessions_file = Path(DATA_DIR) / "processed" / date / "sessions.jsonl"
-        if not sessions_file.exists():
-            logger.warning(f"No session file found for {date}, cannot update summary.")
-            return
+        _aggregator.add_sessions(date, sessions)
+        return _aggregator.flush()
+    except Exception as e:
+        logger.error(f"❌ Unexpected error during daily summary update: {e}", exc_info=True)
+        return False
+
+
+def flush_daily_summary(force: bool = True) -> bool:
+    """
+    寫出尚未寫出的摘要
 
-        all_sessions = read_jsonl_file(sessions_file)
+    Args:
+        force: True（關閉前）立即寫出；False（閒置時）只在距離上次寫出超過 SUMMARY_WRITE_INTERVAL_S 時寫出
+    """
+    if _aggregator is None:
+        return True
+    return _aggregator.flush(force=force)
 
-        if not all_sessions:
-            logger.info(f"No sessions to process for {date}.")
-            return
 
-        # 重新計算並保存統計
-        stats_saved = save_statistics(all_sessions)
-        intel_saved = save_threat_intelligence_feed(all_sessions)
+def bootstrap_daily_summary(date: str) -> bool:
+    """
+    升級相容：當天已有 session 檔案但還沒有增量 checkpoint 時，完整重算一次作為起點
 
-        if stats_saved and intel_saved:
-            logger.info(f"✅ Successfully updated daily summary for {date}.")
-        else:
-            logger.error(f"❌ Failed to update daily summary for {date}.")
+    必須在 worker 開始消費前呼叫（supervisor 模式下由 supervisor 呼叫）。
+    """
+    try:
+        if not has_day_sessions(date) or load_partial_states(date):
+            return False
+
+        return bootstrap_from_sessions(date, read_day_sessions(date))
 
     except Exception as e:
-        logger.error(f"❌ Unexpected error during daily summary update: {e}", exc_info=True)
+        logger.error(f"❌ Error bootstrapping daily summary for {date}: {e}", exc_info=True)
+        return False
+
+
+def rebuild_session_index(date: str) -> bool:
+    """
+    從 sessions.jsonl 重建當天的索引（維護用，執行時應停止 worker）
+    """
+    sessions_file = Path(DATA_DIR) / "processed" / date / "sessions.jsonl"
+    if not sessions_file.exists():
+        logger.warning(f"No session file found for {date}, cannot rebuild index.")
+        return False
+
+    try:
+        count = rebuild_index(sessions_file)
+        logger.info(f"✅ Rebuilt session index for {date} ({count} entries).")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error rebuilding session index for {date}: {e}", exc_info=True)
+        return False
 
+
+def rebuild_daily_summary(date: str) -> bool:
+    """
+    讀取當天的所有 session 並完整重算統計數據（維護用，執行時應停止 worker）
+
+    會清除當天所有進程的 checkpoint，以重算結果取代。
+    """
+    logger.info(f"🔄 Rebuilding daily summary for {date}...")
+    try:
+        if not has_day_sessions(date):
+            logger.warning(f"No session file found for {date}, cannot rebuild summary.")
+            return False
+
+        all_sessions = read_day_sessions(date)
+
+        directory = partials_dir(date)
+        if directory.exists():
+            for file_path in directory.glob("*.json"):
+                file_path.unlink()
+
+        bootstrap_from_sessions(date, all_sessions)
+
+        state = build_state(all_sessions)
+        write_statistics(render_statistics(state, date))
+        write_threat_intelligence(render_threat_intelligence(state, date))
+        write_dashboard(render_dashboard(state, date))
+        write_geo(render_geo(state, date))
+        write_sketches(render_sketches(state, date))
+
+        logger.info(f"✅ Successfully rebuilt daily summary for {date} ({len(all_sessions)} sessions).")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Unexpected error during daily summary rebuild: {e}", exc_info=True)
+        return False
@@ -1,15 +1,25 @@
 import os
 import time
-import json
+import signal
 import logging
+import multiprocessing
 import redis
 from datetime import datetime
 from typing import List, Dict, Any, Tuple
 
+from stream_message import decode_message, MessageDecodeError
+from reclaimer import (
+    RECLAIM_INTERVAL_S,
+    reclaim_idle_messages,
+    update_pel_metrics,
+    dead_letter,
+    incr_metric
+)
+
 # 配置日誌
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s'
 )
 
 # 配置
@@ -20,6 +30,11 @@ CONSUMER_GROUP = os.getenv("CONSUMER_GROUP", "analytics_workers")
 CONSUMER_NAME = os.getenv("CONSUMER_NAME", "worker-1")
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", 100))
 BLOCK_MS = int(os.getenv("BLOCK_MS", 5000))  # 5 秒
+# Worker 進程數：1 = 單進程（預設），0 = CPU 核心數，N > 1 = supervisor 模式
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", 1))
+SHUTDOWN_TIMEOUT = int(os.getenv("SHUTDOWN_TIMEOUT", 30))  # 秒
+# ACK 後是否同時 XDEL（只有單一消費者組時才應開啟）
+DELETE_ACKED = os.getenv("DELETE_ACKED", "false").lower() == "true"
 
 # 連接 Redis
 redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=False)
@@ -30,6 +45,16 @@ logging.info(f"Stream: {REDIS_STREAM}")
 logging.info(f"Consumer Group: {CONSUMER_GROUP}")
 logging.info(f"Batch Size: {BATCH_SIZE}")
 
+# 收到 SIGTERM / SIGINT 後設為 True，處理完目前批次後結束
+_shutdown_requested = False
+
+
+def request_shutdown(signum, frame):
+    """信號處理：要求優雅關閉"""
+    global _shutdown_requested
+    _shutdown_requested = True
+    logging.info(f"⚠️  Received signal {signum}, stopping after current batch...")
+
 
 def create_consumer_group():
     """創建消費者組（如果不存在）"""
@@ -45,12 +70,36 @@ def create_consumer_group():
             raise
 
 
+def acknowledge_messages(msg_ids: List[bytes]) -> int:
+    """
+    以一個 pipeline 批次 ACK（以及可選的 XDEL）消息
+
+    Returns:
+        int: 成功 ACK 的數量
+    """
+    if not msg_ids:
+        return 0
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.xack(REDIS_STREAM, CONSUMER_GROUP, *msg_ids)
+        if DELETE_ACKED:
+            pipe.xdel(REDIS_STREAM, *msg_ids)
+        results = pipe.execute()
+        return results[0]
+
+    except redis.RedisError as e:
+        # 未 ACK 的消息會留在 PEL，之後由 reclaimer 重新處理
+        logging.error(f"❌ Failed to acknowledge {len(msg_ids)} messages: {e}")
+        return 0
+
+
 def process_batch(messages: List[Tuple[bytes, Dict[bytes, bytes]]]) -> int:
     """
     處理一批消息
 
     Args:
-        messages: 消息列表 [(msg_id, {b'data': b'...'}), ...]
+        messages: 消息列表 [(msg_id, {b'data': b'...'}), ...]（支援 v1 JSON 與 v2 精簡格式）
 
     Returns:
         int: 處理成功的數量
@@ -58,15 +107,28 @@ def process_batch(messages: List[Tuple[bytes, Dict[bytes, bytes]]]) -> int:
     from normalizer import normalize_session, validate_session
     from enricher import enrich_session
     from evaluator import evaluate_session
-    from loader import save_session, update_daily_summary
+    from loader import save_session, update_daily_summary, flush_writes, discard_writes
 
     processed = 0
+    saved_sessions: List[Dict[str, Any]] = []
+    # 本批次要 ACK 的消息，在所有寫入完成後一次送出
+    ack_ids: List[bytes] = []
 
     for msg_id, msg_data in messages:
+        if msg_data is None:
+            # PEL 中的消息已被 stream 的 maxlen 裁掉，沒有內容可處理
+            logging.warning(f"⚠️  Message {msg_id} no longer exists in stream, acknowledging")
+            ack_ids.append(msg_id)
+            continue
+
         try:
             # === 1. 解析資料 ===
-            data_bytes = msg_data.get(b'data', b'{}')
-            session = json.loads(data_bytes)
+            try:
+                session = decode_message(msg_data)
+            except MessageDecodeError as e:
+                # 無法解碼的消息重試也不會成功，直接移到 dead-letter stream
+                dead_letter(redis_client, msg_id, msg_data, reason=str(e))
+                continue
 
             sess_uuid = session.get('sess_uuid', 'unknown')
 
@@ -78,7 +140,7 @@ def process_batch(messages: List[Tuple[bytes, Dict[bytes, bytes]]]) -> int:
             if not is_valid:
                 logging.warning(f"⚠️  Invalid session {sess_uuid}: {error_msg}")
                 # 仍然 ACK，但標記為無效
-                redis_client.xack(REDIS_STREAM, CONSUMER_GROUP, msg_id)
+                ack_ids.append(msg_id)
                 continue
 
             # === 3. 豐富化 ===
@@ -102,46 +164,85 @@ def process_batch(messages: List[Tuple[bytes, Dict[bytes, bytes]]]) -> int:
                 )
 
                 processed += 1
+                saved_sessions.append(evaluated_session)
 
-                # ACK 消息（標記為已處理）
-                redis_client.xack(REDIS_STREAM, CONSUMER_GROUP, msg_id)
+                # 標記為待 ACK（批次結束、寫入完成後才送出）
+                ack_ids.append(msg_id)
             else:
                 logging.error(f"❌ Failed to save session {sess_uuid}")
-                # 不 ACK，允許重試
+                # 不 ACK，之後由 reclaimer 重試
+                incr_metric(redis_client, "processing_failures_total")
 
         except Exception as e:
             logging.error(f"❌ Error processing message {msg_id}: {e}", exc_info=True)
-            # 不 ACK 失敗的消息，之後可以重試
+            # 不 ACK 失敗的消息，之後由 reclaimer 重試（超過 MAX_DELIVERIES 次後進入 dead-letter）
+            incr_metric(redis_client, "processing_failures_total")
+
+    # 先寫出本批次緩衝的資料（依 JSONL_FSYNC_INTERVAL_S fsync），成功後才以一個 pipeline ACK 整批消息
+    if not flush_writes():
+        logging.error(f"❌ Failed to flush batch writes, {len(ack_ids)} messages left pending for retry")
+        discard_writes()
+        incr_metric(redis_client, "processing_failures_total", len(ack_ids))
+        return 0
+
+    acknowledge_messages(ack_ids)
 
-    # 在處理完批次後更新每日摘要
-    if processed > 0:
+    # 在處理完批次後增量更新每日摘要（只處理本批次的 session）
+    if saved_sessions:
         today = datetime.utcnow().strftime("%Y-%m-%d")
-        update_daily_summary(today)
+        update_daily_summary(today, saved_sessions)
 
     return processed
 
 
-def main_loop():
+def main_loop(consumer_name: str = CONSUMER_NAME):
     """主循環：持續消費消息"""
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+
+    from loader import init_storage, init_summary_aggregator, flush_daily_summary, close_writer
+    init_storage(consumer_name)
+    init_summary_aggregator(consumer_name)
+
     create_consumer_group()
 
-    last_id = '>'  # > 表示只讀取新消息
+    # 先從 0 開始讀取自己 PEL 中尚未 ACK 的消息（重啟前未完成、或 rebalance 分配過來的），
+    # 讀完後切換為 > 只讀取新消息
+    last_id = '0'
     total_processed = 0
+    next_reclaim = time.monotonic() + RECLAIM_INTERVAL_S
 
-    logging.info(f"🚀 Worker started, waiting for messages...")
+    logging.info(f"🚀 Worker {consumer_name} started, waiting for messages...")
 
-    while True:
+    while not _shutdown_requested:
         try:
+            # 定期回收閒置的 pending 消息（失敗未 ACK、或已停止的消費者留下的）
+            if last_id == '>' and time.monotonic() >= next_reclaim:
+                next_reclaim = time.monotonic() + RECLAIM_INTERVAL_S
+
+                reclaimed = reclaim_idle_messages(redis_client, consumer_name, count=BATCH_SIZE)
+                if reclaimed:
+                    processed = process_batch(reclaimed)
+                    total_processed += processed
+                    logging.info(f"♻️  Retried {processed}/{len(reclaimed)} reclaimed messages")
+
+                update_pel_metrics(redis_client)
+
             # 批次讀取消息
             # XREADGROUP 會阻塞直到有新消息或超時
             messages = redis_client.xreadgroup(
                 CONSUMER_GROUP,
-                CONSUMER_NAME,
+                consumer_name,
                 {REDIS_STREAM: last_id},
                 count=BATCH_SIZE,
-                block=BLOCK_MS
+                block=BLOCK_MS if last_id == '>' else None
             )
 
+            if last_id != '>' and not any(stream_messages for _, stream_messages in messages or []):
+                logging.info(f"Pending entries of {consumer_name} drained, switching to new messages")
+                last_id = '>'
+                continue
+
             if messages:
                 # messages 格式: [(stream_name, [(msg_id, msg_data), ...])]
                 for stream_name, stream_messages in messages:
@@ -154,22 +255,166 @@ def main_loop():
 
                         logging.info(f"✅ Processed {processed}/{len(stream_messages)} messages (Total: {total_processed})")
 
+                        if last_id != '>':
+                            # 讀取歷史 PEL 時往後推進，避免失敗的消息被重複讀取
+                            last_id = stream_messages[-1][0]
+
             else:
-                # 超時，沒有新消息
+                # 超時，沒有新消息；把最後幾個批次還沒寫出的摘要寫出
                 logging.debug(f"No new messages, waiting...")
+                flush_daily_summary(force=False)
 
         except redis.RedisError as e:
             logging.error(f"❌ Redis error: {e}")
             time.sleep(5)  # 錯誤時等待 5 秒後重試
 
-        except KeyboardInterrupt:
-            logging.info("⚠️  Worker stopping...")
-            break
-
         except Exception as e:
             logging.error(f"❌ Unexpected error: {e}", exc_info=True)
             time.sleep(5)
 
+    close_writer()
+    flush_daily_summary()
+    logging.info(f"👋 Worker {consumer_name} stopped (Total: {total_processed})")
+
+
+def get_pool_consumer_names(processes: int) -> List[str]:
+    """supervisor 模式下各進程的消費者名稱：worker-1-1, worker-1-2, ..."""
+    if processes <= 1:
+        return [CONSUMER_NAME]
+    return [f"{CONSUMER_NAME}-{i}" for i in range(1, processes + 1)]
+
+
+def rebalance_pending(active_names: List[str]) -> int:
+    """
+    將不再使用的消費者（例如縮減進程數後的 worker-1-4）PEL 中的消息
+    平均 XCLAIM 給目前的消費者，並刪除舊消費者
+
+    只處理與 CONSUMER_NAME 同前綴的消費者，不會動到其他主機上的 worker。
+
+    Returns:
+        int: 重新分配的消息數量
+    """
+    reassigned = 0
+    target_index = 0
+
+    try:
+        consumers = redis_client.xinfo_consumers(REDIS_STREAM, CONSUMER_GROUP)
+
+        for consumer in consumers:
+            name = consumer['name'].decode() if isinstance(consumer['name'], bytes) else consumer['name']
+            if name in active_names:
+                continue
+            if name != CONSUMER_NAME and not name.startswith(f"{CONSUMER_NAME}-"):
+                continue
+
+            while True:
+                pending = redis_client.xpending_range(
+                    REDIS_STREAM, CONSUMER_GROUP,
+                    min='-', max='+', count=BATCH_SIZE, consumername=name
+                )
+                if not pending:
+                    break
+
+                # 依序（round-robin）分配給目前的消費者，每個目標一次 XCLAIM
+                assignments: Dict[str, List[bytes]] = {}
+                for entry in pending:
+                    target = active_names[target_index % len(active_names)]
+                    target_index += 1
+                    assignments.setdefault(target, []).append(entry['message_id'])
+
+                for target, message_ids in assignments.items():
+                    redis_client.xclaim(
+                        REDIS_STREAM, CONSUMER_GROUP, target,
+                        min_idle_time=0, message_ids=message_ids, justid=True
+                    )
+                    reassigned += len(message_ids)
+
+            redis_client.xgroup_delconsumer(REDIS_STREAM, CONSUMER_GROUP, name)
+            logging.info(f"♻️  Removed stale consumer {name}")
+
+    except redis.ResponseError:
+        # Stream 或消費者組尚不存在
+        return 0
+    except redis.RedisError as e:
+        logging.error(f"❌ Redis error while rebalancing pending entries: {e}")
+
+    if reassigned:
+        logging.info(f"♻️  Reassigned {reassigned} pending messages to {len(active_names)} consumers")
+
+    return reassigned
+
+
+def bootstrap_summary():
+    """升級相容：在任何 worker 開始消費前，為當天建立增量摘要的起點"""
+    from loader import bootstrap_daily_summary
+    bootstrap_daily_summary(datetime.utcnow().strftime("%Y-%m-%d"))
+
+
+def _run_worker_process(consumer_name: str):
+    """子進程入口"""
+    global _shutdown_requested
+    _shutdown_requested = False
+    main_loop(consumer_name)
+
+
+def run_supervisor(processes: int):
+    """
+    Supervisor 模式：fork N 個 worker 進程，每個進程是消費者組中的獨立消費者
+
+    - 啟動前將舊消費者的 pending 消息重新分配給目前的消費者
+    - 子進程異常退出時自動重啟（沿用相同的消費者名稱，重新處理自己的 PEL）
+    - 收到 SIGTERM / SIGINT 時通知所有子進程處理完目前批次後結束
+    """
+    signal.signal(signal.SIGTERM, request_shutdown)
+    signal.signal(signal.SIGINT, request_shutdown)
+
+    create_consumer_group()
+
+    names = get_pool_consumer_names(processes)
+    rebalance_pending(names)
+    bootstrap_summary()
+
+    workers: Dict[str, multiprocessing.Process] = {}
+
+    def spawn(name: str):
+        process = multiprocessing.Process(target=_run_worker_process, args=(name,), name=name)
+        process.start()
+        workers[name] = process
+        logging.info(f"🚀 Started worker process {name} (pid {process.pid})")
+
+    for name in names:
+        spawn(name)
+
+    while not _shutdown_requested:
+        time.sleep(1)
+        for name, process in list(workers.items()):
+            if not process.is_alive() and not _shutdown_requested:
+                logging.error(f"❌ Worker {name} exited with code {process.exitcode}, restarting...")
+                spawn(name)
+
+    # 優雅關閉：通知子進程並等待
+    logging.info(f"⚠️  Supervisor stopping {len(workers)} workers...")
+    for process in workers.values():
+        if process.is_alive():
+            process.terminate()  # SIGTERM → 子進程處理完目前批次後退出
+
+    deadline = time.time() + SHUTDOWN_TIMEOUT
+    for name, process in workers.items():
+        process.join(max(0, deadline - time.time()))
+        if process.is_alive():
+            logging.warning(f"Worker {name} did not stop in {SHUTDOWN_TIMEOUT}s, killing")
+            process.kill()
+            process.join()
+
+    logging.info("👋 Supervisor stopped")
+
 
 if __name__ == "__main__":
-    main_loop()
+    processes = WORKER_PROCESSES if WORKER_PROCESSES > 0 else (os.cpu_count() or 1)
+
+    if processes > 1:
+        run_supervisor(processes)
+    else:
+        rebalance_pending([CONSUMER_NAME])
+        bootstrap_summary()
+        main_loop()
@@ -0,0 +1,69 @@
+"""
+維護指令
+
+執行時應先停止 worker，避免與正在寫入的資料衝突。
+
+用法：
+    python maintenance.py rebuild-summary 2025-10-26 [2025-10-27 ...]
+    python maintenance.py rebuild-summary --all
+    python maintenance.py rebuild-index 2025-10-26 [2025-10-27 ...]
+    python maintenance.py rebuild-index --all
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import List
+
+from loader import DATA_DIR, rebuild_daily_summary, rebuild_session_index, list_database_dates
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+
+
+def list_processed_dates() -> List[str]:
+    """列出 processed/ 下所有日期目錄與資料庫中的日期"""
+    dates = set(list_database_dates())
+    processed_dir = Path(DATA_DIR) / "processed"
+    if processed_dir.exists():
+        dates.update(d.name for d in processed_dir.iterdir() if d.is_dir())
+    return sorted(dates)
+
+
+def resolve_dates(args) -> List[str]:
+    return list_processed_dates() if args.all else args.dates
+
+
+def cmd_rebuild_summary(args) -> int:
+    failed = [date for date in resolve_dates(args) if not rebuild_daily_summary(date)]
+    return 1 if failed else 0
+
+
+def cmd_rebuild_index(args) -> int:
+    failed = [date for date in resolve_dates(args) if not rebuild_session_index(date)]
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Analytics worker maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_summary = subparsers.add_parser("rebuild-summary", help="從已保存的 session（JSONL / Parquet / 資料庫）完整重算每日摘要")
+    rebuild_summary.add_argument("dates", nargs="*", help="日期 (YYYY-MM-DD)")
+    rebuild_summary.add_argument("--all", action="store_true", help="所有日期")
+    rebuild_summary.set_defaults(func=cmd_rebuild_summary)
+
+    rebuild_index = subparsers.add_parser("rebuild-index", help="從 sessions.jsonl 重建 session 索引（UUID 與過濾欄位）")
+    rebuild_index.add_argument("dates", nargs="*", help="日期 (YYYY-MM-DD)")
+    rebuild_index.add_argument("--all", action="store_true", help="所有日期")
+    rebuild_index.set_defaults(func=cmd_rebuild_index)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+"""
+Parquet 欄式儲存模組（OUTPUT_FORMAT=parquet）
+
+processed/<date>/ 下的檔案組織：
+- sessions-<HH>-<consumer>-s<seg>-p<part>.parquet：每批次 flush 寫出一個完整的 part 檔（ACK 前）
+- sessions-<HH>-<consumer>-s<seg>.parquet：segment 滾動時把同一 segment 的 part 合併成一個檔案
+
+segment 在以下情況滾動（合併）：
+- UTC 小時改變（每小時至少一個檔案）
+- 列數達到 PARQUET_ROLL_ROWS，或 part 數達到 PARQUET_MAX_PARTS
+- 日期切換、worker 關閉
+
+讀取規則（query_api/parquet_reader.py 相同）：同一 segment 的合併檔存在時，忽略它的 part 檔。
+合併時先寫入暫存檔再 rename，之後才刪除 part，讀取端在任何時間點都不會重複或遺漏資料。
+
+熱欄位（risk_score、threat_level、peer_ip、attack_types、processed_at、tool_identified 等）
+為獨立欄位，完整的 session 以緊湊 JSON 存在 document 欄位。
+"""
+
+import os
+import re
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# segment 滾動門檻
+PARQUET_ROLL_ROWS = int(os.getenv("PARQUET_ROLL_ROWS", 100000))
+PARQUET_MAX_PARTS = int(os.getenv("PARQUET_MAX_PARTS", 100))
+PARQUET_COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+
+# sessions-<HH>-<consumer>-s<seg>[-p<part>].parquet
+FILE_PATTERN = re.compile(r"^sessions-(\d{2})-(.+)-s(\d{4,})(?:-p(\d{5,}))?\.parquet$")
+
+if PYARROW_AVAILABLE:
+    SCHEMA = pa.schema([
+        ("sess_uuid", pa.string()),
+        ("processed_at", pa.string()),
+        ("peer_ip", pa.string()),
+        ("peer_port", pa.int32()),
+        ("user_agent", pa.string()),
+        ("threat_level", pa.string()),
+        ("alert_level", pa.string()),
+        ("risk_score", pa.int32()),
+        ("attack_types", pa.list_(pa.string())),
+        ("tool_identified", pa.string()),
+        ("is_scanner", pa.bool_()),
+        ("total_requests", pa.int32()),
+        ("has_malicious_activity", pa.bool_()),
+        ("requires_review", pa.bool_()),
+        ("country_code", pa.string()),
+        ("document", pa.binary()),
+    ])
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def session_to_row(session: Dict[str, Any]) -> Dict[str, Any]:
+    """把 session 攤平成一列：熱欄位 + 完整文件"""
+    ua_info = session.get('user_agent_info') or {}
+    location = session.get('location') or {}
+    return {
+        "sess_uuid": session.get('sess_uuid'),
+        "processed_at": session.get('processed_at'),
+        "peer_ip": session.get('peer_ip'),
+        "peer_port": _to_int(session.get('peer_port')),
+        "user_agent": session.get('user_agent'),
+        "threat_level": session.get('threat_level'),
+        "alert_level": session.get('alert_level'),
+        "risk_score": _to_int(session.get('risk_score')),
+        "attack_types": list(session.get('attack_types') or []),
+        "tool_identified": ua_info.get('tool_identified'),
+        "is_scanner": ua_info.get('is_scanner'),
+        "total_requests": _to_int(session.get('total_requests')),
+        "has_malicious_activity": session.get('has_malicious_activity'),
+        "requires_review": session.get('requires_review'),
+        "country_code": (location.get('country_code') or None),
+        "document": dumps(session),
+    }
+
+
+def segment_name(hour: str, consumer: str, seg: int) -> str:
+    return f"sessions-{hour}-{consumer}-s{seg:04d}.parquet"
+
+
+def part_name(hour: str, consumer: str, seg: int, part: int) -> str:
+    return f"sessions-{hour}-{consumer}-s{seg:04d}-p{part:05d}.parquet"
+
+
+def list_parquet_files(date_dir: Path) -> List[Path]:
+    """
+    列出目錄下可讀取的 Parquet 檔案
+
+    合併檔存在的 segment 只回傳合併檔，否則回傳該 segment 的所有 part 檔。
+    """
+    if not date_dir.exists():
+        return []
+
+    segments: Dict[Tuple[str, str, str], Path] = {}
+    parts: Dict[Tuple[str, str, str], List[Path]] = {}
+    for file_path in date_dir.iterdir():
+        match = FILE_PATTERN.match(file_path.name)
+        if not match:
+            continue
+        hour, consumer, seg, part = match.groups()
+        key = (hour, consumer, seg)
+        if part is None:
+            segments[key] = file_path
+        else:
+            parts.setdefault(key, []).append(file_path)
+
+    files = list(segments.values())
+    for key, part_files in parts.items():
+        if key not in segments:
+            files.extend(part_files)
+    return sorted(files, key=lambda p: p.name)
+
+
+def read_sessions(date_dir: Path) -> List[Dict[str, Any]]:
+    """讀取目錄下所有 Parquet 檔案中的完整 session（只讀 document 欄位）"""
+    sessions = []
+    for file_path in list_parquet_files(date_dir):
+        try:
+            table = pq.read_table(file_path, columns=["document"])
+        except FileNotFoundError:
+            # 讀取途中 part 被合併刪除，合併檔會在下一次列出時出現
+            continue
+        for document in table.column("document").to_pylist():
+            sessions.append(loads(document))
+    return sessions
+
+
+def _write_table_atomic(table, file_path: Path, fsync: bool) -> None:
+    """先寫入暫存檔再 rename，讀取端不會看到寫到一半的檔案"""
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        pq.write_table(table, f, compression=PARQUET_COMPRESSION)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+class ParquetSessionWriter:
+    """
+    以日期分區的 Parquet 寫入器（每個 worker 進程一個）
+
+    用法：
+        writer.append("2025-10-26", session)
+        writer.flush()   # 批次結束、ACK 前：寫出一個 part 檔
+    """
+
+    def __init__(self, base_dir: str, consumer_name: str, fsync: bool = True,
+                 roll_rows: int = PARQUET_ROLL_ROWS, max_parts: int = PARQUET_MAX_PARTS):
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("pyarrow is not installed")
+
+        self.base_dir = Path(base_dir)
+        self.consumer_name = consumer_name
+        self.fsync = fsync
+        self.roll_rows = roll_rows
+        self.max_parts = max_parts
+
+        self.date: Optional[str] = None
+        self.hour: Optional[str] = None
+        self.seg = 0
+        self._parts: List[Path] = []
+        self._segment_rows = 0
+        self._rows: List[Dict[str, Any]] = []
+        # 日期切換時寫出前一天的緩衝失敗，需由本批次的 flush() 回報
+        self._flush_failed = False
+
+    def _date_dir(self, date: str) -> Path:
+        return self.base_dir / "processed" / date
+
+    def _open_date(self, date: str) -> None:
+        """
+        開始寫入某天：合併本消費者上次未合併的 part（例如 worker 當機），
+        segment 編號從既有檔案的最大值之後繼續
+        """
+        date_dir = self._date_dir(date)
+        date_dir.mkdir(parents=True, exist_ok=True)
+
+        max_seg = -1
+        leftovers: Dict[Tuple[str, int], List[Path]] = {}
+        segments = set()
+        for file_path in date_dir.iterdir():
+            match = FILE_PATTERN.match(file_path.name)
+            if not match or match.group(2) != self.consumer_name:
+                continue
+            hour, seg, part = match.group(1), int(match.group(3)), match.group(4)
+            max_seg = max(max_seg, seg)
+            if part is None:
+                segments.add((hour, seg))
+            else:
+                leftovers.setdefault((hour, seg), []).append(file_path)
+
+        for (hour, seg), part_files in leftovers.items():
+            if (hour, seg) in segments:
+                # 合併檔已寫出，只是還沒刪除 part
+                for file_path in part_files:
+                    file_path.unlink(missing_ok=True)
+            else:
+                self._compact(date_dir / segment_name(hour, self.consumer_name, seg), sorted(part_files))
+
+        self.date = date
+        self.seg = max_seg + 1
+        self.hour = None
+        self._parts = []
+        self._segment_rows = 0
+
+    def append(self, date: str, session: Dict[str, Any]) -> None:
+        if date != self.date:
+            if not self.flush():
+                self._flush_failed = True
+            self.roll()
+            self._open_date(date)
+        self._rows.append(session_to_row(session))
+
+    def flush(self) -> bool:
+        """
+        把緩衝的列寫成一個 part 檔
+
+        Returns:
+            bool: 是否成功（失敗時呼叫端不應 ACK）
+        """
+        failed, self._flush_failed = self._flush_failed, False
+        if not self._rows:
+            return not failed
+
+        rows = self._rows
+        self._rows = []
+        try:
+            hour = datetime.utcnow().strftime("%H")
+            if self.hour is not None and hour != self.hour:
+                self.roll()
+            if self.hour is None:
+                self.hour = hour
+
+            file_path = self._date_dir(self.date) / part_name(self.hour, self.consumer_name, self.seg, len(self._parts))
+            table = pa.Table.from_pylist(rows, schema=SCHEMA)
+            _write_table_atomic(table, file_path, self.fsync)
+
+            self._parts.append(file_path)
+            self._segment_rows += len(rows)
+
+            if self._segment_rows >= self.roll_rows or len(self._parts) >= self.max_parts:
+                self.roll()
+            return not failed
+
+        except Exception as e:
+            logger.error(f"❌ Error writing Parquet part for {self.date}: {e}", exc_info=True)
+            return False
+
+    def discard(self) -> None:
+        """丟棄尚未寫出的緩衝（批次處理失敗時使用）"""
+        self._rows = []
+
+    def _compact(self, segment_path: Path, part_files: List[Path]) -> bool:
+        try:
+            tables = [pq.read_table(file_path) for file_path in part_files]
+            _write_table_atomic(pa.concat_tables(tables), segment_path, self.fsync)
+        except Exception as e:
+            # part 檔仍然可讀，不影響資料，只是檔案數較多
+            logger.error(f"❌ Error compacting Parquet segment {segment_path.name}: {e}")
+            return False
+
+        for file_path in part_files:
+            file_path.unlink(missing_ok=True)
+        return True
+
+    def roll(self) -> None:
+        """結束目前的 segment：把 part 合併成一個檔案，之後寫入下一個 segment"""
+        if self._parts:
+            started = time.monotonic()
+            segment_path = self._date_dir(self.date) / segment_name(self.hour, self.consumer_name, self.seg)
+            if self._compact(segment_path, self._parts):
+                logger.info(
+                    f"🗜️  Compacted {len(self._parts)} Parquet parts into {segment_path.name} "
+                    f"({self._segment_rows} rows, {time.monotonic() - started:.2f}s)"
+                )
+            self.seg += 1
+
+        self.hour = None
+        self._parts = []
+        self._segment_rows = 0
+
+    def close(self) -> None:
+        """寫出緩衝並合併目前的 segment"""
+        self.flush()
+        self.roll()
@@ -0,0 +1,174 @@
+"""
+Pending 消息回收模組
+
+負責處理消費者組 PEL（Pending Entries List）中卡住的消息：
+- 定期以 XAUTOCLAIM 認領閒置超過 RECLAIM_MIN_IDLE_MS 的消息（包含已停止的消費者留下的）
+- 投遞次數超過 MAX_DELIVERIES 的毒消息移到 dead-letter stream 並 ACK
+- 將回收 / 重試 / dead-letter 計數與 PEL 大小寫入 Redis hash，供 /stats 查詢
+"""
+
+import os
+import time
+import logging
+from typing import List, Dict, Tuple, Optional
+
+import redis
+
+logger = logging.getLogger(__name__)
+
+# 配置
+REDIS_STREAM = os.getenv("REDIS_STREAM", "sessions_stream")
+CONSUMER_GROUP = os.getenv("CONSUMER_GROUP", "analytics_workers")
+RECLAIM_INTERVAL_S = int(os.getenv("RECLAIM_INTERVAL_S", 30))
+RECLAIM_MIN_IDLE_MS = int(os.getenv("RECLAIM_MIN_IDLE_MS", 60000))  # 1 分鐘
+MAX_DELIVERIES = int(os.getenv("MAX_DELIVERIES", 5))
+DEAD_LETTER_STREAM = os.getenv("DEAD_LETTER_STREAM", f"{REDIS_STREAM}:dead_letter")
+DEAD_LETTER_MAXLEN = int(os.getenv("DEAD_LETTER_MAXLEN", 10000))
+METRICS_KEY = os.getenv("WORKER_METRICS_KEY", f"{REDIS_STREAM}:worker_metrics")
+
+Message = Tuple[bytes, Dict[bytes, bytes]]
+
+
+def incr_metric(client: redis.Redis, field: str, amount: int = 1) -> None:
+    """累加 worker 指標（失敗時只記錄，不影響處理流程）"""
+    if amount <= 0:
+        return
+    try:
+        client.hincrby(METRICS_KEY, field, amount)
+    except redis.RedisError as e:
+        logger.debug(f"Failed to update metric {field}: {e}")
+
+
+def dead_letter(
+    client: redis.Redis,
+    msg_id: bytes,
+    fields: Optional[Dict[bytes, bytes]],
+    reason: str,
+    deliveries: int = 0,
+    consumer_name: str = ""
+) -> bool:
+    """
+    將消息移到 dead-letter stream 並 ACK 原消息
+
+    保留原始欄位，另外加上 dlq_* 欄位記錄來源與原因。
+    """
+    entry = dict(fields or {})
+    entry.update({
+        b"dlq_original_id": msg_id,
+        b"dlq_reason": reason.encode("utf-8", errors="replace")[:1024],
+        b"dlq_deliveries": str(deliveries).encode(),
+        b"dlq_consumer": consumer_name.encode(),
+        b"dlq_at": str(int(time.time())).encode()
+    })
+
+    try:
+        pipe = client.pipeline(transaction=True)
+        pipe.xadd(DEAD_LETTER_STREAM, entry, maxlen=DEAD_LETTER_MAXLEN)
+        pipe.xack(REDIS_STREAM, CONSUMER_GROUP, msg_id)
+        pipe.hincrby(METRICS_KEY, "dead_lettered_total", 1)
+        pipe.execute()
+        logger.warning(f"☠️  Message {msg_id} moved to {DEAD_LETTER_STREAM}: {reason}")
+        return True
+    except redis.RedisError as e:
+        logger.error(f"❌ Failed to dead-letter message {msg_id}: {e}")
+        return False
+
+
+def get_delivery_counts(client: redis.Redis, consumer_name: str, messages: List[Message]) -> Dict[bytes, int]:
+    """
+    查詢消息的投遞次數（XPENDING 的 times_delivered）
+
+    每個 ID 各查一次（同一個 pipeline）：以範圍查詢時，同一消費者在這些 ID 之間的其他 pending
+    消息也會被算進 count，部分認領的消息會查不到。
+    """
+    if not messages:
+        return {}
+
+    pipe = client.pipeline(transaction=False)
+    for msg_id, _ in messages:
+        pipe.xpending_range(
+            REDIS_STREAM, CONSUMER_GROUP,
+            min=msg_id, max=msg_id, count=1, consumername=consumer_name
+        )
+
+    counts: Dict[bytes, int] = {}
+    for pending in pipe.execute():
+        for entry in pending:
+            counts[entry['message_id']] = entry['times_delivered']
+    return counts
+
+
+def reclaim_idle_messages(client: redis.Redis, consumer_name: str, count: int = 100) -> List[Message]:
+    """
+    以 XAUTOCLAIM 認領閒置的 pending 消息
+
+    超過 MAX_DELIVERIES 的消息直接移到 dead-letter stream，其餘回傳給呼叫端重新處理。
+
+    Returns:
+        List: 需要重新處理的消息 [(msg_id, fields), ...]
+    """
+    to_retry: List[Message] = []
+    start_id = "0-0"
+
+    while True:
+        result = client.xautoclaim(
+            REDIS_STREAM, CONSUMER_GROUP, consumer_name,
+            min_idle_time=RECLAIM_MIN_IDLE_MS, start_id=start_id, count=count
+        )
+        # Redis 7: [next_start_id, messages, deleted_ids]；Redis 6.2: [next_start_id, messages]
+        next_start_id, claimed = result[0], result[1]
+        deleted = result[2] if len(result) > 2 else []
+
+        if deleted:
+            # 已被 maxlen 裁掉的消息，Redis 會自動從 PEL 移除
+            incr_metric(client, "reclaimed_deleted_total", len(deleted))
+
+        live = [(msg_id, fields) for msg_id, fields in claimed if msg_id is not None and fields is not None]
+        gone = [msg_id for msg_id, fields in claimed if msg_id is not None and fields is None]
+        if gone:
+            client.xack(REDIS_STREAM, CONSUMER_GROUP, *gone)
+        # Redis 6.2 以 nil 表示已刪除的消息（redis-py 解析為 (None, None)），沒有 ID 可以 ACK
+        missing = sum(1 for msg_id, _ in claimed if msg_id is None)
+        incr_metric(client, "reclaimed_deleted_total", len(gone) + missing)
+
+        if live:
+            deliveries = get_delivery_counts(client, consumer_name, live)
+            for msg_id, fields in live:
+                times = deliveries.get(msg_id, 0)
+                if times > MAX_DELIVERIES:
+                    dead_letter(
+                        client, msg_id, fields,
+                        reason=f"exceeded {MAX_DELIVERIES} deliveries",
+                        deliveries=times, consumer_name=consumer_name
+                    )
+                else:
+                    to_retry.append((msg_id, fields))
+
+        if next_start_id in (b"0-0", "0-0") or len(to_retry) >= count:
+            break
+        start_id = next_start_id
+
+    if to_retry:
+        incr_metric(client, "reclaimed_total", len(to_retry))
+        logger.info(f"♻️  Reclaimed {len(to_retry)} idle messages for {consumer_name}")
+
+    return to_retry
+
+
+def update_pel_metrics(client: redis.Redis) -> Dict[str, int]:
+    """記錄目前的 PEL 大小與 dead-letter stream 長度"""
+    try:
+        summary = client.xpending(REDIS_STREAM, CONSUMER_GROUP)
+        pel_size = summary.get('pending', 0) if isinstance(summary, dict) else 0
+        dead_letter_length = client.xlen(DEAD_LETTER_STREAM)
+
+        metrics = {
+            "pel_size": pel_size,
+            "dead_letter_length": dead_letter_length,
+            "pel_updated_at": int(time.time())
+        }
+        client.hset(METRICS_KEY, mapping=metrics)
+        return metrics
+    except redis.RedisError as e:
+        logger.debug(f"Failed to update PEL metrics: {e}")
+        return {}
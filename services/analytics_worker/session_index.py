@@ -0,0 +1,105 @@
+"""
+sess_uuid → 位置索引與過濾欄位（sidecar）
+
+每個 JSONL 檔案旁有一個 <檔名>.idx（例如 processed/2025-10-26/sessions.jsonl.idx），
+每行一筆，以 tab 分隔，日期與檔案由索引檔的位置決定：
+
+    sess_uuid  offset  length  threat_level  risk_score  requires_review  peer_ip  processed_at  attack_types
+
+- 由 JsonlWriter 在寫出資料後追加（只追加，O_APPEND，多進程安全）
+- attack_types 以逗號分隔；只有前三欄的行是舊版格式（只能用來查 UUID）
+- Query API 從這些欄位增量建立各種過濾用的二級索引（posting list、風險分數排序等）
+- 既有資料可用 maintenance.py rebuild-index 重建
+"""
+
+import os
+import logging
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from codec import loads
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".idx"
+
+# 索引行的欄位（除了 offset / length）
+IndexEntry = Tuple[str, str, str, str, str, str, str]
+
+
+def index_path(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + INDEX_SUFFIX)
+
+
+def _clean(value: Any) -> str:
+    if value is None:
+        return ""
+    return str(value).replace("\t", " ").replace("\n", " ")
+
+
+def session_index_entry(session: Dict[str, Any]) -> Optional[IndexEntry]:
+    """取出 session 的索引欄位；sess_uuid 無法安全寫入（空值、含 tab / 換行）時回傳 None"""
+    sess_uuid = session.get('sess_uuid')
+    if not sess_uuid or not isinstance(sess_uuid, str) or "\t" in sess_uuid or "\n" in sess_uuid:
+        return None
+
+    try:
+        risk_score = str(int(session.get('risk_score') or 0))
+    except (TypeError, ValueError):
+        risk_score = "0"
+
+    attack_types = ",".join(
+        _clean(attack_type).replace(",", " ") for attack_type in (session.get('attack_types') or [])
+    )
+    return (
+        sess_uuid,
+        _clean(session.get('threat_level')),
+        risk_score,
+        "1" if session.get('requires_review') else "0",
+        _clean(session.get('peer_ip')),
+        _clean(session.get('processed_at')),
+        attack_types,
+    )
+
+
+def format_entries(entries: Iterable[Tuple[Optional[IndexEntry], int, int]]) -> bytes:
+    """把 (索引欄位, offset, length) 轉成索引行；沒有索引欄位的略過"""
+    lines = []
+    for entry, offset, length in entries:
+        if entry is None:
+            continue
+        sess_uuid, *fields = entry
+        lines.append("\t".join([sess_uuid, str(offset), str(length), *fields]) + "\n")
+    return "".join(lines).encode("utf-8")
+
+
+def rebuild_index(file_path: Path) -> int:
+    """
+    掃描 JSONL 檔案重建索引（寫入暫存檔後 rename）
+
+    Returns:
+        int: 索引的筆數
+    """
+    entries = []
+    offset = 0
+    with open(file_path, "rb") as f:
+        for line in f:
+            length = len(line)
+            stripped = line.strip()
+            if stripped:
+                try:
+                    entry = session_index_entry(loads(stripped))
+                except Exception:
+                    logger.warning(f"⚠️  Skipping unparsable line at offset {offset} in {file_path}")
+                    entry = None
+                entries.append((entry, offset, length))
+            offset += length
+
+    target = index_path(file_path)
+    tmp_path = target.with_name(target.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(format_entries(entries))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, target)
+    return sum(1 for entry, _, _ in entries if entry is not None)
@@ -0,0 +1,252 @@
+"""
+SQLite 嵌入式資料庫儲存模組（OUTPUT_FORMAT=database）
+
+不需要額外的資料庫服務，資料庫檔案位於共享的 DATA_DIR 下（預設 database/sessions.db）：
+- sessions：每個 session 一列，熱欄位為獨立欄位，完整 session 以緊湊 JSON 存在 document
+- session_paths：每個請求路徑一列
+- session_attack_types：attack_types 列表的每個元素一列（保留順序），供攻擊類型過濾使用索引
+
+每個 worker 批次的寫入在 flush() 時以一個交易提交（ACK 前）。
+同一個 sess_uuid 重複送達（例如重新投遞）時以新資料取代舊資料。
+
+日誌模式預設為 DELETE（rollback journal），因為 query_api 以唯讀方式掛載資料目錄，
+WAL 模式的讀取端需要能建立 -shm 檔案。資料目錄可寫入時可設定 DATABASE_JOURNAL_MODE=wal。
+"""
+
+import os
+import sqlite3
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+DATABASE_JOURNAL_MODE = os.getenv("DATABASE_JOURNAL_MODE", "delete")
+DATABASE_BUSY_TIMEOUT_MS = int(os.getenv("DATABASE_BUSY_TIMEOUT_MS", 10000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    sess_uuid TEXT NOT NULL,
+    date TEXT NOT NULL,
+    processed_at TEXT,
+    peer_ip TEXT,
+    peer_port INTEGER,
+    user_agent TEXT,
+    threat_level TEXT,
+    alert_level TEXT,
+    risk_score INTEGER,
+    tool_identified TEXT,
+    is_scanner INTEGER,
+    total_requests INTEGER,
+    has_malicious_activity INTEGER,
+    requires_review INTEGER,
+    country_code TEXT,
+    document BLOB NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sessions_sess_uuid ON sessions (sess_uuid);
+CREATE INDEX IF NOT EXISTS idx_sessions_peer_ip ON sessions (peer_ip);
+-- 列表依 (排序鍵, sess_uuid) 排序，分頁游標以這兩個索引定位
+CREATE INDEX IF NOT EXISTS idx_sessions_date_processed_at ON sessions (date, processed_at, sess_uuid);
+CREATE INDEX IF NOT EXISTS idx_sessions_date_risk_score ON sessions (date, risk_score, sess_uuid);
+
+CREATE TABLE IF NOT EXISTS session_paths (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    method TEXT,
+    path TEXT,
+    attack_type TEXT,
+    response_status INTEGER,
+    timestamp TEXT,
+    PRIMARY KEY (session_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS session_attack_types (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    attack_type TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_session_attack_types_attack_type ON session_attack_types (attack_type, session_id);
+"""
+
+INSERT_SESSION = """
+INSERT INTO sessions (
+    sess_uuid, date, processed_at, peer_ip, peer_port, user_agent, threat_level, alert_level,
+    risk_score, tool_identified, is_scanner, total_requests, has_malicious_activity,
+    requires_review, country_code, document
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def session_to_row(date: str, session: Dict[str, Any]) -> Tuple:
+    ua_info = session.get('user_agent_info') or {}
+    location = session.get('location') or {}
+    return (
+        session.get('sess_uuid'),
+        date,
+        session.get('processed_at'),
+        session.get('peer_ip'),
+        _to_int(session.get('peer_port')),
+        session.get('user_agent'),
+        session.get('threat_level'),
+        session.get('alert_level'),
+        _to_int(session.get('risk_score')),
+        ua_info.get('tool_identified'),
+        _to_int(ua_info.get('is_scanner')),
+        _to_int(session.get('total_requests')),
+        _to_int(session.get('has_malicious_activity')),
+        _to_int(session.get('requires_review')),
+        location.get('country_code') or None,
+        dumps(session),
+    )
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    """建立寫入連線並確保 schema 存在（交易由呼叫端以 BEGIN / COMMIT 控制）"""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), timeout=DATABASE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.execute(f"PRAGMA journal_mode = {DATABASE_JOURNAL_MODE}")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def read_sessions(db_path: Path, date: str) -> List[Dict[str, Any]]:
+    """讀取某天所有 session 的完整資料"""
+    if not db_path.exists():
+        return []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=DATABASE_BUSY_TIMEOUT_MS / 1000)
+    try:
+        rows = conn.execute("SELECT document FROM sessions WHERE date = ? ORDER BY id", (date,)).fetchall()
+    except sqlite3.OperationalError as e:
+        logger.error(f"Error reading sessions from {db_path}: {e}")
+        return []
+    finally:
+        conn.close()
+    return [loads(document) for (document,) in rows]
+
+
+def list_dates(db_path: Path) -> List[str]:
+    """列出資料庫中有資料的日期"""
+    if not db_path.exists():
+        return []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=DATABASE_BUSY_TIMEOUT_MS / 1000)
+    try:
+        return [date for (date,) in conn.execute("SELECT DISTINCT date FROM sessions ORDER BY date")]
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+
+class SqliteSessionStore:
+    """
+    批次寫入 SQLite 的 session 儲存（每個 worker 進程一個連線）
+
+    用法：
+        store.append("2025-10-26", session)
+        store.flush()   # 批次結束、ACK 前：一個交易寫入整批
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, Dict[str, Any]]] = []
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect(self.db_path)
+            logger.info(f"🗄️  Opened session database {self.db_path}")
+        return self._conn
+
+    def append(self, date: str, session: Dict[str, Any]) -> None:
+        self._pending.append((date, session))
+
+    def _insert(self, cursor: sqlite3.Cursor, date: str, session: Dict[str, Any]) -> None:
+        sess_uuid = session.get('sess_uuid')
+        # 重新投遞的 session：刪除舊資料（子表由 ON DELETE CASCADE 一併刪除）
+        cursor.execute("DELETE FROM sessions WHERE sess_uuid = ?", (sess_uuid,))
+        cursor.execute(INSERT_SESSION, session_to_row(date, session))
+        session_id = cursor.lastrowid
+
+        cursor.executemany(
+            "INSERT INTO session_paths (session_id, seq, method, path, attack_type, response_status, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    session_id, seq, path_obj.get('method'), path_obj.get('path'),
+                    path_obj.get('attack_type'), _to_int(path_obj.get('response_status')),
+                    path_obj.get('timestamp')
+                )
+                for seq, path_obj in enumerate(session.get('paths') or [])
+            ]
+        )
+        cursor.executemany(
+            "INSERT INTO session_attack_types (session_id, seq, attack_type) VALUES (?, ?, ?)",
+            [
+                (session_id, seq, attack_type)
+                for seq, attack_type in enumerate(session.get('attack_types') or [])
+                if attack_type is not None
+            ]
+        )
+
+    def flush(self) -> bool:
+        """
+        以一個交易寫入本批次的所有 session
+
+        Returns:
+            bool: 是否成功（失敗時整批回滾，呼叫端不應 ACK）
+        """
+        if not self._pending:
+            return True
+
+        pending = self._pending
+        self._pending = []
+        conn = None
+        try:
+            conn = self._get_conn()
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for date, session in pending:
+                self._insert(cursor, date, session)
+            cursor.execute("COMMIT")
+            return True
+
+        except sqlite3.Error as e:
+            logger.error(f"❌ Error writing {len(pending)} sessions to database: {e}")
+            if conn is not None and conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    self._close_conn()
+            return False
+
+    def discard(self) -> None:
+        """丟棄尚未寫入的 session（批次處理失敗時使用）"""
+        self._pending = []
+
+    def _close_conn(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+            self._conn = None
+
+    def close(self) -> None:
+        """寫入剩餘的 session 並關閉連線"""
+        self.flush()
+        self._close_conn()
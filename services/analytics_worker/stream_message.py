@@ -0,0 +1,116 @@
+"""
+Stream 訊息格式模組
+
+定義 sessions_stream 中每筆 entry 的編碼方式（ingestion_api 與 analytics_worker 各保留一份相同的副本）。
+
+格式：
+- 舊版（v1）：{b"data": <JSON bytes>}，沒有 v 欄位
+- 精簡版（v2）：{b"v": b"2", b"fmt": <格式>, b"data": <payload>}
+    fmt = msgpack+zstd | msgpack | json+zstd | json
+
+讀取端依 v / fmt 自動判斷，新舊格式可以混在同一個 stream 中。
+寫入端用 STREAM_ENCODING 選擇：json（預設，與舊版相同）或 compact。
+"""
+
+import logging
+import os
+from typing import Any, Dict
+
+from codec import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+STREAM_ENCODING = os.getenv("STREAM_ENCODING", "json").lower()  # json or compact
+STREAM_ZSTD_LEVEL = int(os.getenv("STREAM_ZSTD_LEVEL", 3))
+# 小於此大小的 payload 不壓縮（zstd frame header 反而會變大）
+STREAM_COMPRESS_MIN_BYTES = int(os.getenv("STREAM_COMPRESS_MIN_BYTES", 256))
+
+SCHEMA_VERSION = b"2"
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+    _compressor = zstandard.ZstdCompressor(level=STREAM_ZSTD_LEVEL)
+    _decompressor = zstandard.ZstdDecompressor()
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+if STREAM_ENCODING == "compact" and not (MSGPACK_AVAILABLE or ZSTD_AVAILABLE):
+    logger.warning("STREAM_ENCODING=compact but msgpack/zstandard are not installed, using JSON")
+
+
+class MessageDecodeError(ValueError):
+    """無法解碼的 stream entry（未知版本或格式、資料損壞）"""
+
+
+def encode_message(session: Dict[str, Any]) -> Dict[str, bytes]:
+    """
+    將 session 編碼為 stream entry 欄位
+
+    Returns:
+        Dict: 傳給 XADD 的欄位
+    """
+    if STREAM_ENCODING != "compact":
+        return {"data": dumps(session)}
+
+    if MSGPACK_AVAILABLE:
+        payload = msgpack.packb(session, use_bin_type=True)
+        fmt = "msgpack"
+    else:
+        payload = dumps(session)
+        fmt = "json"
+
+    if ZSTD_AVAILABLE and len(payload) >= STREAM_COMPRESS_MIN_BYTES:
+        payload = _compressor.compress(payload)
+        fmt += "+zstd"
+
+    return {"v": SCHEMA_VERSION, "fmt": fmt.encode(), "data": payload}
+
+
+def decode_message(fields: Dict[bytes, bytes]) -> Dict[str, Any]:
+    """
+    將 stream entry 欄位解碼為 session（自動辨識 v1 / v2）
+
+    Raises:
+        MessageDecodeError: 無法解碼
+    """
+    payload = fields.get(b"data", b"{}")
+    version = fields.get(b"v")
+
+    try:
+        if version is None:
+            # v1：純 JSON
+            return loads(payload)
+
+        if version != SCHEMA_VERSION:
+            raise MessageDecodeError(f"Unsupported message version: {version!r}")
+
+        fmt = fields.get(b"fmt", b"json").decode()
+        serializer, _, compression = fmt.partition("+")
+
+        if compression == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise MessageDecodeError("zstandard is required to decode this message")
+            payload = _decompressor.decompress(payload)
+        elif compression:
+            raise MessageDecodeError(f"Unsupported compression: {compression}")
+
+        if serializer == "msgpack":
+            if not MSGPACK_AVAILABLE:
+                raise MessageDecodeError("msgpack is required to decode this message")
+            return msgpack.unpackb(payload, raw=False)
+        if serializer == "json":
+            return loads(payload)
+
+        raise MessageDecodeError(f"Unsupported serializer: {serializer}")
+
+    except MessageDecodeError:
+        raise
+    except Exception as e:
+        raise MessageDecodeError(f"Corrupted message: {e}")
@@ -0,0 +1,689 @@
+"""
+每日摘要增量聚合模組
+
+以常駐記憶體的計數器維護每日統計與威脅情報，每個批次只需 O(batch) 更新，
+不必重新讀取整天的 sessions.jsonl。
+
+- 每個 worker 進程（消費者）維護自己的部分狀態，每 SUMMARY_WRITE_INTERVAL_S 秒 checkpoint 到
+  statistics/YYYY-MM-DD/partials/<consumer>.json
+- 同樣每 SUMMARY_WRITE_INTERVAL_S 秒寫出一次 summary.json / threat_intelligence.json，寫出時合併當天所有進程的 checkpoint，
+  輸出格式與原本的 save_statistics / save_threat_intelligence_feed 完全相同
+- 同時寫出 dashboard.json（儀表板用的工具、時段、路徑等統計）與 geo.json（各國家的統計，
+  不重複 IP 以 HyperLogLog sketch 記錄，可跨日合併），Query API 不必再讀取整天的資料
+- sketches.json 保存可跨日合併的摘要：IP / User Agent / 路徑的前 HEAVY_HITTERS_K 名（附上未列入者的
+  計數上限）與風險分數直方圖，Query API 以此計算多日的 Top-N 與百分位數
+- 升級前建立、缺少這些欄位的 checkpoint 只能得到部分結果，這種日子不寫 dashboard.json / geo.json / sketches.json
+- 所有檔案都以「寫入暫存檔 + rename」的方式原子更新，query_api 不會讀到寫一半的檔案
+"""
+
+import os
+import time
+import logging
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Iterable, Optional
+
+from codec import dumps, dumps_pretty, loads
+from hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+# 配置
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+# 兩次 checkpoint / 寫出 summary.json 之間的最短間隔（秒）；0 = 每個批次都寫（每批次的成本與當天資料量成正比）
+SUMMARY_WRITE_INTERVAL_S = float(os.getenv("SUMMARY_WRITE_INTERVAL_S", 5))
+
+STATE_VERSION = 1
+TOP_N = 10
+# sketches.json 中每個 heavy hitters 摘要保留的項目數（多日 Top-N 的準確度取決於它比 TOP_N 大多少）
+HEAVY_HITTERS_K = int(os.getenv("HEAVY_HITTERS_K", 200))
+MAX_SAMPLE_PAYLOADS = 20
+HIGH_RISK_THRESHOLD = 50  # 威脅情報只收集風險分數 >= 50 的 session
+
+
+def new_state() -> Dict[str, Any]:
+    """建立空的聚合狀態"""
+    return {
+        'version': STATE_VERSION,
+        'total_sessions': 0,
+        'total_risk': 0,
+        'attack_type_distribution': {},
+        'threat_level_distribution': {},
+        'risk_score_distribution': {
+            'critical': 0,
+            'high': 0,
+            'medium': 0,
+            'low': 0,
+            'info': 0
+        },
+        'source_ips': {},
+        'user_agents': {},
+        'alert_counts': {
+            'CRITICAL': 0,
+            'HIGH': 0,
+            'MEDIUM': 0,
+            'LOW': 0,
+            'INFO': 0
+        },
+        'requires_review_count': 0,
+        # 威脅情報
+        'malicious_ips': [],
+        'attack_signatures': [],
+        'malicious_user_agents': [],
+        'sample_payloads': [],
+        # 儀表板
+        'tool_distribution': {},
+        'scanner_count': 0,
+        'hourly_trend': {},
+        'path_stats': {},
+        'method_distribution': {},
+        'duration_total': 0.0,
+        'duration_count': 0,
+        # 風險分數直方圖：str(int(risk_score)) → 次數
+        'risk_histogram': {},
+        # 地理分布：country_code → 統計（ip_sketch 為編碼後的 HyperLogLog）
+        'geo': {}
+    }
+
+
+# 儀表板 / 地理分布欄位（升級前的 checkpoint 沒有這些欄位）
+ROLLUP_KEYS = (
+    'tool_distribution', 'scanner_count', 'hourly_trend', 'path_stats',
+    'method_distribution', 'duration_total', 'duration_count', 'risk_histogram', 'geo'
+)
+
+
+def has_rollups(state: Dict[str, Any]) -> bool:
+    """狀態是否從第一筆 session 起就有完整的儀表板 / 地理分布統計"""
+    return all(key in state for key in ROLLUP_KEYS) and not state.get('rollups_partial', False)
+
+
+def ensure_rollup_keys(state: Dict[str, Any]) -> None:
+    """補上升級前 checkpoint 缺少的欄位，並標記為部分結果"""
+    if all(key in state for key in ROLLUP_KEYS):
+        return
+    defaults = new_state()
+    for key in ROLLUP_KEYS:
+        state.setdefault(key, defaults[key])
+    state['rollups_partial'] = True
+
+
+def _incr(counter: Dict[str, int], key: str, amount: int = 1) -> None:
+    counter[key] = counter.get(key, 0) + amount
+
+
+def _risk_bucket(risk_score: float) -> str:
+    if risk_score >= 70:
+        return 'critical'
+    elif risk_score >= 50:
+        return 'high'
+    elif risk_score >= 30:
+        return 'medium'
+    elif risk_score >= 15:
+        return 'low'
+    return 'info'
+
+
+def add_session(state: Dict[str, Any], session: Dict[str, Any], intel_sets: Optional[Dict[str, Any]] = None) -> None:
+    """
+    將單個 session 累加到聚合狀態
+
+    Args:
+        state: 聚合狀態
+        session: 處理後的 session
+        intel_sets: state_sets() 的快取（避免每次都把 list 轉成 set、解碼 IP sketch）；
+                    傳入時 sketch 的變更要由呼叫端以 store_sketches() 寫回
+    """
+    state['total_sessions'] += 1
+
+    # 攻擊類型
+    for attack_type in session.get('attack_types', []):
+        _incr(state['attack_type_distribution'], attack_type)
+
+    # 威脅等級
+    _incr(state['threat_level_distribution'], session.get('threat_level', 'INFO'))
+
+    # 風險分數
+    risk_score = session.get('risk_score', 0)
+    state['total_risk'] += risk_score
+    state['risk_score_distribution'][_risk_bucket(risk_score)] += 1
+    _incr(state['risk_histogram'], str(int(risk_score)))
+
+    # 來源 IP / User Agent
+    _incr(state['source_ips'], session.get('peer_ip', 'unknown'))
+    _incr(state['user_agents'], session.get('user_agent', 'unknown'))
+
+    # 警報等級
+    _incr(state['alert_counts'], session.get('alert_level', 'INFO'))
+
+    # 需要審查
+    if session.get('requires_review', False):
+        state['requires_review_count'] += 1
+
+    sets = intel_sets if intel_sets is not None else state_sets(state)
+
+    # === 儀表板 / 地理分布 ===
+    _add_dashboard(state, session)
+    _add_geo(state, session, sets['geo_sketches'])
+    if intel_sets is None:
+        store_sketches(state, sets)
+
+    # === 威脅情報（只收集高風險）===
+    if risk_score < HIGH_RISK_THRESHOLD:
+        return
+
+    def add_unique(key: str, value: str):
+        if value not in sets[key]:
+            sets[key].add(value)
+            state[key].append(value)
+
+    # 惡意 IP
+    peer_ip = session.get('peer_ip')
+    if peer_ip and peer_ip != '0.0.0.0':
+        add_unique('malicious_ips', peer_ip)
+
+    # 攻擊簽名
+    signature = session.get('attack_patterns', {}).get('pattern_signature', '')
+    if signature:
+        add_unique('attack_signatures', signature)
+
+    # 掃描工具
+    if session.get('user_agent_info', {}).get('is_scanner', False):
+        user_agent = session.get('user_agent')
+        if user_agent:
+            add_unique('malicious_user_agents', user_agent)
+
+    # 惡意 Payload (sample)
+    suspicious_patterns = session.get('payload_analysis', {}).get('suspicious_patterns', [])
+    if suspicious_patterns and len(state['sample_payloads']) < MAX_SAMPLE_PAYLOADS:
+        for path in session.get('paths', [])[:3]:  # 只取前3個
+            if len(state['sample_payloads']) >= MAX_SAMPLE_PAYLOADS:
+                break
+            state['sample_payloads'].append({
+                'path': path.get('path'),
+                'method': path.get('method'),
+                'attack_type': path.get('attack_type'),
+                'patterns': suspicious_patterns
+            })
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _add_dashboard(state: Dict[str, Any], session: Dict[str, Any]) -> None:
+    """儀表板統計（與 query_api 的 get_dashboard_data 掃描路徑相同的定義）"""
+    ua_info = session.get('user_agent_info', {})
+    _incr(state['tool_distribution'], ua_info.get('tool_identified') or 'Unknown')
+    if ua_info.get('is_scanner'):
+        state['scanner_count'] += 1
+
+    processed_time = session.get('processed_at', '')
+    if processed_time:
+        try:
+            _incr(state['hourly_trend'], f"{_parse_time(processed_time).hour:02d}:00")
+        except (AttributeError, TypeError, ValueError):
+            pass
+
+    for path_obj in session.get('paths', []):
+        path = path_obj.get('path', '')
+        if path:
+            # 移除查詢參數以便分組
+            _incr(state['path_stats'], path.split('?')[0])
+        _incr(state['method_distribution'], path_obj.get('method', 'GET'))
+
+    start = session.get('start_time')
+    end = session.get('end_time')
+    if start and end:
+        try:
+            state['duration_total'] += (_parse_time(end) - _parse_time(start)).total_seconds()
+            state['duration_count'] += 1
+        except (AttributeError, TypeError, ValueError):
+            pass
+
+
+def _add_geo(state: Dict[str, Any], session: Dict[str, Any], sketches: Dict[str, HyperLogLog]) -> None:
+    """地理分布統計（與 query_api 的 get_geo_distribution 掃描路徑相同的定義）"""
+    location = session.get('location', {})
+    country_code = location.get('country_code', '').upper()
+    if not country_code:
+        return
+
+    country = state['geo'].get(country_code)
+    if country is None:
+        country = state['geo'][country_code] = {
+            'country_name': location.get('country', 'Unknown'),
+            'attack_count': 0,
+            'high_risk_count': 0,
+            'total_risk_score': 0,
+            'attack_types': {},
+            'ip_sketch': None
+        }
+
+    risk_score = session.get('risk_score', 0)
+    country['attack_count'] += 1
+    country['total_risk_score'] += risk_score
+    if risk_score >= 70:
+        country['high_risk_count'] += 1
+    for attack_type in session.get('attack_types', []):
+        _incr(country['attack_types'], attack_type)
+
+    if country_code not in sketches:
+        sketches[country_code] = HyperLogLog()
+    sketches[country_code].add(str(session.get('peer_ip')))
+
+
+def state_sets(state: Dict[str, Any]) -> Dict[str, Any]:
+    """建立威脅情報去重用的集合，以及解碼後的地理分布 IP sketch"""
+    sets: Dict[str, Any] = {
+        key: set(state[key])
+        for key in ('malicious_ips', 'attack_signatures', 'malicious_user_agents')
+    }
+    sets['geo_sketches'] = {
+        country_code: HyperLogLog.decode(country['ip_sketch'])
+        for country_code, country in state.get('geo', {}).items()
+        if country.get('ip_sketch')
+    }
+    return sets
+
+
+def store_sketches(state: Dict[str, Any], sets: Dict[str, Any]) -> None:
+    """把記憶體中的 IP sketch 編碼回聚合狀態（序列化之前呼叫）"""
+    for country_code, sketch in sets['geo_sketches'].items():
+        state['geo'][country_code]['ip_sketch'] = sketch.encode()
+
+
+def build_state(sessions: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """從 session 列表建立聚合狀態（完整重算）"""
+    state = new_state()
+    sets = state_sets(state)
+    for session in sessions:
+        add_session(state, session, sets)
+    store_sketches(state, sets)
+    return state
+
+
+def merge_into(
+    target: Dict[str, Any],
+    state: Dict[str, Any],
+    sets: Dict[str, Any],
+    state_sketches: Optional[Dict[str, HyperLogLog]] = None
+) -> None:
+    """
+    把 state 累加到 target（不修改 state）
+
+    Args:
+        sets: target 的 state_sets()；IP sketch 合併到 sets['geo_sketches']
+        state_sketches: state 尚未編碼的 IP sketch（省略時從 state 的 ip_sketch 解碼）
+    """
+    target['total_sessions'] += state.get('total_sessions', 0)
+    target['total_risk'] += state.get('total_risk', 0)
+    target['requires_review_count'] += state.get('requires_review_count', 0)
+
+    if not has_rollups(state):
+        target['rollups_partial'] = True
+    for key in ('scanner_count', 'duration_total', 'duration_count'):
+        target[key] += state.get(key, 0)
+    for key in ('tool_distribution', 'hourly_trend', 'path_stats', 'method_distribution', 'risk_histogram'):
+        for k, v in state.get(key, {}).items():
+            _incr(target[key], k, v)
+
+    for key in ('attack_type_distribution', 'threat_level_distribution', 'risk_score_distribution',
+                'source_ips', 'user_agents', 'alert_counts'):
+        for k, v in state.get(key, {}).items():
+            _incr(target[key], k, v)
+
+    for key in ('malicious_ips', 'attack_signatures', 'malicious_user_agents'):
+        for value in state.get(key, []):
+            if value not in sets[key]:
+                sets[key].add(value)
+                target[key].append(value)
+
+    room = MAX_SAMPLE_PAYLOADS - len(target['sample_payloads'])
+    if room > 0:
+        target['sample_payloads'].extend(state.get('sample_payloads', [])[:room])
+
+    merge_geo(target['geo'], state.get('geo', {}), sets['geo_sketches'], state_sketches)
+
+
+def merge_states(states: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """合併多個聚合狀態（不修改輸入）"""
+    merged = new_state()
+    sets = state_sets(merged)
+    for state in states:
+        merge_into(merged, state, sets)
+    store_sketches(merged, sets)
+    return merged
+
+
+def merge_geo(
+    target: Dict[str, Any],
+    source: Dict[str, Any],
+    sketches: Dict[str, HyperLogLog],
+    source_sketches: Optional[Dict[str, HyperLogLog]] = None
+) -> None:
+    """
+    把 source 的地理分布統計累加到 target（IP sketch 合併到 sketches，不修改 source）
+
+    source_sketches 為 source 尚未編碼的 IP sketch；傳入時直接使用（之後不能再修改），不必解碼
+    """
+    for country_code, country in source.items():
+        merged = target.get(country_code)
+        if merged is None:
+            merged = target[country_code] = {
+                'country_name': country.get('country_name', 'Unknown'),
+                'attack_count': 0,
+                'high_risk_count': 0,
+                'total_risk_score': 0,
+                'attack_types': {},
+                'ip_sketch': None
+            }
+
+        for key in ('attack_count', 'high_risk_count', 'total_risk_score'):
+            merged[key] += country.get(key, 0)
+        for attack_type, count in country.get('attack_types', {}).items():
+            _incr(merged['attack_types'], attack_type, count)
+
+        if source_sketches is not None:
+            sketch = source_sketches.get(country_code)
+        elif country.get('ip_sketch'):
+            sketch = HyperLogLog.decode(country['ip_sketch'])
+        else:
+            sketch = None
+        if sketch is not None:
+            if country_code in sketches:
+                sketches[country_code].merge(sketch)
+            else:
+                sketches[country_code] = sketch
+
+
+def render_statistics(state: Dict[str, Any], date: str) -> Dict[str, Any]:
+    """將聚合狀態轉為 summary.json 格式"""
+    total = state['total_sessions']
+    return {
+        'date': date,
+        'total_sessions': total,
+        'attack_type_distribution': dict(state['attack_type_distribution']),
+        'threat_level_distribution': dict(state['threat_level_distribution']),
+        'risk_score_distribution': dict(state['risk_score_distribution']),
+        'top_source_ips': dict(Counter(state['source_ips']).most_common(TOP_N)),
+        'top_user_agents': dict(Counter(state['user_agents']).most_common(TOP_N)),
+        'alert_counts': dict(state['alert_counts']),
+        'average_risk_score': round(state['total_risk'] / total, 2) if total else 0.0,
+        'requires_review_count': state['requires_review_count']
+    }
+
+
+def render_threat_intelligence(state: Dict[str, Any], date: str) -> Dict[str, Any]:
+    """將聚合狀態轉為 threat_intelligence.json 格式"""
+    return {
+        'date': date,
+        'malicious_ips_count': len(state['malicious_ips']),
+        'malicious_ips': list(state['malicious_ips']),
+        'attack_signatures_count': len(state['attack_signatures']),
+        'attack_signatures': list(state['attack_signatures']),
+        'malicious_user_agents': list(state['malicious_user_agents']),
+        'sample_payloads': state['sample_payloads'][:MAX_SAMPLE_PAYLOADS]
+    }
+
+
+def render_dashboard(state: Dict[str, Any], date: str) -> Dict[str, Any]:
+    """將聚合狀態轉為 dashboard.json 格式（get_dashboard_data 需要逐筆計算的部分）"""
+    total = state['total_sessions']
+    return {
+        'date': date,
+        'total_sessions': total,
+        'unique_ips': sum(1 for ip in state['source_ips'] if ip and ip != 'unknown'),
+        'tool_distribution': dict(state['tool_distribution']),
+        'scanner_count': state['scanner_count'],
+        'manual_count': total - state['scanner_count'],
+        'hourly_trend': {f"{h:02d}:00": state['hourly_trend'].get(f"{h:02d}:00", 0) for h in range(24)},
+        'top_paths': dict(Counter(state['path_stats']).most_common(TOP_N)),
+        'method_distribution': dict(state['method_distribution']),
+        'avg_session_duration': round(state['duration_total'] / state['duration_count'], 2) if state['duration_count'] else 0
+    }
+
+
+def render_geo(state: Dict[str, Any], date: str) -> Dict[str, Any]:
+    """將聚合狀態轉為 geo.json 格式（各國家的統計與 IP sketch，query_api 可跨日合併）"""
+    return {
+        'date': date,
+        'countries': {country_code: dict(country) for country_code, country in state['geo'].items()}
+    }
+
+
+def heavy_hitters(counter: Dict[str, int], k: int = HEAVY_HITTERS_K) -> Dict[str, Any]:
+    """
+    前 k 名的精確計數；floor 為未列入者的計數上限（第 k 名的計數，全部列入時為 0）
+
+    多個這樣的摘要相加即為可合併的 heavy hitters 摘要：某項目的總數介於已列入天數的計數總和，
+    與再加上未列入那些天的 floor 之間。
+    """
+    top = Counter(counter).most_common(k)
+    return {
+        'floor': top[-1][1] if len(counter) > k else 0,
+        'counts': dict(top)
+    }
+
+
+def render_sketches(state: Dict[str, Any], date: str) -> Dict[str, Any]:
+    """將聚合狀態轉為 sketches.json 格式（可跨日合併的 Top-N 與風險分數分布）"""
+    return {
+        'date': date,
+        'total_sessions': state['total_sessions'],
+        'heavy_hitters': {
+            'source_ips': heavy_hitters(state['source_ips']),
+            'user_agents': heavy_hitters(state['user_agents']),
+            'paths': heavy_hitters(state['path_stats'])
+        },
+        'risk_histogram': dict(state['risk_histogram'])
+    }
+
+
+def atomic_write(file_path: Path, data: bytes) -> None:
+    """寫入暫存檔後 rename，讀取端不會看到寫一半的內容"""
+    tmp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, file_path)
+
+
+def write_statistics(stats: Dict[str, Any]) -> None:
+    """寫出 statistics/YYYY-MM-DD/summary.json"""
+    stats_dir = Path(DATA_DIR) / "statistics" / stats['date']
+    stats_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(stats_dir / "summary.json", dumps_pretty(stats))
+
+
+def write_dashboard(dashboard: Dict[str, Any]) -> None:
+    """寫出 statistics/YYYY-MM-DD/dashboard.json"""
+    stats_dir = Path(DATA_DIR) / "statistics" / dashboard['date']
+    stats_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(stats_dir / "dashboard.json", dumps_pretty(dashboard))
+
+
+def write_geo(geo: Dict[str, Any]) -> None:
+    """寫出 statistics/YYYY-MM-DD/geo.json"""
+    stats_dir = Path(DATA_DIR) / "statistics" / geo['date']
+    stats_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(stats_dir / "geo.json", dumps(geo))
+
+
+def write_sketches(sketches: Dict[str, Any]) -> None:
+    """寫出 statistics/YYYY-MM-DD/sketches.json"""
+    stats_dir = Path(DATA_DIR) / "statistics" / sketches['date']
+    stats_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(stats_dir / "sketches.json", dumps(sketches))
+
+
+def write_threat_intelligence(intel: Dict[str, Any]) -> None:
+    """寫出 threat_intelligence/YYYY-MM-DD/ 下的黑名單、簽名與摘要"""
+    intel_dir = Path(DATA_DIR) / "threat_intelligence" / intel['date']
+    intel_dir.mkdir(parents=True, exist_ok=True)
+
+    # 保存 IP 黑名單
+    atomic_write(
+        intel_dir / "malicious_ips.txt",
+        "".join(f"{ip}\n" for ip in sorted(intel['malicious_ips'])).encode("utf-8")
+    )
+
+    # 保存攻擊簽名
+    atomic_write(
+        intel_dir / "attack_signatures.txt",
+        "".join(f"{sig}\n" for sig in sorted(intel['attack_signatures'])).encode("utf-8")
+    )
+
+    # 保存威脅情報摘要
+    atomic_write(intel_dir / "threat_intelligence.json", dumps_pretty(intel))
+
+
+def partials_dir(date: str) -> Path:
+    return Path(DATA_DIR) / "statistics" / date / "partials"
+
+
+def load_partial_states(date: str) -> List[Dict[str, Any]]:
+    """讀取當天所有進程的 checkpoint"""
+    directory = partials_dir(date)
+    if not directory.exists():
+        return []
+
+    states = []
+    for file_path in sorted(directory.glob("*.json")):
+        try:
+            with open(file_path, "rb") as f:
+                state = loads(f.read())
+            if state.get('version') == STATE_VERSION:
+                states.append(state)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping unreadable summary checkpoint {file_path}: {e}")
+    return states
+
+
+class DailySummaryAggregator:
+    """
+    單一 worker 進程的每日摘要聚合器
+
+    用法：
+        aggregator.add_sessions(date, sessions)   # 每個批次 O(batch)
+        aggregator.flush()                        # 每 SUMMARY_WRITE_INTERVAL_S 秒 checkpoint + 合併寫出 summary
+    """
+
+    def __init__(self, consumer_name: str):
+        self.consumer_name = consumer_name
+        self.date: Optional[str] = None
+        self.state: Dict[str, Any] = new_state()
+        self._sets: Dict[str, Any] = state_sets(self.state)
+        self._dirty = False
+        self._last_write = 0.0
+
+    @property
+    def checkpoint_path(self) -> Path:
+        return partials_dir(self.date) / f"{self.consumer_name}.json"
+
+    def _load(self, date: str) -> None:
+        """切換到指定日期，從 checkpoint 還原本進程的狀態"""
+        self.date = date
+        self.state = new_state()
+        self._dirty = False
+
+        try:
+            with open(self.checkpoint_path, "rb") as f:
+                state = loads(f.read())
+            if state.get('version') == STATE_VERSION:
+                ensure_rollup_keys(state)
+                self.state = state
+                logger.info(f"📥 Restored summary checkpoint for {date}: {state['total_sessions']} sessions")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable summary checkpoint {self.checkpoint_path}: {e}")
+
+        self._sets = state_sets(self.state)
+
+    def add_sessions(self, date: str, sessions: List[Dict[str, Any]]) -> None:
+        """
+        累加一個批次的 session
+
+        先把整個批次聚合成獨立的 delta 再合併進狀態：某個 session 格式錯誤而丟出例外時，
+        狀態維持不變，不會只加入批次的一部分。
+        """
+        if date != self.date:
+            if self.date is not None and self._dirty:
+                # 跨日：先把前一天的最終結果寫出
+                self.flush(force=True)
+            self._load(date)
+
+        if not sessions:
+            return
+
+        delta = new_state()
+        delta_sets = state_sets(delta)
+        for session in sessions:
+            add_session(delta, session, delta_sets)
+
+        merge_into(self.state, delta, self._sets, delta_sets['geo_sketches'])
+        self._dirty = True
+
+    def checkpoint(self) -> None:
+        """將本進程的狀態寫到 partials/<consumer>.json"""
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        store_sketches(self.state, self._sets)
+        atomic_write(self.checkpoint_path, dumps(self.state))
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        checkpoint 本進程狀態，並合併所有進程的 checkpoint 寫出 summary.json / threat_intelligence.json
+
+        距離上次寫出不到 SUMMARY_WRITE_INTERVAL_S 秒時不做任何事（force=True 除外），
+        每個批次只需要 add_sessions() 的 O(batch) 成本。
+
+        Returns:
+            bool: 是否成功
+        """
+        if self.date is None or not self._dirty:
+            return True
+
+        now = time.monotonic()
+        if not force and now - self._last_write < SUMMARY_WRITE_INTERVAL_S:
+            return True
+
+        try:
+            self.checkpoint()
+            self._dirty = False
+
+            merged = merge_states(load_partial_states(self.date))
+            write_statistics(render_statistics(merged, self.date))
+            write_threat_intelligence(render_threat_intelligence(merged, self.date))
+            if has_rollups(merged):
+                write_dashboard(render_dashboard(merged, self.date))
+                write_geo(render_geo(merged, self.date))
+                write_sketches(render_sketches(merged, self.date))
+            self._last_write = now
+
+            logger.info(
+                f"📊 Updated daily summary for {self.date}: {merged['total_sessions']} sessions, "
+                f"{len(merged['malicious_ips'])} malicious IPs"
+            )
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Error writing daily summary for {self.date}: {e}", exc_info=True)
+            return False
+
+
+def bootstrap_from_sessions(date: str, sessions: List[Dict[str, Any]]) -> bool:
+    """
+    升級時使用：當天已經有 sessions.jsonl 但沒有任何 checkpoint，
+    以完整重算的結果建立 partials/bootstrap.json
+
+    必須在 worker 進程開始消費前（單一進程中）呼叫，避免重複計數。
+    """
+    directory = partials_dir(date)
+    if directory.exists() and any(directory.glob("*.json")):
+        return False
+
+    directory.mkdir(parents=True, exist_ok=True)
+    atomic_write(directory / "bootstrap.json", dumps(build_state(sessions)))
+    logger.info(f"📥 Bootstrapped summary checkpoint for {date} from {len(sessions)} existing sessions")
+    return True
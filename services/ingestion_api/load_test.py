@@ -0,0 +1,191 @@
+"""
+Ingestion API 壓力測試工具
+
+以多個並發「agent」對 /ingest 送出批次 session，量測 requests/sec 與延遲。
+
+兩種模式：
+- 遠端模式：對已啟動的服務送出請求（可分別對舊版與新版部署各跑一次比較）
+    python load_test.py --url http://localhost:8082 --api-key <key>
+- 程序內模式：直接以 ASGI 方式呼叫 app，並以「舊版阻塞路徑」與「asyncio 路徑」各跑一次
+    python load_test.py --in-process --compare                  # 使用本機 Redis
+    python load_test.py --in-process --compare --fake-redis     # 使用 fakeredis
+
+依賴（僅測試用，不在 requirements.txt 中）：httpx，--fake-redis 另需 fakeredis
+
+注意：fakeredis 沒有網路延遲，阻塞與非阻塞的差距只有在真實 Redis（或遠端 Redis）上才會明顯。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import uuid
+from typing import List, Dict, Any
+
+import httpx
+
+LOAD_TEST_API_KEY = "load-test-api-key"
+
+
+def make_session(index: int) -> Dict[str, Any]:
+    """產生一筆與 Tanner 格式相近的合成 session"""
+    return {
+        "sess_uuid": str(uuid.uuid4()),
+        "peer_ip": f"203.0.{index % 256}.{(index * 7) % 256}",
+        "peer_port": 40000 + index % 20000,
+        "user_agent": "sqlmap/1.7.2#stable (https://sqlmap.org)",
+        "snare_uuid": "snare-load-test",
+        "start_time": time.time() - 5,
+        "end_time": time.time(),
+        "attack_types": ["sqli", "xss"],
+        "paths": [
+            {
+                "path": f"/login?id={index} UNION SELECT * FROM users--",
+                "method": "GET",
+                "timestamp": time.time(),
+                "response_status": 200,
+                "attack_type": "sqli"
+            }
+            for _ in range(5)
+        ]
+    }
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    path: str,
+    api_key: str,
+    total_requests: int,
+    concurrency: int,
+    batch_size: int
+) -> Dict[str, Any]:
+    """以固定並發數送出請求並統計結果"""
+    body = json.dumps([make_session(i) for i in range(batch_size)]).encode("utf-8")
+    headers = {"X-API-Key": api_key, "Content-Type": "application/json"}
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = total_requests
+
+    async def agent():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, content=body, headers=headers)
+                if response.status_code >= 300:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(agent() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "sessions_per_sec": round(len(latencies) * batch_size / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def install_legacy_path(main_module, sync_client) -> None:
+    """
+    將 app 換回舊版行為：同步 redis client、每個 session 一次 XADD，
+    在 async endpoint 中直接阻塞事件循環（用於「before」量測）
+    """
+    import redis_client
+
+    async def legacy_publish_sessions(sessions):
+        for session in sessions:
+            sync_client.xadd(
+                redis_client.REDIS_STREAM,
+                {"data": json.dumps(session)},
+                maxlen=redis_client.STREAM_MAXLEN
+            )
+        # 與 redis_client.publish_sessions 相同的回傳格式
+        return {"published": len(sessions), "accepted": [], "failed": [], "uncertain": []}
+
+    main_module.publish_sessions = legacy_publish_sessions
+
+
+async def run_in_process(args) -> None:
+    os.environ.setdefault("API_KEYS", LOAD_TEST_API_KEY)
+
+    import redis
+    import redis.asyncio as aioredis
+    import redis_client
+    import main
+
+    if args.fake_redis:
+        import fakeredis
+        import fakeredis.aioredis
+
+        server = fakeredis.FakeServer()
+        sync_client = fakeredis.FakeRedis(server=server)
+        redis_client.redis_pool = aioredis.ConnectionPool(
+            connection_class=fakeredis.aioredis.FakeConnection,
+            server=server
+        )
+    else:
+        sync_client = redis.Redis(host=redis_client.REDIS_HOST, port=redis_client.REDIS_PORT)
+        await redis_client.init_redis_pool()
+
+    modes = ["blocking", "async"] if args.compare else ["async"]
+    async_publish = main.publish_sessions
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://ingestion") as client:
+        for mode in modes:
+            if mode == "blocking":
+                install_legacy_path(main, sync_client)
+            else:
+                main.publish_sessions = async_publish
+
+            result = await run_load(
+                client, "/ingest", args.api_key or LOAD_TEST_API_KEY,
+                args.requests, args.concurrency, args.batch_size
+            )
+            print(f"[{mode:>8}] {json.dumps(result)}")
+
+    await redis_client.close_redis_pool()
+
+
+async def run_remote(args) -> None:
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+        result = await run_load(
+            client, "/ingest", args.api_key,
+            args.requests, args.concurrency, args.batch_size
+        )
+        print(f"[{args.url}] {json.dumps(result)}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Ingestion API load test")
+    parser.add_argument("--url", default="http://localhost:8082", help="遠端模式的服務位址")
+    parser.add_argument("--api-key", default=os.getenv("LOAD_TEST_API_KEY"), help="X-API-Key")
+    parser.add_argument("--requests", type=int, default=500, help="總請求數")
+    parser.add_argument("--concurrency", type=int, default=20, help="並發 agent 數")
+    parser.add_argument("--batch-size", type=int, default=100, help="每個請求的 session 數")
+    parser.add_argument("--in-process", action="store_true", help="以 ASGI 方式在程序內呼叫 app")
+    parser.add_argument("--compare", action="store_true", help="程序內模式：比較舊版阻塞路徑與 asyncio 路徑")
+    parser.add_argument("--fake-redis", action="store_true", help="程序內模式：使用 fakeredis")
+    args = parser.parse_args()
+
+    if args.in_process:
+        asyncio.run(run_in_process(args))
+    else:
+        asyncio.run(run_remote(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,9 +1,19 @@
 from fastapi import FastAPI, Request, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
 import uvicorn
 import logging
 from datetime import datetime
 from auth import verify_API_key
-from redis_client import publish_sessions, get_stream_info, health_check
+from ndjson_stream import iter_ndjson, StreamDecodeError, SUPPORTED_ENCODINGS
+from redis_client import (
+    PUBLISH_CHUNK_SIZE,
+    init_redis_pool,
+    close_redis_pool,
+    publish_sessions,
+    get_stream_info,
+    get_worker_metrics,
+    health_check
+)
 
 app = FastAPI(
     title="Intelligence Hive Ingestion API",
@@ -14,6 +24,23 @@ app = FastAPI(
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+# 串流回應中最多列出的失敗筆數（其餘只計數，保持記憶體固定）
+MAX_REPORTED_FAILURES = 1000
+
+
+@app.on_event("startup")
+async def startup():
+    """建立共享的 Redis 連接池"""
+    await init_redis_pool()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """釋放 Redis 連接池"""
+    await close_redis_pool()
+
+
 @app.get("/")
 async def root():
     """服務根端點"""
@@ -27,7 +54,7 @@ async def root():
 @app.get("/health")
 async def health():
     """健康檢查端點"""
-    redis_healthy = health_check()
+    redis_healthy = await health_check()
 
     return {
         "status": "healthy" if redis_healthy else "degraded",
@@ -63,18 +90,43 @@ async def ingest_data(
                 "sessions_queued": 0
             }
 
-        # 發布到 Redis Stream
-        published_count = publish_sessions(data)
+        # 發布到 Redis Stream（pipeline 批次寫入）
+        result = await publish_sessions(data)
+        published_count = result["published"]
+        failed = result["failed"]
+        uncertain = result.get("uncertain", [])
+
+        if failed and not published_count and not uncertain:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail={
+                    "message": "Failed to queue sessions",
+                    "failed": failed
+                }
+            )
 
         logging.info(f"✅ Queued {published_count} sessions from API key {api_key[:8]}...")
 
-        return {
-            "status": "success",
-            "message": "Data queued for processing",
+        partial = bool(failed or uncertain)
+        response = {
+            "status": "partial" if partial else "success",
+            "message": "Data partially queued for processing" if partial else "Data queued for processing",
             "sessions_queued": published_count,
             "timestamp": datetime.utcnow().isoformat()
         }
 
+        if partial:
+            # 部分失敗：回報哪些 session 已接受、哪些需要重送、哪些無法確認是否已寫入
+            response["sessions_failed"] = len(failed)
+            response["accepted"] = result["accepted"]
+            response["failed"] = failed
+            if uncertain:
+                response["sessions_uncertain"] = len(uncertain)
+                response["uncertain"] = uncertain
+            return JSONResponse(status_code=status.HTTP_207_MULTI_STATUS, content=response)
+
+        return response
+
     except HTTPException:
         raise
     except Exception as e:
@@ -85,6 +137,128 @@ async def ingest_data(
         )
 
 
+@app.post("/ingest/stream")
+async def ingest_stream(
+    request: Request,
+    api_key: str = Depends(verify_API_key)
+):
+    """
+    以 NDJSON 串流接收蜜罐數據（每行一個 session）
+
+    body 會逐段解析，每累積 PUBLISH_CHUNK_SIZE 筆就發布到 Redis Stream，
+    峰值記憶體與上傳大小無關。
+
+    需要 Header: X-API-Key
+    Content-Type: application/x-ndjson
+    Content-Encoding（可選）: gzip / zstd
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content-Type must be one of {', '.join(NDJSON_CONTENT_TYPES)}"
+        )
+
+    content_encoding = (request.headers.get("content-encoding") or "identity").strip().lower()
+    if content_encoding not in SUPPORTED_ENCODINGS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported Content-Encoding: {content_encoding}"
+        )
+
+    published_count = 0
+    failed_count = 0
+    failed = []
+    uncertain_count = 0
+    uncertain = []
+    total_lines = 0
+
+    chunk = []
+    chunk_lines = []
+
+    def record_failure(line: int, sess_uuid, error: str):
+        nonlocal failed_count
+        failed_count += 1
+        if len(failed) < MAX_REPORTED_FAILURES:
+            failed.append({"line": line, "sess_uuid": sess_uuid, "error": error})
+
+    async def flush():
+        nonlocal published_count, uncertain_count
+        result = await publish_sessions(chunk)
+        published_count += result["published"]
+        for item in result["failed"]:
+            record_failure(chunk_lines[item["index"]], item["sess_uuid"], item["error"])
+        for item in result.get("uncertain", []):
+            uncertain_count += 1
+            if len(uncertain) < MAX_REPORTED_FAILURES:
+                uncertain.append({"line": chunk_lines[item["index"]], "sess_uuid": item["sess_uuid"], "error": item["error"]})
+        chunk.clear()
+        chunk_lines.clear()
+
+    try:
+        async for line_number, session, error in iter_ndjson(request.stream(), content_encoding):
+            total_lines = line_number
+            if error:
+                record_failure(line_number, None, error)
+                continue
+
+            chunk.append(session)
+            chunk_lines.append(line_number)
+            if len(chunk) >= PUBLISH_CHUNK_SIZE:
+                await flush()
+
+        if chunk:
+            await flush()
+
+    except StreamDecodeError as e:
+        # 已發布的 chunk 無法撤回，回報目前進度讓 agent 從失敗處重送
+        logging.error(f"❌ Stream decode error after {total_lines} lines: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "message": str(e),
+                "sessions_queued": published_count,
+                "last_line": total_lines
+            }
+        )
+    except Exception as e:
+        logging.error(f"❌ Error processing stream: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Internal server error: {str(e)}"
+        )
+
+    if failed_count and not published_count and not uncertain_count:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "message": "Failed to queue sessions",
+                "sessions_failed": failed_count,
+                "failed": failed
+            }
+        )
+
+    logging.info(f"✅ Streamed {published_count} sessions ({total_lines} lines) from API key {api_key[:8]}...")
+
+    partial = bool(failed_count or uncertain_count)
+    response = {
+        "status": "partial" if partial else "success",
+        "message": "Data partially queued for processing" if partial else "Data queued for processing",
+        "sessions_queued": published_count,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+    if partial:
+        response["sessions_failed"] = failed_count
+        response["failed"] = failed
+        if uncertain_count:
+            response["sessions_uncertain"] = uncertain_count
+            response["uncertain"] = uncertain
+        return JSONResponse(status_code=status.HTTP_207_MULTI_STATUS, content=response)
+
+    return response
+
+
 @app.get("/stats")
 async def get_stats(api_key: str = Depends(verify_API_key)):
     """
@@ -93,10 +267,14 @@ async def get_stats(api_key: str = Depends(verify_API_key)):
     需要 Header: X-API-Key
     """
     try:
-        stream_info = get_stream_info()
+        stream_info = await get_stream_info()
+        worker_metrics = await get_worker_metrics()
         return {
             "stream_length": stream_info.get("length", 0),
             "stream_groups": stream_info.get("groups", 0),
+            "pending_entries": worker_metrics.get("pel_size", 0),
+            "dead_letter_length": worker_metrics.get("dead_letter_length", 0),
+            "worker_metrics": worker_metrics,
             "timestamp": datetime.utcnow().isoformat()
         }
     except Exception as e:
@@ -0,0 +1,265 @@
+"""
+NDJSON 串流解析模組
+
+將請求 body 的 bytes 串流（可選 gzip / zstd 壓縮）逐行解析為 session，
+不需要把整個 body 讀進記憶體。
+"""
+
+import logging
+import os
+import zlib
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Any, Iterator, Optional, Tuple
+
+from codec import loads
+
+logger = logging.getLogger(__name__)
+
+# 單行（單一 session）最大長度，避免惡意或損壞的輸入撐爆記憶體
+MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", 4 * 1024 * 1024))
+# 每次解壓縮最多產生的 bytes 數
+DECOMPRESS_CHUNK_BYTES = 256 * 1024
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+SUPPORTED_ENCODINGS = {"identity", "gzip", "x-gzip"} | ({"zstd"} if ZSTD_AVAILABLE else set())
+
+
+class StreamDecodeError(ValueError):
+    """無法解碼請求串流（不支援的編碼、壓縮資料損壞、單行過長）"""
+
+
+async def _decompress_gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # 目前的 gzip member 是否已收到資料
+    started = False
+    try:
+        async for chunk in chunks:
+            data = chunk
+            while data:
+                started = True
+                output = decompressor.decompress(data, DECOMPRESS_CHUNK_BYTES)
+                if output:
+                    yield output
+                if decompressor.eof:
+                    # 多個 gzip member 串接（例如 cat a.gz b.gz）：剩餘資料是下一個 member
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    started = False
+                else:
+                    data = decompressor.unconsumed_tail
+
+        # 取出解壓縮器內尚未輸出的資料（同樣每次最多 DECOMPRESS_CHUNK_BYTES）
+        while started and not decompressor.eof:
+            output = decompressor.decompress(b"", DECOMPRESS_CHUNK_BYTES)
+            if not output:
+                break
+            yield output
+    except zlib.error as e:
+        raise StreamDecodeError(f"Invalid gzip data: {e}")
+
+    if started and not decompressor.eof:
+        raise StreamDecodeError("Truncated gzip data")
+
+
+class _NeedInput(Exception):
+    """_ChunkSource 目前沒有資料（還沒收到下一段 body）"""
+
+
+class _ChunkSource:
+    """
+    zstd stream_reader 的輸入：收到的 body 片段放在佇列中
+
+    佇列空了但 body 還沒結束時丟出 _NeedInput，讓 read1() 中斷，等收到下一段後再繼續；
+    read1() 在還沒有任何輸出時才會讀取輸入，中斷不會遺失已解壓縮的資料。
+    """
+
+    def __init__(self):
+        self.chunks: Deque[bytes] = deque()
+        self.finished = False
+
+    def read(self, size: int = -1) -> bytes:
+        if self.chunks:
+            return self.chunks.popleft()
+        if self.finished:
+            return b""
+        raise _NeedInput()
+
+
+ZSTD_MAGIC = 0xFD2FB528
+# skippable frame 的 magic 為 0x184D2A50 ~ 0x184D2A5F
+ZSTD_SKIPPABLE_MAGIC = 0x184D2A50
+
+
+class _ZstdFrameTracker:
+    """
+    追蹤壓縮輸入是否停在 frame 邊界
+
+    stream_reader 在輸入結束時不會回報最後一個 frame 不完整，這裡只讀取 frame header 與
+    block header（block 內容直接略過），不需要再解壓縮一次。
+    """
+
+    def __init__(self):
+        self.pending = bytearray()  # 尚未讀完的 header
+        self.skip = 0               # 目前 block / skippable frame 還要略過的 bytes
+        self.in_block = False       # 下一個 header 是 block header（否則是 frame header）
+        self.checksum = False       # 目前 frame 最後是否有 4 bytes checksum
+
+    @property
+    def complete(self) -> bool:
+        return not self.in_block and not self.skip and not self.pending
+
+    def _header_size(self) -> int:
+        # frame header 的長度要先讀到 magic 與 descriptor 才知道
+        if self.in_block:
+            return 3
+        if len(self.pending) < 4:
+            return 4
+        magic = int.from_bytes(self.pending[:4], "little")
+        if magic & 0xFFFFFFF0 == ZSTD_SKIPPABLE_MAGIC:
+            return 8
+        if magic != ZSTD_MAGIC:
+            raise StreamDecodeError("Invalid zstd data: unknown frame magic")
+        if len(self.pending) < 5:
+            return 5
+        return zstandard.frame_header_size(bytes(self.pending))
+
+    def _parse_header(self):
+        if self.in_block:
+            header = int.from_bytes(self.pending[:3], "little")
+            block_type = (header >> 1) & 3
+            # RLE block 的內容只有 1 byte
+            self.skip = 1 if block_type == 1 else header >> 3
+            if header & 1:
+                # 最後一個 block
+                self.skip += 4 if self.checksum else 0
+                self.in_block = False
+        elif int.from_bytes(self.pending[:4], "little") & 0xFFFFFFF0 == ZSTD_SKIPPABLE_MAGIC:
+            self.skip = int.from_bytes(self.pending[4:8], "little")
+        else:
+            self.checksum = zstandard.get_frame_parameters(bytes(self.pending)).has_checksum
+            self.in_block = True
+        self.pending.clear()
+
+    def feed(self, data: bytes):
+        pos = 0
+        while pos < len(data):
+            if self.skip:
+                step = min(self.skip, len(data) - pos)
+                self.skip -= step
+                pos += step
+                continue
+
+            take = min(self._header_size() - len(self.pending), len(data) - pos)
+            self.pending += data[pos:pos + take]
+            pos += take
+            if len(self.pending) == self._header_size():
+                self._parse_header()
+
+
+async def _decompress_zstd(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    source = _ChunkSource()
+    frames = _ZstdFrameTracker()
+    reader = zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True)
+
+    def drain() -> Iterator[bytes]:
+        # 每次最多輸出 DECOMPRESS_CHUNK_BYTES，高壓縮比的輸入也不會一次展開
+        while True:
+            try:
+                output = reader.read1(DECOMPRESS_CHUNK_BYTES)
+            except _NeedInput:
+                return
+            if not output:
+                return
+            yield output
+
+    try:
+        async for chunk in chunks:
+            if chunk:
+                frames.feed(chunk)
+                source.chunks.append(chunk)
+                for output in drain():
+                    yield output
+        source.finished = True
+        for output in drain():
+            yield output
+    except zstandard.ZstdError as e:
+        raise StreamDecodeError(f"Invalid zstd data: {e}")
+
+    if not frames.complete:
+        raise StreamDecodeError("Truncated zstd data")
+
+
+def decode_body(chunks: AsyncIterator[bytes], content_encoding: Optional[str]) -> AsyncIterator[bytes]:
+    """依 Content-Encoding 包裝解壓縮器"""
+    encoding = (content_encoding or "identity").strip().lower()
+
+    if encoding not in SUPPORTED_ENCODINGS:
+        raise StreamDecodeError(f"Unsupported Content-Encoding: {encoding}")
+
+    if encoding in ("gzip", "x-gzip"):
+        return _decompress_gzip(chunks)
+    if encoding == "zstd":
+        return _decompress_zstd(chunks)
+    return chunks
+
+
+async def iter_ndjson(
+    chunks: AsyncIterator[bytes],
+    content_encoding: Optional[str] = None
+) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    逐行解析 NDJSON 串流
+
+    Args:
+        chunks: 請求 body 的 bytes 串流
+        content_encoding: Content-Encoding header（gzip / zstd / identity）
+
+    Yields:
+        (line_number, session, error): 解析成功時 error 為 None，
+        解析失敗時 session 為 None（呼叫端決定是否略過）
+    """
+    buffer = bytearray()
+    line_number = 0
+
+    def parse(raw: bytes):
+        try:
+            session = loads(raw)
+        except ValueError as e:
+            return None, f"invalid JSON: {e}"
+        if not isinstance(session, dict):
+            return None, "each line must be a JSON object"
+        return session, None
+
+    async for data in decode_body(chunks, content_encoding):
+        buffer += data
+
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", start)
+            if newline == -1:
+                break
+
+            line = bytes(buffer[start:newline]).strip()
+            start = newline + 1
+            line_number += 1
+
+            if line:
+                session, error = parse(line)
+                yield line_number, session, error
+
+        del buffer[:start]
+
+        if len(buffer) > MAX_LINE_BYTES:
+            raise StreamDecodeError(f"Line {line_number + 1} exceeds {MAX_LINE_BYTES} bytes")
+
+    # 最後一行可能沒有換行符
+    line = bytes(buffer).strip()
+    if line:
+        line_number += 1
+        session, error = parse(line)
+        yield line_number, session, error
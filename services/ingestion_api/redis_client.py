@@ -1,8 +1,10 @@
 import os
 import redis
-import json
+import redis.asyncio as aioredis
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+
+from stream_message import encode_message
 
 logger = logging.getLogger(__name__)
 
@@ -10,59 +12,145 @@ logger = logging.getLogger(__name__)
 REDIS_HOST = os.getenv("REDIS_HOST", "analytics_redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 REDIS_STREAM = os.getenv("REDIS_STREAM", "sessions_stream")
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", 100000))  # 保留最近 10 萬筆（防止無限增長）
+PUBLISH_CHUNK_SIZE = int(os.getenv("PUBLISH_CHUNK_SIZE", 500))  # 每個 pipeline 的 XADD 數量
+DEAD_LETTER_STREAM = os.getenv("DEAD_LETTER_STREAM", f"{REDIS_STREAM}:dead_letter")
+WORKER_METRICS_KEY = os.getenv("WORKER_METRICS_KEY", f"{REDIS_STREAM}:worker_metrics")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+
+# 共享的 asyncio Redis 連接池（在應用啟動時建立）
+redis_pool: Optional[aioredis.ConnectionPool] = None
+
+
+async def init_redis_pool() -> None:
+    """建立共享的 asyncio Redis 連接池（於 FastAPI startup 呼叫）"""
+    global redis_pool
+
+    if redis_pool is not None:
+        return
+
+    redis_pool = aioredis.ConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=0,
+        decode_responses=False,  # 保持 bytes 格式
+        max_connections=REDIS_MAX_CONNECTIONS
+    )
+    logger.info(f"Redis pool created: {REDIS_HOST}:{REDIS_PORT} (max_connections={REDIS_MAX_CONNECTIONS})")
+
 
-# 創建 Redis 連接池
-redis_pool = redis.ConnectionPool(
-    host=REDIS_HOST,
-    port=REDIS_PORT,
-    db=0,
-    decode_responses=False,  # 保持 bytes 格式
-    max_connections=20
-)
+async def close_redis_pool() -> None:
+    """關閉共享連接池（於 FastAPI shutdown 呼叫）"""
+    global redis_pool
 
-def get_redis_client() -> redis.Redis:
-    return redis.Redis(connection_pool=redis_pool)
+    if redis_pool is not None:
+        await redis_pool.disconnect()
+        redis_pool = None
+        logger.info("Redis pool closed")
 
 
-def publish_sessions(sessions: List[Dict[str, Any]]) -> int:
+def get_redis_client() -> aioredis.Redis:
+    if redis_pool is None:
+        raise RuntimeError("Redis pool is not initialized, call init_redis_pool() first")
+    return aioredis.Redis(connection_pool=redis_pool)
+
+
+def encode_session(session: Dict[str, Any]) -> Dict[str, bytes]:
+    """將 session 編碼為 stream entry 欄位（格式由 STREAM_ENCODING 決定）"""
+    return encode_message(session)
+
+
+async def publish_sessions(
+    sessions: List[Dict[str, Any]],
+    chunk_size: Optional[int] = None
+) -> Dict[str, Any]:
     """
-    發布 sessions 到 Redis Stream
+    批次發布 sessions 到 Redis Stream
+
+    每個 chunk 使用一個 pipeline 送出（一次 RTT），每個 payload 只編碼一次。
+    部分失敗時，回傳結果會精確列出哪些 session 已寫入、哪些沒有：
+    - accepted：XADD 回傳了 message ID，確定已寫入
+    - failed：確定沒有寫入（編碼失敗、Redis 回傳錯誤、或連線中斷後未送出），可以直接重送
+    - uncertain：連線中斷時所在的 chunk，pipeline 沒有回傳結果，其中部分 XADD 可能已經寫入；
+      重送這些 session 可能產生重複
 
     Args:
         sessions: Session 數據列表
+        chunk_size: 每個 pipeline 的 XADD 數量，預設 PUBLISH_CHUNK_SIZE
 
     Returns:
-        int: 成功發布的數量
+        Dict: 發布結果
+            - published: 成功發布的數量
+            - accepted: [{"index", "sess_uuid", "message_id"}, ...]
+            - failed: [{"index", "sess_uuid", "error"}, ...]
+            - uncertain: [{"index", "sess_uuid", "error"}, ...]
     """
+    chunk_size = max(1, chunk_size or PUBLISH_CHUNK_SIZE)
     client = get_redis_client()
-    published_count = 0
 
-    try:
-        for session in sessions:
-            # 使用 XADD 添加到 Stream
-            message_id = client.xadd(
-                REDIS_STREAM,
-                {"data": json.dumps(session)},
-                maxlen=100000  # 保留最近 10 萬筆（防止無限增長）
-            )
-            published_count += 1
-            logger.debug(f"Published session {session.get('sess_uuid')} with ID {message_id}")
-
-        logger.info(f"✅ Published {published_count} sessions to Redis Stream: {REDIS_STREAM}")
-        return published_count
-
-    except redis.RedisError as e:
-        logger.error(f"❌ Redis error: {e}")
-        raise
-    except Exception as e:
-        logger.error(f"❌ Error publishing to Redis: {e}")
-        raise
+    accepted: List[Dict[str, Any]] = []
+    failed: List[Dict[str, Any]] = []
+    uncertain: List[Dict[str, Any]] = []
 
+    # === 1. 編碼（每個 payload 只編碼一次）===
+    encoded: List[Tuple[int, Any, Dict[str, bytes]]] = []
+    for index, session in enumerate(sessions):
+        sess_uuid = session.get('sess_uuid') if isinstance(session, dict) else None
+        try:
+            encoded.append((index, sess_uuid, encode_session(session)))
+        except (TypeError, ValueError, OverflowError) as e:
+            # OverflowError：msgpack 無法表示超過 64 位元的整數
+            failed.append({"index": index, "sess_uuid": sess_uuid, "error": f"encode error: {e}"})
 
-def get_stream_info() -> Dict[str, Any]:
+    # === 2. 分 chunk 以 pipeline 送出 ===
+    for start in range(0, len(encoded), chunk_size):
+        chunk = encoded[start:start + chunk_size]
+
+        try:
+            pipe = client.pipeline(transaction=False)
+            for _, _, fields in chunk:
+                pipe.xadd(REDIS_STREAM, fields, maxlen=STREAM_MAXLEN)
+            results = await pipe.execute(raise_on_error=False)
+
+        except redis.RedisError as e:
+            # 連線層錯誤：此 chunk 的指令可能已部分執行，無法確認；後續 chunk 沒有送出
+            logger.error(f"❌ Redis error while publishing chunk at {start}: {e}")
+            for index, sess_uuid, _ in chunk:
+                uncertain.append({"index": index, "sess_uuid": sess_uuid, "error": str(e)})
+            for index, sess_uuid, _ in encoded[start + len(chunk):]:
+                failed.append({"index": index, "sess_uuid": sess_uuid, "error": f"not sent: {e}"})
+            break
+
+        for (index, sess_uuid, _), result in zip(chunk, results):
+            if isinstance(result, Exception):
+                failed.append({"index": index, "sess_uuid": sess_uuid, "error": str(result)})
+            else:
+                message_id = result.decode() if isinstance(result, bytes) else result
+                accepted.append({"index": index, "sess_uuid": sess_uuid, "message_id": message_id})
+                logger.debug(f"Published session {sess_uuid} with ID {message_id}")
+
+    failed.sort(key=lambda x: x["index"])
+
+    if failed or uncertain:
+        logger.warning(
+            f"⚠️  Published {len(accepted)}/{len(sessions)} sessions to Redis Stream: "
+            f"{REDIS_STREAM} ({len(failed)} failed, {len(uncertain)} uncertain)"
+        )
+    else:
+        logger.info(f"✅ Published {len(accepted)} sessions to Redis Stream: {REDIS_STREAM}")
+
+    return {
+        "published": len(accepted),
+        "accepted": accepted,
+        "failed": failed,
+        "uncertain": uncertain
+    }
+
+
+async def get_stream_info() -> Dict[str, Any]:
     client = get_redis_client()
     try:
-        info = client.xinfo_stream(REDIS_STREAM)
+        info = await client.xinfo_stream(REDIS_STREAM)
         return {
             "length": info.get(b"length", 0),
             "first_entry": info.get(b"first-entry"),
@@ -76,10 +164,23 @@ def get_stream_info() -> Dict[str, Any]:
         return {}
 
 
-def health_check() -> bool:
+async def get_worker_metrics() -> Dict[str, Any]:
+    """讀取 analytics worker 寫入的回收 / 重試 / dead-letter 指標"""
+    client = get_redis_client()
+    try:
+        raw = await client.hgetall(WORKER_METRICS_KEY)
+        metrics = {k.decode(): int(v) for k, v in raw.items()}
+        metrics["dead_letter_length"] = await client.xlen(DEAD_LETTER_STREAM)
+        return metrics
+    except Exception as e:
+        logger.error(f"Error getting worker metrics: {e}")
+        return {}
+
+
+async def health_check() -> bool:
     try:
         client = get_redis_client()
-        return client.ping()
+        return await client.ping()
     except Exception as e:
         logger.error(f"Redis health check failed: {e}")
         return False
@@ -0,0 +1,87 @@
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("API_KEYS", "test-key")
+
+from fastapi.testclient import TestClient
+
+import main
+
+HEADERS = {"X-API-Key": os.environ["API_KEYS"].split(",")[0]}
+SESSIONS = [{"sess_uuid": "a"}, {"sess_uuid": "b"}]
+
+
+def publisher(result):
+    async def publish_sessions(sessions):
+        return result
+    return publish_sessions
+
+
+class IngestTest(unittest.TestCase):
+    def setUp(self):
+        # 不進入 context manager：不觸發 startup，不需要 Redis
+        self.client = TestClient(main.app)
+
+    def test_all_published_without_uncertain_key(self):
+        result = {"published": 2, "accepted": [], "failed": []}
+        with mock.patch.object(main, "publish_sessions", publisher(result)):
+            response = self.client.post("/ingest", json=SESSIONS, headers=HEADERS)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "success")
+        self.assertEqual(response.json()["sessions_queued"], 2)
+
+    def test_partial_failure_without_uncertain_key(self):
+        result = {
+            "published": 1,
+            "accepted": [{"index": 0, "sess_uuid": "a", "message_id": "1-0"}],
+            "failed": [{"index": 1, "sess_uuid": "b", "error": "OOM"}],
+        }
+        with mock.patch.object(main, "publish_sessions", publisher(result)):
+            response = self.client.post("/ingest", json=SESSIONS, headers=HEADERS)
+
+        self.assertEqual(response.status_code, 207)
+        body = response.json()
+        self.assertEqual(body["sessions_failed"], 1)
+        self.assertNotIn("uncertain", body)
+
+    def test_nothing_published_without_uncertain_key(self):
+        result = {
+            "published": 0,
+            "accepted": [],
+            "failed": [{"index": i, "sess_uuid": s["sess_uuid"], "error": "down"} for i, s in enumerate(SESSIONS)],
+        }
+        with mock.patch.object(main, "publish_sessions", publisher(result)):
+            response = self.client.post("/ingest", json=SESSIONS, headers=HEADERS)
+
+        self.assertEqual(response.status_code, 503)
+
+    def test_uncertain_reported(self):
+        result = {
+            "published": 0,
+            "accepted": [],
+            "failed": [{"index": 1, "sess_uuid": "b", "error": "not sent: reset"}],
+            "uncertain": [{"index": 0, "sess_uuid": "a", "error": "reset"}],
+        }
+        with mock.patch.object(main, "publish_sessions", publisher(result)):
+            response = self.client.post("/ingest", json=SESSIONS, headers=HEADERS)
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.json()["sessions_uncertain"], 1)
+
+    def test_ndjson_without_uncertain_key(self):
+        async def publish_sessions(sessions):
+            return {"published": len(sessions), "accepted": [], "failed": []}
+
+        body = b'{"sess_uuid": "a"}\n{"sess_uuid": "b"}\n'
+        headers = dict(HEADERS, **{"Content-Type": "application/x-ndjson"})
+        with mock.patch.object(main, "publish_sessions", publish_sessions):
+            response = self.client.post("/ingest/stream", content=body, headers=headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["sessions_queued"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import gzip
+import json
+import os
+import unittest
+
+import zstandard
+
+from ndjson_stream import iter_ndjson, StreamDecodeError
+
+LINES = [{"sess_uuid": f"{i:08x}", "payload": os.urandom(16).hex()} for i in range(2000)]
+BODY = b"".join(json.dumps(line).encode() + b"\n" for line in LINES)
+
+
+async def body_chunks(data: bytes, size: int = 1000):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def parse(data: bytes, encoding: str, size: int = 1000):
+    async def collect():
+        return [item async for item in iter_ndjson(body_chunks(data, size), encoding)]
+    return asyncio.run(collect())
+
+
+class NdjsonStreamTest(unittest.TestCase):
+    def assert_all_lines(self, result):
+        self.assertEqual([session for _, session, _ in result], LINES)
+        self.assertTrue(all(error is None for _, _, error in result))
+
+    def test_gzip(self):
+        self.assert_all_lines(parse(gzip.compress(BODY), "gzip"))
+
+    def test_gzip_multiple_members(self):
+        half = len(BODY) // 2
+        data = gzip.compress(BODY[:half]) + gzip.compress(BODY[half:])
+        self.assert_all_lines(parse(data, "gzip"))
+
+    def test_truncated_gzip(self):
+        data = gzip.compress(BODY)
+        for cut in (len(data) // 2, len(data) - 4, len(data) - 1):
+            with self.assertRaises(StreamDecodeError):
+                parse(data[:cut], "gzip")
+
+    def test_zstd(self):
+        self.assert_all_lines(parse(zstandard.ZstdCompressor().compress(BODY), "zstd"))
+
+    def test_zstd_multiple_frames(self):
+        half = len(BODY) // 2
+        data = (
+            zstandard.ZstdCompressor(write_checksum=True).compress(BODY[:half])
+            # skippable frame
+            + (0x184D2A5A).to_bytes(4, "little") + (3).to_bytes(4, "little") + b"abc"
+            + zstandard.ZstdCompressor(write_content_size=False).compress(BODY[half:])
+        )
+        for size in (1, 7, 1000, len(data)):
+            self.assert_all_lines(parse(data, "zstd", size))
+
+    def test_zstd_streaming_compressor(self):
+        compressor = zstandard.ZstdCompressor(level=1).compressobj()
+        data = b"".join(compressor.compress(BODY[i:i + 4096]) for i in range(0, len(BODY), 4096))
+        data += compressor.flush()
+        self.assert_all_lines(parse(data, "zstd"))
+
+    def test_truncated_zstd(self):
+        data = zstandard.ZstdCompressor(write_checksum=True).compress(BODY)
+        # frame header 中、第一個 block 中、最後的 checksum 中
+        for cut in (3, 6, len(data) // 2, len(data) - 4, len(data) - 1):
+            with self.assertRaises(StreamDecodeError):
+                parse(data[:cut], "zstd")
+
+    def test_truncated_second_zstd_frame(self):
+        half = len(BODY) // 2
+        first = zstandard.ZstdCompressor().compress(BODY[:half])
+        second = zstandard.ZstdCompressor().compress(BODY[half:])
+        with self.assertRaises(StreamDecodeError):
+            parse(first + second[:len(second) // 2], "zstd")
+
+    def test_empty_body(self):
+        self.assertEqual(parse(b"", "zstd"), [])
+        self.assertEqual(parse(b"", "gzip"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
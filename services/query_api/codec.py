@@ -0,0 +1,119 @@
+"""
+JSON 編解碼模組
+
+所有服務共用的 JSON 編解碼層（ingestion_api / analytics_worker / query_api 各保留一份
+相同的副本，因為每個服務都是獨立的 Docker build context）。
+
+- 優先使用 orjson，其次 msgspec，皆不可用時退回標準庫 json
+- dumps() 一律輸出 UTF-8 bytes（緊湊格式、保留非 ASCII 字元）
+- loads() 直接接受 bytes / bytearray / memoryview / str，不需要先 .decode()
+
+可用 JSON_CODEC 環境變數強制指定：auto（預設）、orjson、msgspec、json
+"""
+
+import json
+import logging
+import os
+from typing import Any, Union
+
+logger = logging.getLogger(__name__)
+
+JSON_CODEC = os.getenv("JSON_CODEC", "auto").lower()
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+
+def _select_backend() -> str:
+    if JSON_CODEC == "orjson" and ORJSON_AVAILABLE:
+        return "orjson"
+    if JSON_CODEC == "msgspec" and MSGSPEC_AVAILABLE:
+        return "msgspec"
+    if JSON_CODEC == "json":
+        return "json"
+
+    if JSON_CODEC not in ("auto", "orjson", "msgspec"):
+        logger.warning(f"Unknown JSON_CODEC: {JSON_CODEC}, using auto")
+
+    if ORJSON_AVAILABLE:
+        return "orjson"
+    if MSGSPEC_AVAILABLE:
+        return "msgspec"
+    return "json"
+
+
+BACKEND = _select_backend()
+
+BytesLike = Union[bytes, bytearray, memoryview, str]
+
+
+def _std_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _std_loads(data: BytesLike) -> Any:
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+if BACKEND == "orjson":
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """序列化為 UTF-8 JSON bytes"""
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTS)
+        except TypeError:
+            # 例如超過 64 位元的整數或自訂型別，退回標準庫
+            return _std_dumps(obj)
+
+    def loads(data: BytesLike) -> Any:
+        """從 bytes / str 反序列化"""
+        return orjson.loads(data)
+
+elif BACKEND == "msgspec":
+    _encoder = msgspec.json.Encoder()
+    _decoder = msgspec.json.Decoder()
+
+    def dumps(obj: Any) -> bytes:
+        """序列化為 UTF-8 JSON bytes"""
+        try:
+            return _encoder.encode(obj)
+        except (TypeError, msgspec.EncodeError):
+            return _std_dumps(obj)
+
+    def loads(data: BytesLike) -> Any:
+        """從 bytes / str 反序列化"""
+        try:
+            return _decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e))
+
+else:
+    dumps = _std_dumps
+    loads = _std_loads
+
+
+def dumps_pretty(obj: Any) -> bytes:
+    """序列化為縮排 2 格的 JSON bytes（用於 summary.json 等給人閱讀的檔案）"""
+    if BACKEND == "orjson":
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTS | orjson.OPT_INDENT_2)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+
+
+def dumps_str(obj: Any) -> str:
+    """序列化為 str（給只接受字串的 API 使用）"""
+    return dumps(obj).decode("utf-8")
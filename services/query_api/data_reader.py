@@ -1,35 +1,190 @@
-import json
+import bisect
+import heapq
+import itertools
+import math
 import os
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from datetime import datetime, timedelta
 
+from codec import loads
+from file_cache import cache
+from hyperloglog import HyperLogLog
+import jsonl_reader
+import pagination
+import parquet_reader
+import sqlite_reader
+import session_index
+
 logger = logging.getLogger(__name__)
 
 # 資料目錄（與 analytics_worker 共享）
 DATA_DIR = os.getenv("DATA_DIR", "/app/data")
 
+# 跨日查詢：最多涵蓋的天數，與並行查詢各天資料的執行緒數
+QUERY_MAX_RANGE_DAYS = int(os.getenv("QUERY_MAX_RANGE_DAYS", 31))
+QUERY_RANGE_THREADS = int(os.getenv("QUERY_RANGE_THREADS", 4))
 
-def read_jsonl_file(file_path: Path) -> List[Dict[str, Any]]:
-    """讀取 JSONL 檔案"""
-    sessions = []
+# 與 main.py 的查詢執行緒池分開，避免巢狀提交時互相等待
+_range_executor = ThreadPoolExecutor(max_workers=QUERY_RANGE_THREADS, thread_name_prefix="range-query")
 
-    if not file_path.exists():
-        return sessions
 
+def read_jsonl_file(file_path: Path) -> List[Dict[str, Any]]:
+    """讀取 JSONL 檔案（經由快取，回傳新的 list，但記錄本身是共用的，不可修改）"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    sessions.append(json.loads(line))
-        return sessions
+        return list(cache.get_jsonl(file_path))
     except Exception as e:
         logger.error(f"Error reading JSONL file {file_path}: {e}")
         return []
 
 
+def read_day_sessions(date: str) -> List[Dict[str, Any]]:
+    """讀取某天所有 session 的完整資料（sessions.jsonl、Parquet 檔案與資料庫）"""
+    processed_dir = Path(DATA_DIR) / "processed" / date
+    sessions = read_jsonl_file(processed_dir / "sessions.jsonl")
+    sessions.extend(parquet_reader.read_sessions(processed_dir))
+    sessions.extend(sqlite_reader.read_sessions(date))
+    return sessions
+
+
+def get_day_sources(date: str) -> List[str]:
+    """某天的資料來源：jsonl、parquet、database"""
+    processed_dir = Path(DATA_DIR) / "processed" / date
+    sources = []
+    if (processed_dir / "sessions.jsonl").exists():
+        sources.append("jsonl")
+    if parquet_reader.list_parquet_files(processed_dir):
+        sources.append("parquet")
+    if sqlite_reader.has_date(date):
+        sources.append("database")
+    return sources
+
+
+def find_session_in_day(date: str, uuid: str) -> Optional[Dict[str, Any]]:
+    """在某天的資料中以 UUID 查詢 session"""
+    processed_dir = Path(DATA_DIR) / "processed" / date
+
+    file_path = processed_dir / "sessions.jsonl"
+    if file_path.exists():
+        # 有索引時只需一次 seek 與一次解析；沒有索引（舊資料）時掃描整個檔案
+        resolved, session = session_index.find_session(file_path, uuid)
+        if session is not None:
+            return session
+        if not resolved:
+            # 只解析原始內容含有這個 UUID 的行
+            for _, _, session in jsonl_reader.iter_records(file_path, _tokens(uuid)):
+                if session.get('sess_uuid') == uuid:
+                    return session
+
+    return parquet_reader.find_session(processed_dir, uuid)
+
+
+def _tokens(*values: Optional[str], case_sensitive: bool = True) -> List[bytes]:
+    """可以在原始 bytes 上預先比對的過濾條件"""
+    tokens = [jsonl_reader.prefilter_token(value, case_sensitive) for value in values]
+    return [token for token in tokens if token]
+
+
+def _session_matches(
+    session: Dict[str, Any],
+    threat_level: Optional[str],
+    attack_type: Optional[str],
+    min_risk: Optional[int],
+    peer_ip: Optional[str],
+    sess_uuid: Optional[str],
+    requires_review: Optional[bool],
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+) -> bool:
+    """session 是否符合 get_sessions 的過濾條件"""
+    # 威脅等級過濾
+    if threat_level and session.get('threat_level') != threat_level:
+        return False
+
+    # 攻擊類型過濾
+    if attack_type:
+        session_attacks = session.get('attack_types', [])
+        if attack_type not in session_attacks:
+            return False
+
+    # 最小風險分數過濾
+    if min_risk is not None:
+        if session.get('risk_score', 0) < min_risk:
+            return False
+
+    # 來源 IP 過濾 (支援部分匹配)
+    if peer_ip:
+        session_ip = session.get('peer_ip', '')
+        if peer_ip.lower() not in session_ip.lower():
+            return False
+
+    # 會話 UUID 過濾 (支援部分匹配)
+    if sess_uuid:
+        session_uuid = session.get('sess_uuid', '')
+        if sess_uuid.lower() not in session_uuid.lower():
+            return False
+
+    # 需要人工審查過濾
+    if requires_review is not None:
+        if session.get('requires_review', False) != requires_review:
+            return False
+
+    # 處理時間範圍 [start_time, end_time)
+    if start_time or end_time:
+        processed_at = session.get('processed_at') or ''
+        if start_time and processed_at < start_time:
+            return False
+        if end_time and processed_at >= end_time:
+            return False
+
+    return True
+
+
+def session_summary(session: Dict[str, Any]) -> Dict[str, Any]:
+    """把完整的 session 轉換為列表用的摘要格式"""
+    ua_info = session.get('user_agent_info', {})
+
+    return {
+        "sess_uuid": session.get('sess_uuid'),
+        "peer_ip": session.get('peer_ip'),
+        "peer_port": session.get('peer_port'),
+        "user_agent": session.get('user_agent'),
+        "attack_types": session.get('attack_types', []),
+        "risk_score": session.get('risk_score'),
+        "threat_level": session.get('threat_level'),
+        "alert_level": session.get('alert_level'),
+        "processed_at": session.get('processed_at'),
+        "total_requests": session.get('total_requests'),
+        "has_malicious_activity": session.get('has_malicious_activity'),
+        "is_scanner": ua_info.get('is_scanner'),
+        "tool_identified": ua_info.get('tool_identified')
+    }
+
+
+def _page(
+    items: List[Dict[str, Any]],
+    total: int,
+    limit: int,
+    offset: int,
+    sort_by: str,
+    order: str
+) -> Dict[str, Any]:
+    """分頁資訊：items 最多多取一筆，用來判斷是否還有下一頁"""
+    has_more = len(items) > limit
+    del items[limit:]
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "has_more": has_more,
+        "next_cursor": pagination.encode_cursor(items[-1], sort_by, order) if has_more and items else None
+    }
+
+
 def get_sessions(
     date: str,
     threat_level: Optional[str] = None,
@@ -41,120 +196,231 @@ def get_sessions(
     limit: int = 50,
     offset: int = 0,
     sort_by: str = "processed_at",
-    order: str = "desc"
+    order: str = "desc",
+    cursor: Optional[pagination.Cursor] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     獲取會話列表（支援過濾、分頁、排序）
+
+    依 (排序鍵, sess_uuid) 排序；指定 cursor（上一頁的 next_cursor）時從游標之後開始，忽略 offset。
+    start_time / end_time 限制 processed_at 的範圍 [start_time, end_time)（ISO 格式字串）。
+
+    當天只有 Parquet 檔案時走欄式路徑（只讀取摘要需要的欄位），
+    只有資料庫時以 SQL 查詢（使用索引），只有 sessions.jsonl 且索引完整時以二級索引過濾、
+    只解析本頁的記錄；其他情況讀取完整資料後過濾。
     """
-    # 讀取檔案
-    file_path = Path(DATA_DIR) / "processed" / date / "sessions.jsonl"
-    all_sessions = read_jsonl_file(file_path)
-
-    # 過濾
-    filtered_sessions = []
-    for session in all_sessions:
-        # 威脅等級過濾
-        if threat_level and session.get('threat_level') != threat_level:
-            continue
+    if cursor is not None:
+        offset = 0
+    query_args = dict(
+        threat_level=threat_level,
+        attack_type=attack_type,
+        min_risk=min_risk,
+        peer_ip=peer_ip,
+        sess_uuid=sess_uuid,
+        requires_review=requires_review,
+        # 多取一筆判斷是否還有下一頁
+        limit=limit + 1,
+        offset=offset,
+        sort_by=sort_by,
+        order=order,
+        cursor=cursor,
+        start_time=start_time,
+        end_time=end_time
+    )
+
+    sources = get_day_sources(date)
+    if sources == ["jsonl"]:
+        file_path = Path(DATA_DIR) / "processed" / date / "sessions.jsonl"
+        result = session_index.query_sessions(file_path, **query_args)
+        if result is not None:
+            total, positions = result
+            session_summaries = [session_summary(s) for s in jsonl_reader.read_at(file_path, positions)]
+            return {"sessions": session_summaries, **_page(session_summaries, total, limit, offset, sort_by, order)}
+
+    if sources in (["parquet"], ["database"]):
+        if sources == ["parquet"]:
+            query, target = parquet_reader.query_sessions, Path(DATA_DIR) / "processed" / date
+        else:
+            query, target = sqlite_reader.query_sessions, date
 
-        # 攻擊類型過濾
-        if attack_type:
-            session_attacks = session.get('attack_types', [])
-            if attack_type not in session_attacks:
-                continue
+        total, session_summaries = query(target, **query_args)
+        for summary in session_summaries:
+            summary.pop('requires_review', None)
+            summary['attack_types'] = summary.get('attack_types') or []
 
-        # 最小風險分數過濾
-        if min_risk is not None:
-            if session.get('risk_score', 0) < min_risk:
-                continue
+        return {"sessions": session_summaries, **_page(session_summaries, total, limit, offset, sort_by, order)}
 
-        # 來源 IP 過濾 (支援部分匹配)
-        if peer_ip:
-            session_ip = session.get('peer_ip', '')
-            if peer_ip.lower() not in session_ip.lower():
-                continue
+    # 過濾：sessions.jsonl 先在原始 bytes 上預先過濾，只保留排序鍵與位置，分頁後才解析本頁
+    processed_dir = Path(DATA_DIR) / "processed" / date
+    jsonl_file = processed_dir / "sessions.jsonl"
+    contains = _tokens(threat_level, attack_type) + _tokens(peer_ip, sess_uuid, case_sensitive=False)
+    reverse = (order == "desc")
 
-        # 會話 UUID 過濾 (支援部分匹配)
-        if sess_uuid:
-            session_uuid = session.get('sess_uuid', '')
-            if sess_uuid.lower() not in session_uuid.lower():
-                continue
+    # (排序鍵, 序號, (offset, length) 或完整 session)；序號讓重複的記錄有固定的順序（與索引路徑相同）
+    matches = []
+    filters = (threat_level, attack_type, min_risk, peer_ip, sess_uuid, requires_review, start_time, end_time)
+    for line_offset, length, session in jsonl_reader.iter_records(jsonl_file, contains):
+        if _session_matches(session, *filters):
+            matches.append((pagination.sort_key(session, sort_by), len(matches), (line_offset, length)))
 
-        # 需要人工審查過濾
-        if requires_review is not None:
-            if session.get('requires_review', False) != requires_review:
-                continue
+    other_sessions = parquet_reader.read_sessions(processed_dir) + sqlite_reader.read_sessions(date)
+    for session in other_sessions:
+        if _session_matches(session, *filters):
+            matches.append((pagination.sort_key(session, sort_by), len(matches), session))
 
-        filtered_sessions.append(session)
+    total = len(matches)
+    if cursor is not None:
+        matches = [m for m in matches if (m[0] < cursor if reverse else m[0] > cursor)]
 
-    # 排序
-    reverse = (order == "desc")
+    # 排序、分頁：只需要前 offset + limit + 1 筆
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    page = select(offset + limit + 1, matches, key=lambda m: m[:2])[offset:]
 
-    if sort_by == "risk_score":
-        filtered_sessions.sort(
-            key=lambda x: x.get('risk_score', 0),
-            reverse=reverse
-        )
-    elif sort_by == "processed_at":
-        filtered_sessions.sort(
-            key=lambda x: x.get('processed_at', ''),
-            reverse=reverse
+    jsonl_sessions = iter(jsonl_reader.read_at(jsonl_file, [ref for _, _, ref in page if not isinstance(ref, dict)]))
+    paginated_sessions = [ref if isinstance(ref, dict) else next(jsonl_sessions) for _, _, ref in page]
+
+    # 轉換為摘要格式
+    session_summaries = [session_summary(session) for session in paginated_sessions]
+
+    return {"sessions": session_summaries, **_page(session_summaries, total, limit, offset, sort_by, order)}
+
+
+def range_days(start: datetime, end: datetime) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    [start, end) 涵蓋的有資料的日期（遞增）
+
+    Returns:
+        [(日期, start_time, end_time)]；時間範圍只在 start / end 切到當天中間時才有值（否則為 None，不需過濾）
+    """
+    available = set(get_available_dates())
+    days = []
+    day_start = datetime.combine(start.date(), datetime.min.time())
+    while day_start < end:
+        day_end = day_start + timedelta(days=1)
+        date = day_start.strftime("%Y-%m-%d")
+        if date in available:
+            days.append((
+                date,
+                start.isoformat() if start > day_start else None,
+                end.isoformat() if end < day_end else None
+            ))
+        day_start = day_end
+    return days
+
+
+def get_sessions_range(
+    start: datetime,
+    end: datetime,
+    threat_level: Optional[str] = None,
+    attack_type: Optional[str] = None,
+    min_risk: Optional[int] = None,
+    peer_ip: Optional[str] = None,
+    sess_uuid: Optional[str] = None,
+    requires_review: Optional[bool] = None,
+    limit: int = 50,
+    offset: int = 0,
+    sort_by: str = "processed_at",
+    order: str = "desc",
+    cursor: Optional[pagination.Cursor] = None
+) -> Dict[str, Any]:
+    """
+    跨日查詢會話列表：processed_at 在 [start, end) 之間（UTC）
+
+    各天的資料並行查詢，每天只取本頁可能需要的前 offset + limit + 1 筆（已依排序鍵排好），
+    再以 heap 合併（每天同時只比較一筆）；排序鍵 (排序鍵, sess_uuid) 在各天之間是全域的，
+    同一個游標可以直接用在每一天。只有跨到 start / end 中間的那一天才需要時間過濾。
+    """
+    if cursor is not None:
+        offset = 0
+
+    def query_day(day: Tuple[str, Optional[str], Optional[str]]) -> Dict[str, Any]:
+        date, start_time, end_time = day
+        return get_sessions(
+            date,
+            threat_level=threat_level,
+            attack_type=attack_type,
+            min_risk=min_risk,
+            peer_ip=peer_ip,
+            sess_uuid=sess_uuid,
+            requires_review=requires_review,
+            limit=offset + limit + 1,
+            offset=0,
+            sort_by=sort_by,
+            order=order,
+            cursor=cursor,
+            start_time=start_time,
+            end_time=end_time
         )
 
-    # 分頁
-    total = len(filtered_sessions)
-    paginated_sessions = filtered_sessions[offset:offset + limit]
+    results = list(_range_executor.map(query_day, range_days(start, end)))
 
-    # 轉換為摘要格式
-    session_summaries = []
-    for session in paginated_sessions:
-        ua_info = session.get('user_agent_info', {})
+    merged = heapq.merge(
+        *(result["sessions"] for result in results),
+        key=lambda summary: pagination.sort_key(summary, sort_by),
+        reverse=(order == "desc")
+    )
+    session_summaries = list(itertools.islice(merged, offset, offset + limit + 1))
+    total = sum(result["total"] for result in results)
 
-        summary = {
-            "sess_uuid": session.get('sess_uuid'),
-            "peer_ip": session.get('peer_ip'),
-            "peer_port": session.get('peer_port'),
-            "user_agent": session.get('user_agent'),
-            "attack_types": session.get('attack_types', []),
-            "risk_score": session.get('risk_score'),
-            "threat_level": session.get('threat_level'),
-            "alert_level": session.get('alert_level'),
-            "processed_at": session.get('processed_at'),
-            "total_requests": session.get('total_requests'),
-            "has_malicious_activity": session.get('has_malicious_activity'),
-            "is_scanner": ua_info.get('is_scanner'),
-            "tool_identified": ua_info.get('tool_identified')
-        }
-        session_summaries.append(summary)
+    return {"sessions": session_summaries, **_page(session_summaries, total, limit, offset, sort_by, order)}
 
-    return {
-        "sessions": session_summaries,
-        "total": total,
-        "limit": limit,
-        "offset": offset,
-        "has_more": (offset + limit) < total
-    }
+
+def iter_sessions_range(
+    start: datetime,
+    end: datetime,
+    threat_level: Optional[str] = None,
+    attack_type: Optional[str] = None,
+    min_risk: Optional[int] = None,
+    peer_ip: Optional[str] = None,
+    sess_uuid: Optional[str] = None,
+    requires_review: Optional[bool] = None
+) -> Iterator[Tuple[bytes, Dict[str, Any]]]:
+    """
+    逐筆產生 processed_at 在 [start, end) 之間、符合過濾條件的完整 session：(原始 JSON, session)
+
+    逐天、逐個來源讀取（依日期與寫入順序，不排序），不建立整天的 list，供批次匯出使用。
+    """
+    contains = _tokens(threat_level, attack_type) + _tokens(peer_ip, sess_uuid, case_sensitive=False)
+
+    for date, start_time, end_time in range_days(start, end):
+        filters = (threat_level, attack_type, min_risk, peer_ip, sess_uuid, requires_review, start_time, end_time)
+        processed_dir = Path(DATA_DIR) / "processed" / date
+        documents = itertools.chain(
+            (bytes(line) for _, line in jsonl_reader.iter_lines(processed_dir / "sessions.jsonl", contains)),
+            parquet_reader.iter_documents(processed_dir),
+            sqlite_reader.iter_documents(date)
+        )
+        for document in documents:
+            try:
+                session = loads(document)
+            except ValueError:
+                logger.warning(f"Skipping unparsable session in {date}")
+                continue
+            if _session_matches(session, *filters):
+                yield document, session
 
 
 def get_session_by_uuid(uuid: str, max_days: int = 30) -> Optional[Dict[str, Any]]:
     """
     根據 UUID 獲取完整會話資料
 
-    會在最近 max_days 天的資料中搜尋，如果找不到則搜尋所有可用日期
+    資料庫中有的話以索引直接查詢；否則在最近 max_days 天的資料中搜尋，如果找不到則搜尋所有可用日期
     """
+    session = sqlite_reader.find_session(uuid)
+    if session is not None:
+        return session
+
     # 先搜尋最近幾天的資料（快速路徑）
     for i in range(max_days):
         date = (datetime.utcnow() - timedelta(days=i)).strftime("%Y-%m-%d")
-        file_path = Path(DATA_DIR) / "processed" / date / "sessions.jsonl"
-
-        if not file_path.exists():
+        if not (Path(DATA_DIR) / "processed" / date).exists():
             continue
 
-        sessions = read_jsonl_file(file_path)
-
-        for session in sessions:
-            if session.get('sess_uuid') == uuid:
-                return session
+        session = find_session_in_day(date, uuid)
+        if session is not None:
+            return session
 
     # 如果最近 max_days 天找不到，搜尋所有可用日期（慢速路徑）
     available_dates = get_available_dates()
@@ -168,133 +434,231 @@ def get_session_by_uuid(uuid: str, max_days: int = 30) -> Optional[Dict[str, Any
         except ValueError as e:
             continue
 
-        file_path = Path(DATA_DIR) / "processed" / date / "sessions.jsonl"
-        sessions = read_jsonl_file(file_path)
-
-        for session in sessions:
-            if session.get('sess_uuid') == uuid:
-                return session
+        session = find_session_in_day(date, uuid)
+        if session is not None:
+            return session
 
     return None
 
 
+def alert_summary(alert: Dict[str, Any]) -> Dict[str, Any]:
+    """把完整的警報轉換為列表用的摘要格式"""
+    ua_info = alert.get('user_agent_info', {})
+
+    return {
+        "sess_uuid": alert.get('sess_uuid'),
+        "peer_ip": alert.get('peer_ip'),
+        "alert_level": alert.get('alert_level'),
+        "threat_level": alert.get('threat_level'),
+        "risk_score": alert.get('risk_score'),
+        "attack_types": list(set(alert.get('attack_types', []))),  # 去重
+        "tool_identified": ua_info.get('tool_identified'),
+        "processed_at": alert.get('processed_at'),
+        "recommendations_count": len(alert.get('recommendations', []))
+    }
+
+
+# 警報列表依 (risk_score, sess_uuid) 降序排列
+ALERT_SORT_BY = "risk_score"
+ALERT_ORDER = "desc"
+
+# 排序結果最多保留的組合數（日期 × 等級）；排序結果引用檔案快取中的記錄，保留太多會繞過檔案快取的預算
+ALERT_SORT_CACHE_ENTRIES = 8
+
+# 各來源檔案的 (path, inode, size, mtime) → (依排序鍵遞增排序的警報, 對應的排序鍵)
+AlertSortKey = Tuple[Tuple[Path, int, int, int], ...]
+_sorted_alerts: "OrderedDict[AlertSortKey, Tuple[List[Dict[str, Any]], List[pagination.Cursor]]]" = OrderedDict()
+_sorted_alerts_lock = threading.Lock()
+
+
+def _file_signature(file_path: Path) -> Tuple[Path, int, int, int]:
+    try:
+        stat = file_path.stat()
+    except FileNotFoundError:
+        return file_path, 0, -1, 0
+    return file_path, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def _read_sorted_alerts(alert_files: List[Path]) -> Tuple[List[Dict[str, Any]], List[pagination.Cursor]]:
+    """讀取並排序警報；來源檔案沒有變更時沿用上次的排序結果（LRU，最多 ALERT_SORT_CACHE_ENTRIES 組）"""
+    key = tuple(_file_signature(file_path) for file_path in alert_files)
+    with _sorted_alerts_lock:
+        cached = _sorted_alerts.get(key)
+        if cached is not None:
+            _sorted_alerts.move_to_end(key)
+            return cached
+
+    sources = []
+    for file_path in alert_files:
+        try:
+            sources.append(cache.get_jsonl(file_path))
+        except Exception as e:
+            logger.error(f"Error reading JSONL file {file_path}: {e}")
+            sources.append([])
+
+    alerts = sorted(
+        (alert for records in sources for alert in records),
+        key=lambda alert: pagination.sort_key(alert, ALERT_SORT_BY)
+    )
+    keys = [pagination.sort_key(alert, ALERT_SORT_BY) for alert in alerts]
+
+    with _sorted_alerts_lock:
+        _sorted_alerts[key] = (alerts, keys)
+        _sorted_alerts.move_to_end(key)
+        while len(_sorted_alerts) > ALERT_SORT_CACHE_ENTRIES:
+            _sorted_alerts.popitem(last=False)
+    return alerts, keys
+
+
 def get_alerts(
     date: str,
     alert_level: Optional[str] = None,
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[pagination.Cursor] = None
 ) -> Dict[str, Any]:
-    """獲取警報列表"""
+    """
+    獲取警報列表（按風險分數降序）
+
+    指定 cursor（上一頁的 next_cursor）時從游標之後開始，忽略 offset。
+    """
     # 確定檔案路徑
     alerts_dir = Path(DATA_DIR) / "alerts" / date
 
-    all_alerts = []
-
     # 讀取不同等級的警報檔案
     if alert_level:
         # 只讀取特定等級
-        file_path = alerts_dir / f"{alert_level.lower()}_alerts.jsonl"
-        all_alerts = read_jsonl_file(file_path)
+        alert_files = [alerts_dir / f"{alert_level.lower()}_alerts.jsonl"]
     else:
         # 讀取所有警報
-        for level in ['critical', 'high']:
-            file_path = alerts_dir / f"{level}_alerts.jsonl"
-            all_alerts.extend(read_jsonl_file(file_path))
+        alert_files = [alerts_dir / f"{level}_alerts.jsonl" for level in ['critical', 'high']]
 
-    # 排序（按風險分數降序）
-    all_alerts.sort(key=lambda x: x.get('risk_score', 0), reverse=True)
+    all_alerts, keys = _read_sorted_alerts(alert_files)
 
-    # 分頁
-    total = len(all_alerts)
-    paginated_alerts = all_alerts[offset:offset + limit]
+    # 分頁（降序：從尾端往前取）
+    if cursor is not None:
+        offset = 0
+        end = bisect.bisect_left(keys, cursor)
+    else:
+        end = len(all_alerts) - offset
+    paginated_alerts = all_alerts[max(end - limit - 1, 0):max(end, 0)][::-1]
 
     # 轉換為摘要格式
-    alert_summaries = []
-    for alert in paginated_alerts:
-        ua_info = alert.get('user_agent_info', {})
-
-        summary = {
-            "sess_uuid": alert.get('sess_uuid'),
-            "peer_ip": alert.get('peer_ip'),
-            "alert_level": alert.get('alert_level'),
-            "threat_level": alert.get('threat_level'),
-            "risk_score": alert.get('risk_score'),
-            "attack_types": list(set(alert.get('attack_types', []))),  # 去重
-            "tool_identified": ua_info.get('tool_identified'),
-            "processed_at": alert.get('processed_at'),
-            "recommendations_count": len(alert.get('recommendations', []))
-        }
-        alert_summaries.append(summary)
+    alert_summaries = [alert_summary(alert) for alert in paginated_alerts]
 
-    return {
-        "alerts": alert_summaries,
-        "total": total,
-        "limit": limit,
-        "offset": offset,
-        "has_more": (offset + limit) < total
-    }
+    return {"alerts": alert_summaries, **_page(alert_summaries, len(all_alerts), limit, offset, ALERT_SORT_BY, ALERT_ORDER)}
+
+
+# 統計回應中的風險分數百分位數
+RISK_PERCENTILES = (50, 90, 95, 99)
+STATS_TOP_N = 10
 
 
 def get_statistics(date: str, days: int = 1) -> Dict[str, Any]:
     """
     獲取統計資料
 
-    如果 days > 1，會聚合多天的統計
+    如果 days > 1，會聚合多天的統計。每天的 sketches.json（analytics_worker 寫出的前 K 名摘要與
+    風險分數直方圖）齊全時，Top IP / User Agent / 路徑與百分位數由摘要合併計算；
+    否則 Top IP / User Agent 只能由各天已截斷的前 10 名相加（近似值）。
     """
-    if days == 1:
-        # 單日統計
-        stats_file = Path(DATA_DIR) / "statistics" / date / "summary.json"
+    day_stats = []
+    day_sketches = []
+    for i in range(days):
+        current_date = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=i)).strftime("%Y-%m-%d")
+        stats_dir = Path(DATA_DIR) / "statistics" / current_date
 
-        if stats_file.exists():
-            with open(stats_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        else:
-            return generate_empty_stats(date)
-    else:
-        # 多日統計聚合
-        aggregated_stats = None
+        stats = cache.get_json(stats_dir / "summary.json")
+        if stats is not None:
+            day_stats.append(stats)
+            day_sketches.append(cache.get_json(stats_dir / "sketches.json"))
 
-        for i in range(days):
-            current_date = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=i)).strftime("%Y-%m-%d")
-            stats_file = Path(DATA_DIR) / "statistics" / current_date / "summary.json"
+    if not day_stats:
+        return generate_empty_stats(date)
 
-            if stats_file.exists():
-                with open(stats_file, 'r', encoding='utf-8') as f:
-                    day_stats = json.load(f)
+    # 單日的 summary.json 本身就是精確的
+    result = day_stats[0] if len(day_stats) == 1 else merge_statistics(day_stats)
 
-                if aggregated_stats is None:
-                    aggregated_stats = day_stats
-                else:
-                    # 聚合統計
-                    aggregated_stats = merge_statistics(aggregated_stats, day_stats)
+    if all(sketches is not None for sketches in day_sketches):
+        if len(day_stats) > 1:
+            for key, hitters in (('top_source_ips', 'source_ips'), ('top_user_agents', 'user_agents')):
+                result[key] = merge_heavy_hitters([sketches['heavy_hitters'][hitters] for sketches in day_sketches])
+        result['top_paths'] = merge_heavy_hitters([sketches['heavy_hitters']['paths'] for sketches in day_sketches])
 
-        return aggregated_stats or generate_empty_stats(date)
+        histogram: Dict[int, int] = {}
+        for sketches in day_sketches:
+            for score, count in sketches['risk_histogram'].items():
+                histogram[int(score)] = histogram.get(int(score), 0) + count
+        result['risk_score_percentiles'] = histogram_percentiles(histogram)
 
+    return result
 
-def merge_statistics(stats1: Dict, stats2: Dict) -> Dict:
-    """合併兩個統計資料"""
-    merged = stats1.copy()
 
-    # 合併數字
-    merged['total_sessions'] = stats1['total_sessions'] + stats2['total_sessions']
+def merge_statistics(stats_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    合併多天的統計資料（不修改輸入）
 
-    # 合併分布（字典相加）
-    for key in ['attack_type_distribution', 'threat_level_distribution', 'top_source_ips', 'top_user_agents']:
-        if key in stats2:
-            for k, v in stats2[key].items():
+    top_source_ips / top_user_agents 只能由各天已截斷的前 10 名相加，是近似值；
+    有 sketches.json 時由 get_statistics 以 merge_heavy_hitters 取代。
+    """
+    merged = generate_empty_stats(stats_list[0]['date'])
+    total_risk = 0.0
+
+    for stats in stats_list:
+        # 合併數字
+        merged['total_sessions'] += stats.get('total_sessions', 0)
+        merged['requires_review_count'] += stats.get('requires_review_count', 0)
+        total_risk += stats.get('average_risk_score', 0) * stats.get('total_sessions', 0)
+
+        # 合併分布（字典相加）
+        for key in ['attack_type_distribution', 'threat_level_distribution', 'risk_score_distribution',
+                    'alert_counts', 'top_source_ips', 'top_user_agents']:
+            for k, v in stats.get(key, {}).items():
                 merged[key][k] = merged[key].get(k, 0) + v
 
-    # 重新計算平均風險分數
-    total1 = stats1['total_sessions']
-    total2 = stats2['total_sessions']
-    avg1 = stats1.get('average_risk_score', 0)
-    avg2 = stats2.get('average_risk_score', 0)
+    for key in ['top_source_ips', 'top_user_agents']:
+        merged[key] = dict(sorted(merged[key].items(), key=lambda x: x[1], reverse=True)[:STATS_TOP_N])
 
-    merged['average_risk_score'] = (avg1 * total1 + avg2 * total2) / (total1 + total2) if (total1 + total2) > 0 else 0
+    # 重新計算平均風險分數
+    total = merged['total_sessions']
+    merged['average_risk_score'] = round(total_risk / total, 2) if total > 0 else 0.0
 
     return merged
 
 
+def merge_heavy_hitters(summaries: List[Dict[str, Any]], n: int = STATS_TOP_N) -> Dict[str, int]:
+    """
+    合併多天的前 K 名摘要，回傳前 n 名
+
+    每天只保留前 K 名的精確計數，floor 為未列入者的計數上限；合併後的計數是下限，
+    真實值最多再加上該項目未列入那些天的 floor（K 遠大於 n 時前 n 名幾乎都是精確的）。
+    """
+    totals: Dict[str, int] = {}
+    for summary in summaries:
+        for key, count in summary['counts'].items():
+            totals[key] = totals.get(key, 0) + count
+    return dict(sorted(totals.items(), key=lambda x: x[1], reverse=True)[:n])
+
+
+def histogram_percentiles(histogram: Dict[int, int]) -> Dict[str, int]:
+    """由風險分數直方圖計算百分位數（nearest-rank，精確值）"""
+    total = sum(histogram.values())
+    if not total:
+        return {}
+
+    percentiles = {}
+    scores = sorted(histogram.items())
+    for p in RISK_PERCENTILES:
+        rank = max(1, math.ceil(p / 100 * total))
+        cumulative = 0
+        for score, count in scores:
+            cumulative += count
+            if cumulative >= rank:
+                percentiles[f"p{p}"] = score
+                break
+    return percentiles
+
+
 def generate_empty_stats(date: str) -> Dict[str, Any]:
     """生成空的統計資料"""
     return {
@@ -323,39 +687,26 @@ def generate_empty_stats(date: str) -> Dict[str, Any]:
     }
 
 
-def get_dashboard_data(date: str = None) -> Dict[str, Any]:
-    """獲取儀表板資料"""
-    if not date:
-        date = datetime.utcnow().strftime("%Y-%m-%d")
-
-    # 獲取指定日期的統計
-    stats = get_statistics(date=date)
-
-    # 獲取最近的高風險警報
-    alerts_result = get_alerts(date=date, alert_level=None, limit=10, offset=0)
-
-    # 讀取所有會話詳細數據以計算新指標
-    file_path = Path(DATA_DIR) / "processed" / date / "sessions.jsonl"
-    all_sessions = read_jsonl_file(file_path)
-
+def compute_dashboard_rollup(sessions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """從完整的會話資料計算儀表板統計（格式與 analytics_worker 寫出的 dashboard.json 相同）"""
     # 計算唯一 IP
-    unique_ips = len(set(s.get('peer_ip') for s in all_sessions if s.get('peer_ip')))
+    unique_ips = len(set(s.get('peer_ip') for s in sessions if s.get('peer_ip')))
 
     # 1. 攻擊工具統計
     tool_stats = {}
-    for session in all_sessions:
+    for session in sessions:
         # tool_identified 在 user_agent_info 裡面
         ua_info = session.get('user_agent_info', {})
         tool = ua_info.get('tool_identified') or 'Unknown'
         tool_stats[tool] = tool_stats.get(tool, 0) + 1
 
     # 2. 掃描器 vs 手動攻擊
-    scanner_count = sum(1 for s in all_sessions if s.get('user_agent_info', {}).get('is_scanner'))
-    manual_count = len(all_sessions) - scanner_count
+    scanner_count = sum(1 for s in sessions if s.get('user_agent_info', {}).get('is_scanner'))
+    manual_count = len(sessions) - scanner_count
 
     # 3. 每小時攻擊趨勢
     hourly_trend = {}
-    for session in all_sessions:
+    for session in sessions:
         processed_time = session.get('processed_at', '')
         if processed_time:
             try:
@@ -373,7 +724,7 @@ def get_dashboard_data(date: str = None) -> Dict[str, Any]:
 
     # 4. Top 攻擊路徑
     path_stats = {}
-    for session in all_sessions:
+    for session in sessions:
         for path_obj in session.get('paths', []):
             path = path_obj.get('path', '')
             if path:
@@ -383,14 +734,14 @@ def get_dashboard_data(date: str = None) -> Dict[str, Any]:
 
     # 5. HTTP 方法分布
     method_stats = {}
-    for session in all_sessions:
+    for session in sessions:
         for path_obj in session.get('paths', []):
             method = path_obj.get('method', 'GET')
             method_stats[method] = method_stats.get(method, 0) + 1
 
     # 6. 平均會話持續時間
     durations = []
-    for session in all_sessions:
+    for session in sessions:
         start = session.get('start_time')
         end = session.get('end_time')
         if start and end:
@@ -404,6 +755,40 @@ def get_dashboard_data(date: str = None) -> Dict[str, Any]:
 
     avg_duration = sum(durations) / len(durations) if durations else 0
 
+    return {
+        "unique_ips": unique_ips,
+        "tool_distribution": tool_stats,
+        "scanner_count": scanner_count,
+        "manual_count": manual_count,
+        "hourly_trend": hourly_trend,
+        "top_paths": dict(sorted(path_stats.items(), key=lambda x: x[1], reverse=True)[:10]),
+        "method_distribution": method_stats,
+        "avg_session_duration": round(avg_duration, 2)
+    }
+
+
+def get_dashboard_data(date: str = None) -> Dict[str, Any]:
+    """
+    獲取儀表板資料
+
+    analytics_worker 維護的 dashboard.json 存在時只需讀取這個小檔案，否則讀取整天的會話計算。
+    """
+    if not date:
+        date = datetime.utcnow().strftime("%Y-%m-%d")
+
+    # 獲取指定日期的統計
+    stats = get_statistics(date=date)
+
+    # 獲取最近的高風險警報
+    alerts_result = get_alerts(date=date, alert_level=None, limit=10, offset=0)
+
+    rollup = cache.get_json(Path(DATA_DIR) / "statistics" / date / "dashboard.json")
+    if rollup is None:
+        rollup = compute_dashboard_rollup(read_day_sessions(date))
+
+    tool_stats = rollup['tool_distribution']
+    path_stats = rollup['top_paths']
+
     # TOP 威脅
     top_threats = {
         "top_ips": dict(list(stats.get('top_source_ips', {}).items())[:5]),
@@ -418,24 +803,24 @@ def get_dashboard_data(date: str = None) -> Dict[str, Any]:
         "high_risk_count": stats['threat_level_distribution'].get('HIGH', 0) + stats['threat_level_distribution'].get('CRITICAL', 0),
         "critical_alerts": stats['alert_counts'].get('CRITICAL', 0),
         "average_risk": round(stats['average_risk_score'], 1),
-        "unique_ips": unique_ips,
-        "scanner_count": scanner_count,
-        "manual_count": manual_count,
-        "avg_session_duration": round(avg_duration, 2)
+        "unique_ips": rollup['unique_ips'],
+        "scanner_count": rollup['scanner_count'],
+        "manual_count": rollup['manual_count'],
+        "avg_session_duration": rollup['avg_session_duration']
     }
 
     return {
         "today_summary": today_summary,
         "recent_alerts": alerts_result['alerts'][:10],
-        "hourly_trend": dict(sorted(hourly_trend.items())),
+        "hourly_trend": dict(sorted(rollup['hourly_trend'].items())),
         "top_threats": top_threats,
         "attack_analysis": {
             "tool_distribution": tool_stats,
             "scanner_vs_manual": {
-                "scanner": scanner_count,
-                "manual": manual_count
+                "scanner": rollup['scanner_count'],
+                "manual": rollup['manual_count']
             },
-            "method_distribution": method_stats
+            "method_distribution": rollup['method_distribution']
         }
     }
 
@@ -444,9 +829,9 @@ def get_threat_intelligence(date: str) -> Dict[str, Any]:
     """獲取威脅情報 Feed"""
     intel_file = Path(DATA_DIR) / "threat_intelligence" / date / "threat_intelligence.json"
 
-    if intel_file.exists():
-        with open(intel_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    intel = cache.get_json(intel_file)
+    if intel is not None:
+        return intel
     else:
         return {
             "date": date,
@@ -459,64 +844,111 @@ def get_threat_intelligence(date: str) -> Dict[str, Any]:
         }
 
 
+def compute_geo_rollup(sessions: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    從完整的會話資料計算各國家的統計
+
+    格式與 analytics_worker 寫出的 geo.json 中的 countries 相同，只是以 unique_ips 集合取代 ip_sketch。
+    """
+    countries = {}
+
+    for session in sessions:
+        location = session.get('location', {})
+        country_code = location.get('country_code', '').upper()
+        country_name = location.get('country', 'Unknown')
+
+        # 跳過空值或私有IP
+        if not country_code or country_code == '':
+            continue
+
+        if country_code not in countries:
+            countries[country_code] = {
+                'country_name': country_name,
+                'attack_count': 0,
+                'high_risk_count': 0,
+                'total_risk_score': 0,
+                'attack_types': {},
+                'unique_ips': set()
+            }
+
+        country = countries[country_code]
+        country['attack_count'] += 1
+        country['total_risk_score'] += session.get('risk_score', 0)
+        country['unique_ips'].add(str(session.get('peer_ip')))
+
+        # 統計高風險攻擊
+        if session.get('risk_score', 0) >= 70:
+            country['high_risk_count'] += 1
+
+        # 統計攻擊類型
+        for attack_type in session.get('attack_types', []):
+            country['attack_types'][attack_type] = country['attack_types'].get(attack_type, 0) + 1
+
+    return countries
+
+
 def get_geo_distribution(date: str, days: int = 1) -> Dict[str, Any]:
     """
     獲取地理分布統計
 
-    返回按國家聚合的攻擊數據
+    返回按國家聚合的攻擊數據。每天優先讀取 analytics_worker 寫出的 geo.json（各國家的計數與
+    HyperLogLog IP sketch），沒有的日子才讀取整天的會話計算；不重複 IP 數在有 sketch 時為估計值。
     """
     country_stats = {}
 
     for i in range(days):
         current_date = (datetime.strptime(date, "%Y-%m-%d") - timedelta(days=i)).strftime("%Y-%m-%d")
-        file_path = Path(DATA_DIR) / "processed" / current_date / "sessions.jsonl"
-        sessions = read_jsonl_file(file_path)
-
-        for session in sessions:
-            location = session.get('location', {})
-            country_code = location.get('country_code', '').upper()
-            country_name = location.get('country', 'Unknown')
-
-            # 跳過空值或私有IP
-            if not country_code or country_code == '':
-                continue
+        geo = cache.get_json(Path(DATA_DIR) / "statistics" / current_date / "geo.json")
+        day_countries = geo['countries'] if geo is not None else compute_geo_rollup(read_day_sessions(current_date))
 
+        for country_code, country in day_countries.items():
             if country_code not in country_stats:
                 country_stats[country_code] = {
                     'country_code': country_code,
-                    'country_name': country_name,
+                    'country_name': country['country_name'],
                     'attack_count': 0,
                     'high_risk_count': 0,
                     'total_risk_score': 0,
                     'attack_types': {},
-                    'unique_ips': set()
+                    'unique_ips': set(),
+                    'ip_sketch': None
                 }
 
-            country_stats[country_code]['attack_count'] += 1
-            country_stats[country_code]['total_risk_score'] += session.get('risk_score', 0)
-            country_stats[country_code]['unique_ips'].add(session.get('peer_ip'))
-
-            # 統計高風險攻擊
-            if session.get('risk_score', 0) >= 70:
-                country_stats[country_code]['high_risk_count'] += 1
-
-            # 統計攻擊類型
-            for attack_type in session.get('attack_types', []):
-                country_stats[country_code]['attack_types'][attack_type] = \
-                    country_stats[country_code]['attack_types'].get(attack_type, 0) + 1
+            stats = country_stats[country_code]
+            stats['attack_count'] += country['attack_count']
+            stats['high_risk_count'] += country['high_risk_count']
+            stats['total_risk_score'] += country['total_risk_score']
+            for attack_type, count in country['attack_types'].items():
+                stats['attack_types'][attack_type] = stats['attack_types'].get(attack_type, 0) + count
+
+            if 'unique_ips' in country:
+                stats['unique_ips'].update(country['unique_ips'])
+            elif country.get('ip_sketch'):
+                sketch = HyperLogLog.decode(country['ip_sketch'])
+                if stats['ip_sketch'] is None:
+                    stats['ip_sketch'] = sketch
+                else:
+                    stats['ip_sketch'].merge(sketch)
 
     # 轉換為列表並計算平均風險分數
     geo_data = []
     for country_code, stats in country_stats.items():
         avg_risk = stats['total_risk_score'] / stats['attack_count'] if stats['attack_count'] > 0 else 0
 
+        # 有任何一天只有 sketch 時，把精確的 IP 集合也加進 sketch 後估計
+        if stats['ip_sketch'] is not None:
+            stats['ip_sketch'].update(stats['unique_ips'])
+            unique_ip_count = stats['ip_sketch'].count()
+        else:
+            unique_ip_count = len(stats['unique_ips'])
+
         geo_data.append({
             'country_code': stats['country_code'],
             'country_name': stats['country_name'],
             'attack_count': stats['attack_count'],
             'high_risk_count': stats['high_risk_count'],
             'average_risk_score': round(avg_risk, 2),
-            'unique_ip_count': len(stats['unique_ips']),
+            'unique_ip_count': unique_ip_count,
             'top_attack_types': dict(sorted(
                 stats['attack_types'].items(),
                 key=lambda x: x[1],
@@ -552,5 +984,8 @@ def get_available_dates() -> List[str]:
                 except ValueError as e:
                     continue
 
+    # 資料庫中的日期
+    dates.update(sqlite_reader.list_dates())
+
     # 排序返回
     return sorted(list(dates), reverse=True)
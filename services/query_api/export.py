@@ -0,0 +1,216 @@
+"""
+批次匯出模組（/api/export）
+
+把一段時間內符合過濾條件的完整 session 以串流方式輸出為 NDJSON、CSV 或 Parquet，可選 gzip：
+- 資料由 data_reader.iter_sessions_range() 逐天、逐個來源讀取，不建立整天的 list
+- 輸出累積到 EXPORT_CHUNK_BYTES 就送出（chunked transfer encoding），Parquet 每寫完一個 row group 送出一次
+- 伺服器的記憶體用量與匯出的天數、筆數無關
+
+NDJSON 直接輸出 worker 寫入的原始 JSON（不重新編碼）；CSV 只包含摘要欄位；
+Parquet 的欄位與 analytics_worker 寫出的 Parquet 檔案相同（摘要欄位 + document），需要 pyarrow。
+"""
+
+import csv
+import io
+import logging
+import os
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# 每次送出的資料量（位元組）
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", 256 * 1024))
+# Parquet 每個 row group 的列數
+EXPORT_PARQUET_ROW_GROUP = int(os.getenv("EXPORT_PARQUET_ROW_GROUP", 10000))
+EXPORT_PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+
+# 格式 → (Content-Type, 副檔名)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# CSV / Parquet 的摘要欄位（與 analytics_worker/parquet_store.py 相同）
+COLUMNS = [
+    "sess_uuid", "processed_at", "peer_ip", "peer_port", "user_agent", "threat_level", "alert_level",
+    "risk_score", "attack_types", "tool_identified", "is_scanner", "total_requests",
+    "has_malicious_activity", "requires_review", "country_code",
+]
+
+if PYARROW_AVAILABLE:
+    SCHEMA = pa.schema([
+        ("sess_uuid", pa.string()),
+        ("processed_at", pa.string()),
+        ("peer_ip", pa.string()),
+        ("peer_port", pa.int32()),
+        ("user_agent", pa.string()),
+        ("threat_level", pa.string()),
+        ("alert_level", pa.string()),
+        ("risk_score", pa.int32()),
+        ("attack_types", pa.list_(pa.string())),
+        ("tool_identified", pa.string()),
+        ("is_scanner", pa.bool_()),
+        ("total_requests", pa.int32()),
+        ("has_malicious_activity", pa.bool_()),
+        ("requires_review", pa.bool_()),
+        ("country_code", pa.string()),
+        ("document", pa.binary()),
+    ])
+
+Sessions = Iterable[Tuple[bytes, Dict[str, Any]]]
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def session_row(session: Dict[str, Any]) -> Dict[str, Any]:
+    """把 session 攤平成摘要欄位（與 analytics_worker 的 Parquet 列相同，不含 document）"""
+    ua_info = session.get('user_agent_info') or {}
+    location = session.get('location') or {}
+    return {
+        "sess_uuid": session.get('sess_uuid'),
+        "processed_at": session.get('processed_at'),
+        "peer_ip": session.get('peer_ip'),
+        "peer_port": _to_int(session.get('peer_port')),
+        "user_agent": session.get('user_agent'),
+        "threat_level": session.get('threat_level'),
+        "alert_level": session.get('alert_level'),
+        "risk_score": _to_int(session.get('risk_score')),
+        "attack_types": list(session.get('attack_types') or []),
+        "tool_identified": ua_info.get('tool_identified'),
+        "is_scanner": ua_info.get('is_scanner'),
+        "total_requests": _to_int(session.get('total_requests')),
+        "has_malicious_activity": session.get('has_malicious_activity'),
+        "requires_review": session.get('requires_review'),
+        "country_code": (location.get('country_code') or None),
+    }
+
+
+def _ndjson(sessions: Sessions) -> Iterator[bytes]:
+    for document, _ in sessions:
+        yield document
+        yield b"\n"
+
+
+def _csv(sessions: Sessions) -> Iterator[bytes]:
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(COLUMNS)
+    for _, session in sessions:
+        row = session_row(session)
+        # 列表欄位以分號連接
+        row["attack_types"] = ";".join(row["attack_types"])
+        writer.writerow([row[column] for column in COLUMNS])
+        if text.tell() >= EXPORT_CHUNK_BYTES:
+            yield text.getvalue().encode("utf-8")
+            text.seek(0)
+            text.truncate()
+    yield text.getvalue().encode("utf-8")
+
+
+class _ChunkSink:
+    """ParquetWriter 的輸出目標：寫入的資料暫存在記憶體，由 drain() 取出後送出"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _parquet(sessions: Sessions) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), SCHEMA, compression=EXPORT_PARQUET_COMPRESSION)
+    try:
+        rows: List[Dict[str, Any]] = []
+        for document, session in sessions:
+            row = session_row(session)
+            row["document"] = document
+            rows.append(row)
+            if len(rows) >= EXPORT_PARQUET_ROW_GROUP:
+                writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA))
+                rows.clear()
+                yield sink.drain()
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=SCHEMA))
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _chunked(pieces: Iterable[bytes]) -> Iterator[bytes]:
+    """把小片段合併成約 EXPORT_CHUNK_BYTES 大小的區塊"""
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) >= EXPORT_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(sessions: Sessions, fmt: str, gzip: bool = False) -> Iterator[bytes]:
+    """
+    產生匯出檔案的內容（逐塊）
+
+    Args:
+        sessions: (原始 JSON, session) 的迭代器，通常是 data_reader.iter_sessions_range()
+        fmt: ndjson、csv 或 parquet
+        gzip: 是否以 gzip 壓縮整個輸出
+    """
+    if fmt == "parquet":
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("Parquet export requires pyarrow")
+        chunks = _parquet(sessions)
+    elif fmt == "csv":
+        chunks = _csv(sessions)
+    else:
+        chunks = _ndjson(sessions)
+
+    chunks = _chunked(chunks)
+    if gzip:
+        chunks = _gzip(chunks)
+    return chunks
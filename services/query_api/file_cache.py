@@ -0,0 +1,173 @@
+"""
+檔案解析結果快取模組
+
+儀表板每次刷新都會讀取相同的 sessions.jsonl、summary.json 與警報檔案，這裡把解析結果留在記憶體：
+- 以 (path, inode, size, mtime) 判斷檔案是否變更，沒變就直接回傳快取
+- JSONL 檔案只追加：同一個 inode 變大時只解析新增的尾段（寫到一半的最後一行留到下次）
+- 依位元組預算做 LRU 淘汰（以檔案大小估算，解析後的物件大約是檔案的數倍）
+- 命中 / 未命中 / 增量 / 淘汰次數由 stats() 提供給 /health
+
+回傳的資料在多個請求間共用，呼叫端不可修改（需要修改時請先複製）。
+"""
+
+import copy
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from codec import loads
+
+logger = logging.getLogger(__name__)
+
+# 快取的檔案總大小上限（位元組）
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+class _Entry:
+    __slots__ = ("inode", "size", "mtime_ns", "consumed", "value")
+
+    def __init__(self, inode: int, size: int, mtime_ns: int, consumed: int, value: Any):
+        self.inode = inode
+        self.size = size
+        self.mtime_ns = mtime_ns
+        # JSONL：已解析到的位置（最後一個完整行之後）
+        self.consumed = consumed
+        self.value = value
+
+
+class FileCache:
+    def __init__(self, max_bytes: int = QUERY_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Path, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.appends = 0
+        self.evictions = 0
+
+    def get_jsonl(self, path: Path) -> List[Dict[str, Any]]:
+        """讀取 JSONL 檔案的所有記錄（檔案不存在時回傳空 list）"""
+        stat = _stat(path)
+        if stat is None:
+            self._drop(path)
+            return []
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and _unchanged(entry, stat):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry.value
+
+        if entry is not None and entry.inode == stat.st_ino and stat.st_size > entry.size:
+            # 只有尾端新增：沿用已解析的記錄
+            records = list(entry.value)
+            start = entry.consumed
+            self._count("appends")
+        else:
+            records = []
+            start = 0
+            self._count("misses")
+
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(stat.st_size - start)
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(loads(line))
+            except ValueError:
+                logger.warning(f"Skipping unparsable line in {path}")
+
+        self._store(path, _Entry(stat.st_ino, start + len(data), stat.st_mtime_ns, start + end, records))
+        return records
+
+    def get_json(self, path: Path) -> Optional[Any]:
+        """讀取 JSON 檔案（檔案不存在時回傳 None）；回傳深拷貝，呼叫端可以修改"""
+        stat = _stat(path)
+        if stat is None:
+            self._drop(path)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and _unchanged(entry, stat):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return copy.deepcopy(entry.value)
+
+        self._count("misses")
+        with open(path, "rb") as f:
+            value = loads(f.read())
+        self._store(path, _Entry(stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_size, value))
+        return copy.deepcopy(value)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "appends": self.appends,
+                "evictions": self.evictions
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _drop(self, path: Path) -> None:
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def _store(self, path: Path, entry: _Entry) -> None:
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old.size
+
+            # 比整個預算還大的檔案不快取
+            if entry.size > self.max_bytes:
+                return
+
+            self._entries[path] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+
+def _stat(path: Path) -> Optional[os.stat_result]:
+    try:
+        return path.stat()
+    except FileNotFoundError:
+        return None
+
+
+def _unchanged(entry: _Entry, stat: os.stat_result) -> bool:
+    return (
+        entry.inode == stat.st_ino
+        and entry.size == stat.st_size
+        and entry.mtime_ns == stat.st_mtime_ns
+    )
+
+
+cache = FileCache()
@@ -0,0 +1,187 @@
+"""
+mmap JSONL 讀取模組
+
+以 mmap 讀取 JSONL 檔案，不把整個檔案讀進記憶體，也不先建立所有記錄的 list：
+- 每個檔案快取一份換行位置表（array），檔案只追加，變大時只掃描新增的尾段
+- 檔案被替換（inode 改變或變小）時重建位置表
+- 每個檔案的位置表有自己的鎖（掃描大檔案時不影響其他檔案的讀取）；位置表依
+  JSONL_LINE_TABLE_MAX_BYTES 做 LRU 淘汰，檔案不存在時移除
+- iter_lines() 逐行產生原始 bytes 切片（memoryview，不複製）；
+  contains 為預先過濾的子字串，在 mmap 上直接比對，不符合的行不會被解析
+- iter_records() 只解析通過預先過濾的行
+
+單次請求的記憶體只和實際解析的記錄數有關，和檔案大小無關。
+"""
+
+import logging
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from codec import loads
+
+logger = logging.getLogger(__name__)
+
+# 換行位置表的總大小上限（位元組，每行 8 bytes）
+JSONL_LINE_TABLE_MAX_BYTES = int(os.getenv("JSONL_LINE_TABLE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+class _LineTable:
+    __slots__ = ("lock", "inode", "scanned", "ends", "nbytes")
+
+    def __init__(self, inode: int):
+        self.lock = threading.Lock()
+        self.inode = inode
+        # 已掃描到的位置（最後一個換行之後）
+        self.scanned = 0
+        # 每一行結尾換行符之後的位置，第 i 行為 ends[i-1]..ends[i]
+        self.ends = array("Q")
+        # 計入 _bytes 的大小
+        self.nbytes = 0
+
+
+_cache: "OrderedDict[Path, _LineTable]" = OrderedDict()
+_bytes = 0
+# 只保護 _cache / _bytes；掃描檔案時持有的是各位置表的 lock
+_lock = threading.Lock()
+
+
+def _drop(file_path: Path) -> None:
+    global _bytes
+    with _lock:
+        table = _cache.pop(file_path, None)
+        if table is not None:
+            _bytes -= table.nbytes
+
+
+def _line_table(file_path: Path, inode: int, size: int, mm: mmap.mmap) -> Tuple[array, int]:
+    """
+    載入或增量更新換行位置表
+
+    Returns:
+        (換行位置表, 目前完整行的數量)；之後的內容是還沒寫完換行的最後一行
+    """
+    global _bytes
+    with _lock:
+        table = _cache.get(file_path)
+        if table is None or table.inode != inode or size < table.scanned:
+            if table is not None:
+                _bytes -= table.nbytes
+            table = _cache[file_path] = _LineTable(inode)
+        _cache.move_to_end(file_path)
+
+    with table.lock:
+        pos = table.scanned
+        while pos < size:
+            newline = mm.find(b"\n", pos, size)
+            if newline == -1:
+                break
+            pos = newline + 1
+            table.ends.append(pos)
+        table.scanned = pos
+
+        # 回傳目前的長度即可：之後追加的內容不影響已回傳的範圍
+        ends, count = table.ends, len(table.ends)
+
+    with _lock:
+        if _cache.get(file_path) is table:
+            nbytes = count * ends.itemsize
+            _bytes += nbytes - table.nbytes
+            table.nbytes = nbytes
+            # 淘汰最久沒用的位置表（剛用到的這個除外；已回傳給其他讀取者的仍然有效）
+            while _bytes > JSONL_LINE_TABLE_MAX_BYTES and len(_cache) > 1:
+                _, evicted = _cache.popitem(last=False)
+                _bytes -= evicted.nbytes
+
+    return ends, count
+
+
+def iter_lines(file_path: Path, contains: Sequence[bytes] = ()) -> Iterator[Tuple[int, memoryview]]:
+    """
+    逐行產生 (offset, 原始內容)，原始內容不含結尾換行符
+
+    contains 中的每個子字串都必須出現在該行才會產生（預先過濾，不解析 JSON）。
+    產生的 memoryview 只在下一次迭代前有效，需要保留時請 bytes(view)。
+    """
+    try:
+        f = open(file_path, "rb")
+    except FileNotFoundError:
+        _drop(file_path)
+        return
+
+    with f:
+        stat = os.fstat(f.fileno())
+        size = stat.st_size
+        if size == 0:
+            return
+        mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        view = memoryview(mm)
+        try:
+            ends, count = _line_table(file_path, stat.st_ino, size, mm)
+            start = 0
+            for i in range(count + 1):
+                if i < count:
+                    end = ends[i]
+                    stop = end - 1
+                else:
+                    # 最後一行沒有換行符（寫到一半或手動建立的檔案）
+                    end = stop = size
+                if stop > start and all(mm.find(needle, start, stop) != -1 for needle in contains):
+                    line = view[start:stop]
+                    yield start, line
+                    line.release()
+                start = end
+        finally:
+            view.release()
+            try:
+                mm.close()
+            except BufferError:
+                # 呼叫端仍持有切片，交給 GC 關閉
+                pass
+
+
+def iter_records(file_path: Path, contains: Sequence[bytes] = ()) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """
+    逐筆產生 (offset, length, record)，只解析通過預先過濾的行
+
+    length 不含換行符，可直接用於 read_at()。無法解析的行會略過。
+    """
+    for offset, line in iter_lines(file_path, contains):
+        try:
+            record = loads(line)
+        except ValueError:
+            if bytes(line).strip():
+                logger.warning(f"Skipping unparsable line at offset {offset} in {file_path}")
+            continue
+        yield offset, len(line), record
+
+
+def read_at(file_path: Path, positions: Sequence[Tuple[int, int]]) -> List[Dict[str, Any]]:
+    """依 (offset, length) 讀取並解析記錄（例如只解析排序、分頁後的這一頁）"""
+    records = []
+    if not positions:
+        return records
+    with open(file_path, "rb") as f:
+        for offset, length in positions:
+            f.seek(offset)
+            records.append(loads(f.read(length)))
+    return records
+
+
+def prefilter_token(value: Optional[str], case_sensitive: bool = True) -> Optional[bytes]:
+    """
+    把過濾條件轉成可以直接在原始 bytes 上比對的子字串
+
+    只有可列印 ASCII、不含需要跳脫的字元時才能保證 JSON 編碼後原樣出現，否則回傳 None（不預先過濾）。
+    不分大小寫的條件只有在不含英文字母時（例如 IPv4 位址）才能預先過濾。
+    """
+    if not value or not value.isascii() or not value.isprintable() or '"' in value or "\\" in value:
+        return None
+    if not case_sensitive and value.lower() != value.upper():
+        return None
+    return value.encode("ascii")
+
@@ -0,0 +1,196 @@
+"""
+即時推送模組（Server-Sent Events）
+
+前端不必輪詢、每次重新讀取整天的檔案：一個背景任務追蹤 analytics_worker 的輸出檔案尾端，
+把新寫入的記錄推送給所有訂閱者。
+
+- 追蹤當天的 processed/sessions.jsonl（事件 session）與 alerts/{critical,high}_alerts.jsonl（事件 alert）
+- 只讀取新增的完整行；檔案被替換（inode 改變或變小）時從頭讀取；UTC 換日時切換到新的一天
+- 第一次追蹤某個檔案時從檔案尾端開始，只推送訂閱之後的新資料
+- 每個訂閱者有自己的過濾條件與有界佇列，消費太慢時丟棄最舊的事件，不會拖慢其他訂閱者
+- 沒有訂閱者時背景任務自動停止
+
+警報檔案在所有 OUTPUT_FORMAT 下都是 JSONL；session 事件只有 OUTPUT_FORMAT=jsonl 時才有。
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from codec import dumps_str, loads
+from data_reader import DATA_DIR, alert_summary, session_summary
+
+logger = logging.getLogger(__name__)
+
+# 檢查新資料的間隔（秒）
+LIVE_FEED_POLL_S = float(os.getenv("LIVE_FEED_POLL_S", 1))
+# 每個訂閱者最多暫存的事件數
+LIVE_FEED_QUEUE_SIZE = int(os.getenv("LIVE_FEED_QUEUE_SIZE", 256))
+# 沒有事件時送出心跳的間隔（秒），避免代理伺服器關閉閒置連線
+LIVE_FEED_HEARTBEAT_S = float(os.getenv("LIVE_FEED_HEARTBEAT_S", 15))
+
+EVENT_TYPES = ("session", "alert")
+
+
+class Subscriber:
+    """單一 SSE 連線的過濾條件與事件佇列"""
+
+    def __init__(
+        self,
+        event_types: Set[str],
+        threat_level: Optional[str] = None,
+        attack_type: Optional[str] = None,
+        min_risk: Optional[int] = None,
+        peer_ip: Optional[str] = None
+    ):
+        self.event_types = event_types
+        self.threat_level = threat_level
+        self.attack_type = attack_type
+        self.min_risk = min_risk
+        self.peer_ip = peer_ip.lower() if peer_ip else None
+        self.queue: "asyncio.Queue[Tuple[str, Dict[str, Any]]]" = asyncio.Queue(maxsize=LIVE_FEED_QUEUE_SIZE)
+        self.dropped = 0
+
+    def matches(self, event_type: str, record: Dict[str, Any]) -> bool:
+        if event_type not in self.event_types:
+            return False
+        if self.threat_level and record.get('threat_level') != self.threat_level:
+            return False
+        if self.attack_type and self.attack_type not in record.get('attack_types', []):
+            return False
+        if self.min_risk is not None and record.get('risk_score', 0) < self.min_risk:
+            return False
+        if self.peer_ip and self.peer_ip not in (record.get('peer_ip') or '').lower():
+            return False
+        return True
+
+    def push(self, event_type: str, summary: Dict[str, Any]) -> None:
+        if self.queue.full():
+            # 丟棄最舊的事件
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait((event_type, summary))
+
+
+class _Tail:
+    __slots__ = ("inode", "offset")
+
+    def __init__(self, inode: int, offset: int):
+        self.inode = inode
+        self.offset = offset
+
+
+class LiveFeed:
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = Path(data_dir)
+        self._subscribers: Set[Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._date: Optional[str] = None
+        self._tails: Dict[Path, _Tail] = {}
+
+    def subscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.add(subscriber)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribers": len(self._subscribers),
+            "dropped": sum(subscriber.dropped for subscriber in self._subscribers)
+        }
+
+    def _files(self, date: str) -> List[Tuple[str, Path]]:
+        return [
+            ("session", self.data_dir / "processed" / date / "sessions.jsonl"),
+            ("alert", self.data_dir / "alerts" / date / "critical_alerts.jsonl"),
+            ("alert", self.data_dir / "alerts" / date / "high_alerts.jsonl"),
+        ]
+
+    async def _run(self) -> None:
+        logger.info("📡 Live feed started")
+        try:
+            while self._subscribers:
+                try:
+                    events = await asyncio.to_thread(self._read_new)
+                except Exception as e:
+                    logger.error(f"Live feed read error: {e}", exc_info=True)
+                    events = []
+
+                for event_type, record in events:
+                    summary = session_summary(record) if event_type == "session" else alert_summary(record)
+                    for subscriber in self._subscribers:
+                        if subscriber.matches(event_type, record):
+                            subscriber.push(event_type, summary)
+
+                await asyncio.sleep(LIVE_FEED_POLL_S)
+        finally:
+            # 停止後重新訂閱時從檔案尾端開始
+            self._tails.clear()
+            self._date = None
+            logger.info("📡 Live feed stopped")
+
+    def _read_new(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """讀取所有追蹤檔案新增的完整行（在執行緒中執行）"""
+        date = datetime.utcnow().strftime("%Y-%m-%d")
+        # 啟動時從尾端開始；換日後的新檔案從頭讀取
+        start_at_end = self._date is None
+        if date != self._date:
+            self._tails.clear()
+            self._date = date
+
+        events = []
+        for event_type, path in self._files(date):
+            for record in self._read_tail(path, start_at_end):
+                events.append((event_type, record))
+        return events
+
+    def _read_tail(self, path: Path, start_at_end: bool) -> List[Dict[str, Any]]:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            # 檔案之後才出現時從頭讀取
+            self._tails[path] = _Tail(0, 0)
+            return []
+
+        tail = self._tails.get(path)
+        if tail is None:
+            tail = self._tails[path] = _Tail(stat.st_ino, stat.st_size if start_at_end else 0)
+        elif tail.inode != stat.st_ino or stat.st_size < tail.offset:
+            tail.inode = stat.st_ino
+            tail.offset = 0
+
+        if stat.st_size <= tail.offset:
+            return []
+
+        with open(path, "rb") as f:
+            f.seek(tail.offset)
+            data = f.read(stat.st_size - tail.offset)
+
+        # 只處理完整的行，寫到一半的最後一行留到下次
+        end = data.rfind(b"\n") + 1
+        tail.offset += end
+
+        records = []
+        for line in data[:end].splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(loads(line))
+            except ValueError:
+                logger.warning(f"Live feed skipping unparsable line in {path}")
+        return records
+
+
+def format_event(event_type: str, data: Any) -> str:
+    """SSE 事件格式"""
+    return f"event: {event_type}\ndata: {dumps_str(data)}\n\n"
+
+
+feed = LiveFeed()
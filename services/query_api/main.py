@@ -4,12 +4,19 @@ Query API - 前端資料查詢服務
 提供端點讓前端查詢已處理的蜜罐資料
 """
 
-from fastapi import FastAPI, Query, HTTPException, Path
+from fastapi import FastAPI, Query, HTTPException, Path, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Dict, Any, Callable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import asyncio
+import functools
 import logging
 import os
+import threading
+import weakref
 from pathlib import Path as PathLib
 
 # 載入環境變數
@@ -18,13 +25,25 @@ load_dotenv()
 
 from data_reader import (
     get_sessions,
+    get_sessions_range,
+    iter_sessions_range,
+    QUERY_MAX_RANGE_DAYS,
     get_session_by_uuid,
     get_alerts,
+    ALERT_SORT_BY,
+    ALERT_ORDER,
     get_statistics,
     get_dashboard_data,
     get_threat_intelligence,
+    get_geo_distribution,
     get_available_dates
 )
+from codec import dumps
+import export
+import file_cache
+import live_feed
+import pagination
+import response_cache
 
 # 顯示數據目錄配置
 DATA_DIR = os.getenv("DATA_DIR", "/app/data")
@@ -45,6 +64,131 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 資料讀取（檔案解析）在獨立的執行緒池中執行，避免阻塞事件迴圈
+QUERY_THREADS = int(os.getenv("QUERY_THREADS", 4))
+QUERY_MAX_PENDING = int(os.getenv("QUERY_MAX_PENDING", 32))
+QUERY_TIMEOUT_S = float(os.getenv("QUERY_TIMEOUT_S", 30))
+
+_query_executor = ThreadPoolExecutor(max_workers=QUERY_THREADS, thread_name_prefix="query")
+_query_slots = asyncio.Semaphore(QUERY_MAX_PENDING)
+
+# 批次匯出是長時間的串流，不經過查詢執行緒池與逾時，另外限制同時進行的數量
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", 2))
+_export_slots = asyncio.Semaphore(EXPORT_MAX_CONCURRENT)
+
+
+async def run_query(func: Callable, *args, **kwargs):
+    """
+    在查詢執行緒池中執行同步的資料讀取函數
+
+    - 排隊中加執行中的查詢超過 QUERY_MAX_PENDING 時直接回傳 503
+    - 超過 QUERY_TIMEOUT_S 回傳 504（執行緒無法中斷，會在背景跑完，但結果被丟棄）
+    """
+    if _query_slots.locked():
+        raise HTTPException(status_code=503, detail="Too many concurrent queries, retry later")
+
+    async with _query_slots:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_query_executor, functools.partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(future, timeout=QUERY_TIMEOUT_S)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️  Query {func.__name__} timed out after {QUERY_TIMEOUT_S}s")
+            raise HTTPException(status_code=504, detail="Query timed out")
+
+
+async def cached_response(
+    request: Request,
+    endpoint: str,
+    params: Dict[str, Any],
+    dates: List[str],
+    categories: Tuple[str, ...],
+    build: Callable,
+    model: Optional[type] = None
+) -> Response:
+    """
+    以資料版本處理條件式 GET、回應快取與壓縮
+
+    Args:
+        endpoint / params: 快取鍵（params 為已套用預設值的參數）
+        dates / categories: 回應依賴的資料（response_cache.data_version）
+        build: 產生回應資料的 coroutine function，只在快取未命中時呼叫
+        model: 端點的 response_model，序列化結果與 FastAPI 相同
+    """
+    version = await asyncio.to_thread(response_cache.data_version, dates, categories)
+    key = response_cache.cache_key(endpoint, params, version)
+    etag = response_cache.etag_for(key)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+    if response_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.cache.count_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    encoding = response_cache.negotiate_encoding(request.headers.get("accept-encoding"))
+    rendered = response_cache.cache.get(key)
+    if rendered is None:
+        result = await build()
+
+        def render() -> response_cache.Rendered:
+            # 序列化與壓縮大型回應需要數十毫秒，在執行緒中進行
+            data = result
+            if model is not None:
+                data = model.model_validate(data).model_dump(mode="json", by_alias=True)
+            rendered = response_cache.Rendered(etag, dumps(data))
+            rendered.content(encoding)
+            return rendered
+
+        rendered = await asyncio.to_thread(render)
+        response_cache.cache.put(key, rendered)
+
+    if rendered.ready(encoding):
+        content, encoding = rendered.content(encoding)
+    else:
+        # 快取中的回應還沒有這種壓縮格式
+        content, encoding = await asyncio.to_thread(rendered.content, encoding)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type="application/json", headers=headers)
+
+
+def day_range(date: str, days: int) -> List[str]:
+    """date 往前 days 天的日期（含 date）"""
+    end = datetime.strptime(date, "%Y-%m-%d")
+    return [(end - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+
+
+def parse_range_bound(value: str, is_end: bool = False) -> datetime:
+    """
+    解析時間範圍參數（YYYY-MM-DD 或 ISO 8601 時間，含時區時轉換為 UTC）
+
+    只有日期的 end 包含當天（回傳隔天 00:00）。
+    """
+    try:
+        bound = datetime.strptime(value, "%Y-%m-%d")
+        return bound + timedelta(days=1) if is_end else bound
+    except ValueError:
+        pass
+
+    try:
+        bound = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time '{value}'. Use YYYY-MM-DD or ISO 8601")
+    if bound.tzinfo is not None:
+        bound = bound.astimezone(timezone.utc).replace(tzinfo=None)
+    return bound
+
+
+def resolve_range(start: str, end: Optional[str]) -> Tuple[datetime, datetime]:
+    """解析並驗證時間範圍 [start, end)，end 預設為現在"""
+    range_start = parse_range_bound(start)
+    range_end = parse_range_bound(end, is_end=True) if end else datetime.utcnow()
+    if range_start >= range_end:
+        raise HTTPException(status_code=400, detail="start must be earlier than end")
+    if (range_end.date() - range_start.date()).days > QUERY_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Time range exceeds {QUERY_MAX_RANGE_DAYS} days")
+    return range_start, range_end
+
+
 # 創建 FastAPI 應用
 app = FastAPI(
     title="Honeypot Query API",
@@ -77,7 +221,9 @@ async def root():
             "statistics": "/api/statistics",
             "dashboard": "/api/dashboard",
             "threat_intelligence": "/api/threat-intelligence",
-            "dates": "/api/dates"
+            "dates": "/api/dates",
+            "stream": "/api/stream",
+            "export": "/api/export"
         }
     }
 
@@ -87,7 +233,10 @@ async def health_check():
     """健康檢查"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat()
+        "timestamp": datetime.utcnow().isoformat(),
+        "cache": file_cache.cache.stats(),
+        "response_cache": response_cache.cache.stats(),
+        "live_feed": live_feed.feed.stats()
     }
 
 
@@ -103,18 +252,25 @@ async def list_sessions(
     limit: int = Query(50, ge=1, le=500, description="每頁數量"),
     offset: int = Query(0, ge=0, description="偏移量"),
     sort_by: str = Query("processed_at", description="排序欄位: processed_at, risk_score"),
-    order: str = Query("desc", description="排序順序: asc, desc")
+    order: str = Query("desc", description="排序順序: asc, desc"),
+    cursor: Optional[str] = Query(None, description="分頁游標（上一頁回應的 next_cursor），指定時忽略 offset"),
+    start: Optional[str] = Query(None, description="跨日查詢起點 (YYYY-MM-DD 或 ISO 時間，UTC)，指定時忽略 date"),
+    end: Optional[str] = Query(None, description="跨日查詢終點（不含；只有日期時包含當天），預設現在")
 ):
     """
     獲取會話列表
 
-    支援過濾、分頁、排序功能
+    支援過濾、分頁、排序功能。依 (排序欄位, sess_uuid) 排序；
+    翻頁時以回應中的 next_cursor 作為下一次請求的 cursor（其他參數不變），深頁不會變慢。
+    指定 start（與 end）時查詢跨多天的時間範圍，各天並行查詢後合併排序。
 
     **範例請求**:
     ```
     GET /api/sessions?threat_level=HIGH&limit=20&offset=0
     GET /api/sessions?date=2025-10-26&min_risk=50
     GET /api/sessions?attack_type=sqli&sort_by=risk_score&order=desc
+    GET /api/sessions?threat_level=HIGH&limit=20&cursor=<next_cursor>
+    GET /api/sessions?peer_ip=192.168.1.100&start=2025-10-20&end=2025-10-26
     ```
     """
     try:
@@ -128,9 +284,29 @@ async def list_sessions(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
 
+        if sort_by not in pagination.SORT_FIELDS:
+            raise HTTPException(status_code=400, detail=f"sort_by must be one of: {', '.join(pagination.SORT_FIELDS)}")
+        if order not in pagination.SORT_ORDERS:
+            raise HTTPException(status_code=400, detail=f"order must be one of: {', '.join(pagination.SORT_ORDERS)}")
+
+        position = None
+        if cursor:
+            position = pagination.decode_cursor(cursor, sort_by, order)
+            if position is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor for this sort_by/order")
+
+        if start or end:
+            if not start:
+                raise HTTPException(status_code=400, detail="start is required when end is given")
+            range_start, range_end = resolve_range(start, end)
+            query, scope = get_sessions_range, dict(start=range_start, end=range_end)
+        else:
+            query, scope = get_sessions, dict(date=date)
+
         # 獲取資料
-        result = get_sessions(
-            date=date,
+        result = await run_query(
+            query,
+            **scope,
             threat_level=threat_level,
             attack_type=attack_type,
             min_risk=min_risk,
@@ -140,13 +316,17 @@ async def list_sessions(
             limit=limit,
             offset=offset,
             sort_by=sort_by,
-            order=order
+            order=order,
+            cursor=position
         )
 
-        logger.info(f"📊 Sessions query: date={date}, filters={threat_level}/{attack_type}, returned {len(result['sessions'])} items")
+        scope_label = f"range={start}..{end or 'now'}" if start else f"date={date}"
+        logger.info(f"📊 Sessions query: {scope_label}, filters={threat_level}/{attack_type}, returned {len(result['sessions'])} items")
 
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error querying sessions: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -165,7 +345,7 @@ async def get_session_detail(
     ```
     """
     try:
-        session = get_session_by_uuid(uuid)
+        session = await run_query(get_session_by_uuid, uuid)
 
         if not session:
             raise HTTPException(status_code=404, detail=f"Session {uuid} not found")
@@ -186,32 +366,44 @@ async def list_alerts(
     date: Optional[str] = Query(None, description="日期 (YYYY-MM-DD)"),
     alert_level: Optional[str] = Query(None, description="警報等級: CRITICAL, HIGH"),
     limit: int = Query(50, ge=1, le=500),
-    offset: int = Query(0, ge=0)
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="分頁游標（上一頁回應的 next_cursor），指定時忽略 offset")
 ):
     """
-    獲取高風險警報列表
+    獲取高風險警報列表（依風險分數降序）
 
     **範例請求**:
     ```
     GET /api/alerts?alert_level=CRITICAL
     GET /api/alerts?date=2025-10-26&limit=10
+    GET /api/alerts?limit=10&cursor=<next_cursor>
     ```
     """
     try:
         if not date:
             date = datetime.utcnow().strftime("%Y-%m-%d")
 
-        result = get_alerts(
+        position = None
+        if cursor:
+            position = pagination.decode_cursor(cursor, ALERT_SORT_BY, ALERT_ORDER)
+            if position is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        result = await run_query(
+            get_alerts,
             date=date,
             alert_level=alert_level,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=position
         )
 
         logger.info(f"🚨 Alerts query: date={date}, level={alert_level}, returned {len(result['alerts'])} items")
 
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error querying alerts: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -219,6 +411,7 @@ async def list_alerts(
 
 @app.get("/api/statistics", response_model=StatisticsResponse)
 async def get_stats(
+    request: Request,
     date: Optional[str] = Query(None, description="日期 (YYYY-MM-DD)"),
     days: int = Query(1, ge=1, le=30, description="統計天數")
 ):
@@ -235,12 +428,19 @@ async def get_stats(
         if not date:
             date = datetime.utcnow().strftime("%Y-%m-%d")
 
-        result = get_statistics(date=date, days=days)
+        response = await cached_response(
+            request, "statistics", {"date": date, "days": days},
+            day_range(date, days), ("statistics",),
+            lambda: run_query(get_statistics, date=date, days=days),
+            model=StatisticsResponse
+        )
 
         logger.info(f"📊 Statistics query: date={date}, days={days}")
 
-        return result
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting statistics: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -248,6 +448,7 @@ async def get_stats(
 
 @app.get("/api/dashboard", response_model=DashboardResponse)
 async def get_dashboard(
+    request: Request,
     date: Optional[str] = Query(None, description="日期 (YYYY-MM-DD)，預設今天")
 ):
     """
@@ -271,12 +472,19 @@ async def get_dashboard(
         if not date:
             date = datetime.utcnow().strftime("%Y-%m-%d")
 
-        result = get_dashboard_data(date)
+        response = await cached_response(
+            request, "dashboard", {"date": date},
+            [date], ("processed", "alerts", "statistics"),
+            lambda: run_query(get_dashboard_data, date),
+            model=DashboardResponse
+        )
 
         logger.info(f"📊 Dashboard data requested for date={date}")
 
-        return result
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting dashboard data: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -284,6 +492,7 @@ async def get_dashboard(
 
 @app.get("/api/threat-intelligence", response_model=ThreatIntelligenceResponse)
 async def get_threat_intel(
+    request: Request,
     date: Optional[str] = Query(None, description="日期 (YYYY-MM-DD)")
 ):
     """
@@ -304,12 +513,19 @@ async def get_threat_intel(
         if not date:
             date = datetime.utcnow().strftime("%Y-%m-%d")
 
-        result = get_threat_intelligence(date=date)
+        response = await cached_response(
+            request, "threat-intelligence", {"date": date},
+            [date], ("threat_intelligence",),
+            lambda: run_query(get_threat_intelligence, date=date),
+            model=ThreatIntelligenceResponse
+        )
 
         logger.info(f"🔒 Threat intelligence query: date={date}")
 
-        return result
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting threat intelligence: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -317,6 +533,7 @@ async def get_threat_intel(
 
 @app.get("/api/geo-distribution")
 async def get_geo_dist(
+    request: Request,
     date: Optional[str] = Query(None, description="日期 (YYYY-MM-DD)"),
     days: int = Query(1, ge=1, le=30, description="統計天數")
 ):
@@ -336,13 +553,18 @@ async def get_geo_dist(
         if not date:
             date = datetime.utcnow().strftime("%Y-%m-%d")
 
-        from data_reader import get_geo_distribution
-        result = get_geo_distribution(date=date, days=days)
+        response = await cached_response(
+            request, "geo-distribution", {"date": date, "days": days},
+            day_range(date, days), ("processed", "statistics"),
+            lambda: run_query(get_geo_distribution, date=date, days=days)
+        )
 
-        logger.info(f"🌍 Geo distribution query: date={date}, days={days}, countries={result['total_countries']}")
+        logger.info(f"🌍 Geo distribution query: date={date}, days={days}")
 
-        return result
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting geo distribution: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -359,7 +581,8 @@ async def list_available_dates():
     ```
     """
     try:
-        dates = get_available_dates()
+        # 輕量查詢使用預設執行緒池，不和大量解析的查詢搶同一個池
+        dates = await asyncio.to_thread(get_available_dates)
 
         return {
             "dates": dates,
@@ -371,6 +594,195 @@ async def list_available_dates():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/stream")
+async def stream_events(
+    request: Request,
+    types: str = Query("session,alert", description="事件類型（逗號分隔）: session, alert"),
+    threat_level: Optional[str] = Query(None, description="威脅等級過濾"),
+    attack_type: Optional[str] = Query(None, description="攻擊類型過濾"),
+    min_risk: Optional[int] = Query(None, ge=0, le=100, description="最小風險分數 (0-100)"),
+    peer_ip: Optional[str] = Query(None, description="來源 IP 過濾 (支援部分匹配)")
+):
+    """
+    即時推送新的會話與 CRITICAL/HIGH 警報（Server-Sent Events）
+
+    事件 `session` 的資料與 /api/sessions 的項目相同，`alert` 與 /api/alerts 的項目相同。
+
+    **範例請求**:
+    ```
+    GET /api/stream
+    GET /api/stream?types=alert&min_risk=70
+    ```
+    """
+    event_types = {t.strip() for t in types.split(",") if t.strip()}
+    if not event_types or not event_types <= set(live_feed.EVENT_TYPES):
+        raise HTTPException(status_code=400, detail=f"Invalid types. Use: {', '.join(live_feed.EVENT_TYPES)}")
+
+    subscriber = live_feed.Subscriber(
+        event_types,
+        threat_level=threat_level,
+        attack_type=attack_type,
+        min_risk=min_risk,
+        peer_ip=peer_ip
+    )
+
+    async def events():
+        live_feed.feed.subscribe(subscriber)
+        logger.info(f"📡 Live feed subscriber connected: types={sorted(event_types)}")
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event_type, summary = await asyncio.wait_for(
+                        subscriber.queue.get(), timeout=live_feed.LIVE_FEED_HEARTBEAT_S
+                    )
+                    yield live_feed.format_event(event_type, summary)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+        finally:
+            live_feed.feed.unsubscribe(subscriber)
+            logger.info("📡 Live feed subscriber disconnected")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/export")
+async def export_sessions(
+    format: str = Query("ndjson", description="輸出格式: ndjson, csv, parquet"),
+    date: Optional[str] = Query(None, description="日期 (YYYY-MM-DD)，預設今天"),
+    start: Optional[str] = Query(None, description="時間範圍起點 (YYYY-MM-DD 或 ISO 時間，UTC)，指定時忽略 date"),
+    end: Optional[str] = Query(None, description="時間範圍終點（不含；只有日期時包含當天），預設現在"),
+    threat_level: Optional[str] = Query(None, description="威脅等級過濾"),
+    attack_type: Optional[str] = Query(None, description="攻擊類型過濾"),
+    min_risk: Optional[int] = Query(None, ge=0, le=100, description="最小風險分數 (0-100)"),
+    peer_ip: Optional[str] = Query(None, description="來源 IP 過濾 (支援部分匹配)"),
+    sess_uuid: Optional[str] = Query(None, description="會話 UUID 過濾 (支援部分匹配)"),
+    requires_review: Optional[bool] = Query(None, description="是否需要人工審查"),
+    gzip: bool = Query(False, description="以 gzip 壓縮輸出")
+):
+    """
+    批次匯出完整的會話資料（串流輸出，依日期與寫入順序）
+
+    NDJSON 每行一個完整 session；CSV 只包含摘要欄位；Parquet 包含摘要欄位與完整 session（document）。
+    逐天逐批讀取，匯出一個月的資料也只使用固定的記憶體。
+
+    **範例請求**:
+    ```
+    GET /api/export?date=2025-10-26
+    GET /api/export?format=csv&start=2025-10-01&end=2025-10-31&min_risk=70&gzip=true
+    ```
+    """
+    if format not in export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Use: {', '.join(export.EXPORT_FORMATS)}")
+    if format == "parquet" and not export.PYARROW_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+
+    if start or end:
+        if not start:
+            raise HTTPException(status_code=400, detail="start is required when end is given")
+        range_start, range_end = resolve_range(start, end)
+        label = f"{range_start.date()}_{(range_end - timedelta(microseconds=1)).date()}"
+    else:
+        date = date or datetime.utcnow().strftime("%Y-%m-%d")
+        try:
+            range_start = datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
+        range_end = range_start + timedelta(days=1)
+        label = date
+
+    # 在回傳回應前佔用名額（不等待）：名額已滿時直接 503，不會排隊
+    if _export_slots.locked():
+        raise HTTPException(status_code=503, detail="Too many concurrent exports, retry later")
+    await _export_slots.acquire()  # 未滿時立即取得，與上面的檢查之間不會切換到其他請求
+
+    released = False
+
+    def release_slot():
+        nonlocal released
+        if not released:
+            released = True
+            _export_slots.release()
+
+    try:
+        sessions = iter_sessions_range(
+            range_start,
+            range_end,
+            threat_level=threat_level,
+            attack_type=attack_type,
+            min_risk=min_risk,
+            peer_ip=peer_ip,
+            sess_uuid=sess_uuid,
+            requires_review=requires_review
+        )
+        chunks = export.export_stream(sessions, format, gzip=gzip)
+    except BaseException:
+        release_slot()
+        raise
+
+    # 產生器只能在沒有執行中的 next() 時關閉：連線中斷時執行緒可能還在 next(chunks) 中，
+    # 這時只設定 stopping，由該執行緒在 next() 結束後自己關閉
+    chunks_guard = threading.Lock()
+    busy = False
+    stopping = False
+
+    def next_chunk() -> Optional[bytes]:
+        nonlocal busy
+        with chunks_guard:
+            if stopping:
+                return None
+            busy = True
+        try:
+            return next(chunks, None)
+        finally:
+            with chunks_guard:
+                busy = False
+                close_now = stopping
+            if close_now:
+                chunks.close()
+
+    def close_chunks():
+        nonlocal stopping
+        with chunks_guard:
+            stopping = True
+            if busy:
+                return
+        chunks.close()
+
+    async def body():
+        logger.info(f"📦 Export started: format={format}, range={range_start}..{range_end}, gzip={gzip}")
+        try:
+            # 讀取與編碼在執行緒中進行，不阻塞事件迴圈
+            while True:
+                chunk = await run_in_threadpool(next_chunk)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            close_chunks()
+            release_slot()
+            logger.info("📦 Export finished")
+
+    stream = body()
+    # 連線在開始輸出前就中斷時 body() 不會執行，finally 也不會執行：產生器被回收時釋放名額
+    weakref.finalize(stream, release_slot)
+
+    media_type, extension = export.EXPORT_FORMATS[format]
+    filename = f"sessions-{label}.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8083)
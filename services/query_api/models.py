@@ -56,6 +56,7 @@ class SessionListResponse(BaseModel):
     limit: int = Field(..., description="每頁數量")
     offset: int = Field(..., description="偏移量")
     has_more: bool = Field(..., description="是否還有更多資料")
+    next_cursor: Optional[str] = Field(None, description="下一頁的游標（沒有下一頁時為 null）")
 
     class Config:
         json_schema_extra = {
@@ -64,7 +65,8 @@ class SessionListResponse(BaseModel):
                 "total": 150,
                 "limit": 50,
                 "offset": 0,
-                "has_more": True
+                "has_more": True,
+                "next_cursor": "WyJwcm9jZXNzZWRfYXQiLCJkZXNjIiwiMjAyNS0xMC0yNlQxMjowMDowMCIsInNlc3MtMDAxIl0"
             }
         }
 
@@ -174,6 +176,7 @@ class AlertListResponse(BaseModel):
     limit: int
     offset: int
     has_more: bool
+    next_cursor: Optional[str] = None
 
 
 # ==================== 統計相關模型 ====================
@@ -207,6 +210,10 @@ class StatisticsResponse(BaseModel):
     # 需要審查數量
     requires_review_count: int = Field(..., description="需要人工審查的數量")
 
+    # 由 sketches.json 合併（沒有摘要的日子為 None）
+    top_paths: Optional[Dict[str, int]] = Field(None, description="TOP 攻擊路徑")
+    risk_score_percentiles: Optional[Dict[str, int]] = Field(None, description="風險分數百分位數 (p50, p90, p95, p99)")
+
     class Config:
         json_schema_extra = {
             "example": {
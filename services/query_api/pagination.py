@@ -0,0 +1,73 @@
+"""
+分頁游標模組（keyset pagination）
+
+列表依 (排序鍵, sess_uuid) 排序，游標記錄上一頁最後一筆的位置；下一頁從這個位置之後開始，
+不需要跳過前面的 offset 筆，深頁的成本與第一頁相同，資料持續寫入時也不會重複或遺漏。
+
+游標對呼叫端是不透明的字串（URL-safe base64 的 JSON），內含排序欄位與方向，
+與請求的排序參數不一致時視為無效。
+"""
+
+import base64
+import binascii
+from typing import Any, Optional, Tuple
+
+from codec import dumps, loads
+
+# 排序欄位的值型別（其他排序欄位只以 sess_uuid 排序，值固定為 None）
+_KEY_TYPES = {
+    "risk_score": int,
+    "processed_at": str,
+}
+
+# API 接受的排序欄位與方向
+SORT_FIELDS = tuple(_KEY_TYPES)
+SORT_ORDERS = ("asc", "desc")
+
+Cursor = Tuple[Any, str]
+
+
+def sort_value(record: dict, sort_by: str) -> Any:
+    """記錄的排序鍵（缺少時視為 0 / 空字串，與排序時相同）"""
+    key_type = _KEY_TYPES.get(sort_by)
+    if key_type is None:
+        return None
+    return record.get(sort_by) or key_type()
+
+
+def sort_key(record: dict, sort_by: str) -> Cursor:
+    """完整的排序鍵：(排序鍵, sess_uuid)"""
+    return sort_value(record, sort_by), record.get('sess_uuid') or ''
+
+
+def encode_cursor(record: dict, sort_by: str, order: str) -> str:
+    """以本頁最後一筆記錄產生下一頁的游標"""
+    value, uuid = sort_key(record, sort_by)
+    payload = dumps([sort_by, order, value, uuid])
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, order: str) -> Optional[Cursor]:
+    """
+    解析游標
+
+    Returns:
+        (排序鍵, sess_uuid)；游標無效或與排序參數不一致時回傳 None
+    """
+    try:
+        payload = loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+
+    if not isinstance(payload, list) or len(payload) != 4:
+        return None
+    cursor_sort_by, cursor_order, value, uuid = payload
+    if cursor_sort_by != sort_by or cursor_order != order or not isinstance(uuid, str):
+        return None
+
+    key_type = _KEY_TYPES.get(sort_by)
+    if key_type is None:
+        value = None
+    elif not isinstance(value, key_type) or isinstance(value, bool):
+        return None
+    return value, uuid
@@ -0,0 +1,205 @@
+"""
+Parquet 欄式讀取模組
+
+讀取 analytics_worker 以 OUTPUT_FORMAT=parquet 寫出的 processed/<date>/sessions-*.parquet。
+檔名規則與 analytics_worker/parquet_store.py 相同（各服務是獨立的 Docker build context，各保留一份）：
+- sessions-<HH>-<consumer>-s<seg>-p<part>.parquet：每批次寫出的 part 檔
+- sessions-<HH>-<consumer>-s<seg>.parquet：合併檔，存在時忽略同一 segment 的 part 檔
+
+查詢只讀取需要的欄位；完整 session 存在 document 欄位，只有詳細查詢才讀取。
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from codec import loads
+from pagination import Cursor
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+FILE_PATTERN = re.compile(r"^sessions-(\d{2})-(.+)-s(\d{4,})(?:-p(\d{5,}))?\.parquet$")
+
+# 會話列表摘要需要的欄位（不含 document）
+SUMMARY_COLUMNS = [
+    "sess_uuid", "peer_ip", "peer_port", "user_agent", "attack_types", "risk_score",
+    "threat_level", "alert_level", "processed_at", "total_requests",
+    "has_malicious_activity", "is_scanner", "tool_identified", "requires_review",
+]
+
+
+def list_parquet_files(date_dir: Path) -> List[Path]:
+    """列出目錄下可讀取的 Parquet 檔案（合併檔存在的 segment 只回傳合併檔）"""
+    if not PYARROW_AVAILABLE or not date_dir.exists():
+        return []
+
+    segments: Dict[Tuple[str, str, str], Path] = {}
+    parts: Dict[Tuple[str, str, str], List[Path]] = {}
+    for file_path in date_dir.iterdir():
+        match = FILE_PATTERN.match(file_path.name)
+        if not match:
+            continue
+        hour, consumer, seg, part = match.groups()
+        key = (hour, consumer, seg)
+        if part is None:
+            segments[key] = file_path
+        else:
+            parts.setdefault(key, []).append(file_path)
+
+    files = list(segments.values())
+    for key, part_files in parts.items():
+        if key not in segments:
+            files.extend(part_files)
+    return sorted(files, key=lambda p: p.name)
+
+
+def read_table(date_dir: Path, columns: List[str], filters=None):
+    """
+    讀取某天所有 Parquet 檔案的指定欄位
+
+    Returns:
+        pyarrow.Table 或 None（沒有 Parquet 檔案）
+    """
+    tables = []
+    for file_path in list_parquet_files(date_dir):
+        try:
+            tables.append(pq.read_table(file_path, columns=columns, filters=filters))
+        except FileNotFoundError:
+            # 讀取途中 part 被合併刪除
+            logger.debug(f"Parquet file disappeared during read: {file_path}")
+        except Exception as e:
+            logger.error(f"Error reading Parquet file {file_path}: {e}")
+
+    if not tables:
+        return None
+    return pa.concat_tables(tables)
+
+
+def read_sessions(date_dir: Path) -> List[Dict[str, Any]]:
+    """讀取完整 session（document 欄位）"""
+    table = read_table(date_dir, ["document"])
+    if table is None:
+        return []
+    return [loads(document) for document in table.column("document").to_pylist()]
+
+
+def iter_documents(date_dir: Path, batch_size: int = 1024) -> Iterator[bytes]:
+    """逐批讀取完整 session 的原始 JSON（document 欄位），記憶體中只保留一個批次"""
+    for file_path in list_parquet_files(date_dir):
+        try:
+            parquet_file = pq.ParquetFile(file_path)
+        except FileNotFoundError:
+            # 讀取途中 part 被合併刪除（合併檔已在清單中）
+            logger.debug(f"Parquet file disappeared during read: {file_path}")
+            continue
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=["document"]):
+            yield from batch.column(0).to_pylist()
+
+
+def find_session(date_dir: Path, uuid: str) -> Optional[Dict[str, Any]]:
+    """以 sess_uuid 查詢單一 session（利用 row group 統計資訊跳過不相關的資料）"""
+    table = read_table(date_dir, ["document"], filters=[("sess_uuid", "=", uuid)])
+    if table is None or table.num_rows == 0:
+        return None
+    return loads(table.column("document")[0].as_py())
+
+
+def _contains_mask(column, pattern: str):
+    """不分大小寫的部分匹配，null 視為不匹配"""
+    return pc.fill_null(pc.match_substring(column, pattern, ignore_case=True), False)
+
+
+def query_sessions(
+    date_dir: Path,
+    threat_level: Optional[str] = None,
+    attack_type: Optional[str] = None,
+    min_risk: Optional[int] = None,
+    peer_ip: Optional[str] = None,
+    sess_uuid: Optional[str] = None,
+    requires_review: Optional[bool] = None,
+    limit: int = 50,
+    offset: int = 0,
+    sort_by: str = "processed_at",
+    order: str = "desc",
+    cursor: Optional[Cursor] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    以欄式運算過濾、排序、分頁（依 (排序鍵, sess_uuid) 排序，指定 cursor 時從游標之後開始並忽略 offset）
+
+    Returns:
+        (符合條件的總數, 本頁的摘要欄位列表)
+    """
+    table = read_table(date_dir, SUMMARY_COLUMNS)
+    if table is None:
+        return 0, []
+
+    mask = None
+
+    def _and(condition):
+        nonlocal mask
+        mask = condition if mask is None else pc.and_(mask, condition)
+
+    if threat_level:
+        _and(pc.fill_null(pc.equal(table["threat_level"], threat_level), False))
+
+    if attack_type:
+        attacks = table["attack_types"].combine_chunks()
+        flat_matches = pc.equal(pc.list_flatten(attacks), attack_type)
+        matched_rows = pc.unique(pc.filter(pc.list_parent_indices(attacks), flat_matches))
+        row_ids = pa.array(range(table.num_rows), type=matched_rows.type)
+        _and(pc.is_in(row_ids, value_set=matched_rows))
+
+    if min_risk is not None:
+        _and(pc.greater_equal(pc.fill_null(table["risk_score"], 0), min_risk))
+
+    if peer_ip:
+        _and(_contains_mask(table["peer_ip"], peer_ip))
+
+    if sess_uuid:
+        _and(_contains_mask(table["sess_uuid"], sess_uuid))
+
+    if requires_review is not None:
+        _and(pc.equal(pc.fill_null(table["requires_review"], False), requires_review))
+
+    # processed_at 範圍 [start_time, end_time)
+    if start_time:
+        _and(pc.fill_null(pc.greater_equal(table["processed_at"], start_time), False))
+    if end_time:
+        _and(pc.fill_null(pc.less(table["processed_at"], end_time), False))
+
+    if mask is not None:
+        table = table.filter(mask)
+    total = table.num_rows
+
+    sort_keys = ["sess_uuid"]
+    if sort_by in ("risk_score", "processed_at"):
+        sort_keys.insert(0, sort_by)
+
+    if cursor is not None:
+        # 游標之後：排序鍵較小（降序）/ 較大（升序），或排序鍵相同且 sess_uuid 較小 / 較大
+        compare = pc.less if order == "desc" else pc.greater
+        value, uuid = cursor
+        after = compare(table["sess_uuid"], uuid)
+        if sort_by in ("risk_score", "processed_at"):
+            after = pc.or_(
+                compare(table[sort_by], value),
+                pc.and_(pc.equal(table[sort_by], value), after)
+            )
+        table = table.filter(pc.fill_null(after, False))
+        offset = 0
+
+    direction = "descending" if order == "desc" else "ascending"
+    table = table.sort_by([(key, direction) for key in sort_keys])
+
+    return total, table.slice(offset, limit).to_pylist()
@@ -0,0 +1,228 @@
+"""
+回應快取與條件式 GET 模組
+
+儀表板、統計、威脅情報與地理分布的回應只有在 analytics_worker 寫入新資料時才會改變：
+- 資料版本：相關日期的資料目錄下所有檔案的 (名稱, inode, 大小, mtime)，資料庫模式再加上資料庫檔案的狀態；
+  只需要 stat，不讀取內容；結果保留 RESPONSE_VERSION_TTL_S 秒，同一時間的請求共用一次掃描
+- ETag = hash(端點, 參數, 資料版本)；If-None-Match 相符時直接回傳 304，不必計算回應
+- 算好的 JSON 以 (端點, 參數, 資料版本) 為鍵放在小型 LRU 中，壓縮後的版本也一起保留
+- 依 Accept-Encoding 回傳 brotli（有安裝 brotli 套件時）或 gzip，小於 RESPONSE_COMPRESS_MIN_BYTES 的不壓縮；
+  序列化與壓縮由呼叫端放在執行緒中進行（Rendered.ready() 為 False 時），不阻塞事件迴圈
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from data_reader import DATA_DIR
+from sqlite_reader import DATABASE_PATH
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# 快取的回應數量上限
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", 128))
+# 小於這個大小的回應不壓縮（位元組）
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", 1024))
+# 資料版本的有效時間（秒）：期間內資料變更時 ETag 最多晚這麼久才改變
+RESPONSE_VERSION_TTL_S = float(os.getenv("RESPONSE_VERSION_TTL_S", 1))
+
+# 每天的資料目錄
+DATA_CATEGORIES = ("processed", "alerts", "statistics", "threat_intelligence")
+
+CacheKey = Tuple[str, Tuple[Tuple[str, Any], ...], str]
+
+
+def _hash_tree(h: "hashlib._Hash", directory: Path, prefix: str) -> None:
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                _hash_tree(h, Path(entry.path), f"{prefix}{entry.name}/")
+                continue
+            stat = entry.stat()
+        except FileNotFoundError:
+            # 暫存檔在列出後被改名
+            continue
+        h.update(f"{prefix}{entry.name}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+
+
+# (日期, 資料目錄) → (計算時間, 版本)
+_versions: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], Tuple[float, str]] = {}
+_versions_lock = threading.Lock()
+
+
+def data_version(dates: Iterable[str], categories: Iterable[str] = DATA_CATEGORIES) -> str:
+    """
+    某些日期、某些資料目錄目前的版本（RESPONSE_VERSION_TTL_S 秒內沿用上次的結果）
+
+    processed 包含在 categories 中時，資料庫檔案的狀態也算在內（資料庫模式下 session 寫在資料庫裡）。
+    """
+    key = (tuple(dates), tuple(categories))
+    now = time.monotonic()
+    with _versions_lock:
+        cached = _versions.get(key)
+        if cached is not None and now - cached[0] < RESPONSE_VERSION_TTL_S:
+            return cached[1]
+
+    version = _scan_version(*key)
+
+    with _versions_lock:
+        _versions[key] = (now, version)
+        if len(_versions) > RESPONSE_CACHE_ENTRIES:
+            for expired in [k for k, (at, _) in _versions.items() if now - at >= RESPONSE_VERSION_TTL_S]:
+                del _versions[expired]
+    return version
+
+
+def _scan_version(dates: Tuple[str, ...], categories: Tuple[str, ...]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for date in dates:
+        h.update(f"[{date}]\n".encode())
+        for category in categories:
+            _hash_tree(h, Path(DATA_DIR) / category / date, f"{category}/")
+
+    if "processed" in categories:
+        for path in (DATABASE_PATH, DATABASE_PATH + "-wal"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            h.update(f"{path}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+
+    return h.hexdigest()
+
+
+def cache_key(endpoint: str, params: Dict[str, Any], version: str) -> CacheKey:
+    return endpoint, tuple(sorted(params.items())), version
+
+
+def etag_for(key: CacheKey) -> str:
+    # 弱 ETag：同一份內容的不同壓縮版本共用
+    return 'W/"' + hashlib.blake2b(repr(key).encode(), digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否包含這個 ETag（弱比較）"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """依 Accept-Encoding 選擇壓縮方式（br 優先），不接受壓縮時回傳 None"""
+    if not accept_encoding:
+        return None
+
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+
+    if BROTLI_AVAILABLE and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class Rendered:
+    """算好的回應：JSON bytes 與各壓縮版本"""
+    __slots__ = ("etag", "body", "encoded")
+
+    def __init__(self, etag: str, body: bytes):
+        self.etag = etag
+        self.body = body
+        self.encoded: Dict[str, bytes] = {}
+
+    def ready(self, encoding: Optional[str]) -> bool:
+        """content(encoding) 是否不需要壓縮（可以直接在事件迴圈中呼叫）"""
+        return encoding is None or len(self.body) < RESPONSE_COMPRESS_MIN_BYTES or encoding in self.encoded
+
+    def content(self, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """
+        Returns:
+            (回應內容, 實際使用的 Content-Encoding)
+        """
+        if encoding is None or len(self.body) < RESPONSE_COMPRESS_MIN_BYTES:
+            return self.body, None
+
+        data = self.encoded.get(encoding)
+        if data is None:
+            if encoding == "br":
+                data = brotli.compress(self.body, quality=5)
+            else:
+                data = gzip.compress(self.body, compresslevel=6)
+            self.encoded[encoding] = data
+        return data, encoding
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, Rendered]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: CacheKey) -> Optional[Rendered]:
+        with self._lock:
+            rendered = self._entries.get(key)
+            if rendered is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rendered
+
+    def put(self, key: CacheKey, rendered: Rendered) -> None:
+        with self._lock:
+            self._entries[key] = rendered
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def count_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified
+            }
+
+
+cache = ResponseCache()
@@ -0,0 +1,327 @@
+"""
+Session 索引讀取模組
+
+analytics_worker 在每個 JSONL 檔案旁維護 <檔名>.idx（每行：sess_uuid、offset、length 與過濾欄位，
+格式見 analytics_worker/session_index.py）。這裡把索引載入記憶體並快取：
+- 索引只追加，檔案變大時只讀取新增的尾段，二級索引也跟著增量更新
+- 檔案被重建（inode 改變或變小）時重新載入
+
+以 UUID 查詢 session 只需要一次 dict 查詢、一次 seek 與一次 JSON 解析；
+會話列表以二級索引取交集後，沿著預先排序的記錄序號走訪，只解析本頁要回傳的記錄：
+- threat_level / attack_type / requires_review：posting list（記錄序號，遞增）
+- risk_score：依分數分桶（桶內依序號），最低分數過濾只需合併符合的桶
+- peer_ip：每個不同 IP 的 posting list（部分匹配只需比對不同的 IP，不必走訪每筆記錄）
+- 排序：每個排序欄位一個依 (排序鍵, sess_uuid) 排序的記錄序號列表，第一次查詢時建立，
+  之後新增的記錄以二分搜尋插入；分頁游標以二分搜尋定位，深頁的成本與第一頁相同
+
+每個檔案的索引有自己的鎖，只在增量更新時持有；查詢在鎖內記下目前的記錄數與排序列表，
+過濾、排序與分頁都在鎖外進行，不同日期、不同執行緒的查詢可以並行。
+索引的列表只會追加（排序列表更新時換成新的列表），鎖外讀取記下的前 N 筆是安全的。
+"""
+
+import bisect
+import itertools
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from codec import loads
+from pagination import Cursor
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".idx"
+
+
+# 含過濾欄位的索引行欄位數（只有 3 欄的是舊版格式）
+FULL_ENTRY_FIELDS = 9
+
+
+class _DayIndex:
+    __slots__ = (
+        "lock", "inode", "consumed", "complete", "positions", "records", "uuids", "processed_at", "risk_scores",
+        "threat_levels", "attack_types", "review", "risk_buckets", "ips", "orders"
+    )
+
+    def __init__(self, inode: int):
+        self.lock = threading.Lock()
+        self.inode = inode
+        self.consumed = 0
+        # 所有索引行都有過濾欄位時才能用於會話列表查詢
+        self.complete = True
+        # sess_uuid → 記錄序號（重複時以最後一筆為準）
+        self.positions: Dict[str, int] = {}
+        # 依記錄序號：(offset, length)、sess_uuid、processed_at、risk_score
+        self.records: List[Tuple[int, int]] = []
+        self.uuids: List[str] = []
+        self.processed_at: List[str] = []
+        self.risk_scores: List[int] = []
+        # 二級索引
+        self.threat_levels: Dict[str, List[int]] = {}
+        self.attack_types: Dict[str, List[int]] = {}
+        self.review: List[int] = []
+        self.risk_buckets: Dict[int, List[int]] = {}
+        self.ips: Dict[str, List[int]] = {}
+        # 排序欄位 → 依 (排序鍵, sess_uuid) 遞增排序的記錄序號（copy-on-write，鎖外可以安全讀取）
+        self.orders: Dict[str, List[int]] = {}
+
+    def refresh(self, path: Path, size: int) -> None:
+        """讀取索引檔新增的完整行（呼叫端持有 self.lock）"""
+        if size <= self.consumed:
+            return
+
+        with open(path, "rb") as f:
+            f.seek(self.consumed)
+            data = f.read(size - self.consumed)
+
+        # 只處理完整的行，寫到一半的最後一行留到下次
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            fields = line.decode("utf-8", errors="replace").split("\t")
+            try:
+                self.add(fields)
+            except (ValueError, IndexError):
+                logger.warning(f"Skipping malformed index line in {path}")
+        self.consumed += end
+
+    def add(self, fields: List[str]) -> None:
+        ordinal = len(self.records)
+        sess_uuid = fields[0]
+        self.records.append((int(fields[1]), int(fields[2])))
+        self.uuids.append(sess_uuid)
+        self.positions[sess_uuid] = ordinal
+
+        if len(fields) != FULL_ENTRY_FIELDS:
+            self.complete = False
+            self.processed_at.append("")
+            self.risk_scores.append(0)
+            return
+
+        threat_level, risk_score, requires_review, peer_ip, processed_at, attack_types = fields[3:]
+        self.processed_at.append(processed_at)
+        self.risk_scores.append(int(risk_score))
+        self.threat_levels.setdefault(threat_level, []).append(ordinal)
+        self.risk_buckets.setdefault(int(risk_score), []).append(ordinal)
+        self.ips.setdefault(peer_ip, []).append(ordinal)
+        if requires_review == "1":
+            self.review.append(ordinal)
+        for attack_type in dict.fromkeys(attack_types.split(",")):
+            if attack_type:
+                self.attack_types.setdefault(attack_type, []).append(ordinal)
+
+    def sort_key(self, sort_by: str) -> Callable[[int], Cursor]:
+        """記錄序號 → (排序鍵, sess_uuid)，與 pagination.sort_key 相同"""
+        uuids = self.uuids
+        if sort_by == "risk_score":
+            return lambda ordinal: (self.risk_scores[ordinal], uuids[ordinal])
+        if sort_by == "processed_at":
+            return lambda ordinal: (self.processed_at[ordinal], uuids[ordinal])
+        return lambda ordinal: (None, uuids[ordinal])
+
+    def ordered(self, sort_by: str) -> List[int]:
+        """
+        依 (排序鍵, sess_uuid) 遞增排序的所有記錄序號（增量維護，呼叫端持有 self.lock）
+
+        有新記錄時建立新的列表再替換，已經交給查詢的舊列表不會被修改。
+        """
+        key = self.sort_key(sort_by)
+        order = self.orders.get(sort_by)
+        if order is None:
+            order = self.orders[sort_by] = sorted(range(len(self.records)), key=key)
+        elif len(order) < len(self.records):
+            new = range(len(order), len(self.records))
+            if len(new) * 8 > len(order):
+                # 新增的記錄很多時整體重排（大部分已排序，timsort 接近線性）
+                order = order + list(new)
+                order.sort(key=key)
+            else:
+                order = list(order)
+                for ordinal in new:
+                    bisect.insort(order, ordinal, key=key)
+            self.orders[sort_by] = order
+        return order
+
+
+_cache: Dict[Path, _DayIndex] = {}
+# 只保護 _cache 本身；各檔案的索引由 _DayIndex.lock 保護
+_lock = threading.Lock()
+
+
+def index_path(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + INDEX_SUFFIX)
+
+
+def _refresh(path: Path) -> Optional[_DayIndex]:
+    """載入或增量更新索引，索引不存在時回傳 None"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        with _lock:
+            _cache.pop(path, None)
+        return None
+
+    with _lock:
+        entry = _cache.get(path)
+        if entry is None or entry.inode != stat.st_ino or stat.st_size < entry.consumed:
+            entry = _cache[path] = _DayIndex(stat.st_ino)
+
+    with entry.lock:
+        entry.refresh(path, stat.st_size)
+    return entry
+
+
+def _upto(posting: List[int], count: int) -> List[int]:
+    """posting list 中序號小於 count 的部分（鎖外讀取時排除之後才加入的記錄）"""
+    if not posting or posting[-1] < count:
+        return posting
+    return posting[:bisect.bisect_left(posting, count)]
+
+
+def lookup(file_path: Path, uuid: str) -> Tuple[bool, Optional[Tuple[int, int]]]:
+    """
+    Returns:
+        (是否有索引, (offset, length) 或 None)
+    """
+    entry = _refresh(index_path(file_path))
+    if entry is None:
+        return False, None
+    ordinal = entry.positions.get(uuid)
+    return True, (entry.records[ordinal] if ordinal is not None else None)
+
+
+def find_session(file_path: Path, uuid: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+    """
+    以索引查詢 session
+
+    Returns:
+        (結果是否可信, session 或 None)；沒有索引或索引與資料不一致時回傳 (False, None)，由呼叫端掃描檔案
+    """
+    indexed, position = lookup(file_path, uuid)
+    if not indexed:
+        return False, None
+    if position is None:
+        return True, None
+
+    offset, length = position
+    try:
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            session = loads(f.read(length))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Index entry for {uuid} in {file_path} is unreadable: {e}")
+        return False, None
+
+    if not isinstance(session, dict) or session.get("sess_uuid") != uuid:
+        logger.warning(f"Index for {file_path} is out of date, run maintenance.py rebuild-index")
+        return False, None
+    return True, session
+
+
+def query_sessions(
+    file_path: Path,
+    threat_level: Optional[str] = None,
+    attack_type: Optional[str] = None,
+    min_risk: Optional[int] = None,
+    peer_ip: Optional[str] = None,
+    sess_uuid: Optional[str] = None,
+    requires_review: Optional[bool] = None,
+    limit: int = 50,
+    offset: int = 0,
+    sort_by: str = "processed_at",
+    order: str = "desc",
+    cursor: Optional[Cursor] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+) -> Optional[Tuple[int, List[Tuple[int, int]]]]:
+    """
+    以二級索引過濾、排序、分頁（語意與逐筆掃描相同）
+
+    指定 cursor 時從游標之後開始（忽略 offset）；start_time / end_time 限制 processed_at 的範圍
+    （[start_time, end_time)，ISO 格式字串比較），以 processed_at 的排序二分搜尋。
+
+    Returns:
+        (符合條件的總數, 本頁記錄的 (offset, length) 列表)；沒有完整索引時回傳 None
+    """
+    entry = _refresh(index_path(file_path))
+    if entry is None:
+        return None
+
+    # 鎖內只記下目前的狀態，之後的過濾、排序與分頁不持有鎖
+    with entry.lock:
+        # 索引從檔案中間才開始（升級前的舊資料）時也不能用
+        if not entry.complete or (entry.records and entry.records[0][0] != 0):
+            return None
+        count = len(entry.records)
+        by_time = entry.ordered("processed_at") if start_time or end_time else None
+        by_sort = entry.ordered(sort_by)
+        risk_buckets = list(entry.risk_buckets.items()) if min_risk is not None else []
+        ips = list(entry.ips.items()) if peer_ip else []
+
+    # 各條件的候選記錄（posting list）
+    postings: List[List[int]] = []
+    if threat_level:
+        postings.append(_upto(entry.threat_levels.get(threat_level, []), count))
+    if attack_type:
+        postings.append(_upto(entry.attack_types.get(attack_type, []), count))
+    if requires_review:
+        postings.append(_upto(entry.review, count))
+    if min_risk is not None:
+        postings.append([
+            ordinal
+            for score, bucket in risk_buckets if score >= min_risk
+            for ordinal in _upto(bucket, count)
+        ])
+    if peer_ip:
+        needle = peer_ip.lower()
+        postings.append([
+            ordinal
+            for ip, bucket in ips if needle in ip.lower()
+            for ordinal in _upto(bucket, count)
+        ])
+    if sess_uuid:
+        needle = sess_uuid.lower()
+        postings.append([
+            ordinal for ordinal, uuid in enumerate(itertools.islice(entry.uuids, count))
+            if needle in uuid.lower()
+        ])
+    if by_time is not None:
+        key = entry.sort_key("processed_at")
+        low = bisect.bisect_left(by_time, (start_time, ""), key=key) if start_time else 0
+        high = bisect.bisect_left(by_time, (end_time, ""), key=key) if end_time else len(by_time)
+        postings.append(by_time[low:high])
+
+    # 由小到大取交集
+    candidates = None
+    for posting in sorted(postings, key=len):
+        candidates = set(posting) if candidates is None else candidates.intersection(posting)
+        if not candidates:
+            break
+    if requires_review is False:
+        excluded = set(_upto(entry.review, count))
+        base = candidates if candidates is not None else range(count)
+        candidates = {ordinal for ordinal in base if ordinal not in excluded}
+
+    total = count if candidates is None else len(candidates)
+
+    # 沿著排序好的記錄序號走訪，從游標（或開頭）之後取 limit 筆；
+    # 候選記錄很少時直接排序候選記錄，不必走訪整個排序
+    key = entry.sort_key(sort_by)
+    if candidates is not None and len(candidates) * 16 < count:
+        ordered = sorted(candidates, key=key)
+        candidates = None
+    else:
+        ordered = by_sort
+
+    if order == "desc":
+        end = len(ordered) if cursor is None else bisect.bisect_left(ordered, cursor, key=key)
+        walk = (ordered[i] for i in range(end - 1, -1, -1))
+    else:
+        start = 0 if cursor is None else bisect.bisect_right(ordered, cursor, key=key)
+        walk = itertools.islice(ordered, start, None)
+    if candidates is not None:
+        walk = (ordinal for ordinal in walk if ordinal in candidates)
+    skip = 0 if cursor is not None else offset
+    page = list(itertools.islice(walk, skip, skip + limit))
+
+    return total, [entry.records[ordinal] for ordinal in page]
@@ -0,0 +1,242 @@
+"""
+SQLite 資料庫讀取模組
+
+讀取 analytics_worker 以 OUTPUT_FORMAT=database 寫入的嵌入式資料庫（schema 見 analytics_worker/sqlite_store.py）。
+以唯讀模式開啟（資料目錄為唯讀掛載），過濾與排序使用資料庫索引，不需要掃描檔案。
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from codec import loads
+from pagination import Cursor
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join(DATA_DIR, "database", "sessions.db"))
+DATABASE_BUSY_TIMEOUT_MS = int(os.getenv("DATABASE_BUSY_TIMEOUT_MS", 10000))
+
+SUMMARY_COLUMNS = """
+    s.sess_uuid, s.peer_ip, s.peer_port, s.user_agent, s.risk_score, s.threat_level, s.alert_level,
+    s.processed_at, s.total_requests, s.has_malicious_activity, s.is_scanner, s.tool_identified,
+    (SELECT group_concat(attack_type, char(31)) FROM (
+        SELECT a.attack_type FROM session_attack_types a WHERE a.session_id = s.id ORDER BY a.seq
+    ))
+"""
+
+# sqlite3 連線不能跨執行緒共用，每個執行緒各自開啟一個唯讀連線
+_local = threading.local()
+
+
+def get_connection() -> Optional[sqlite3.Connection]:
+    """取得本執行緒的唯讀連線，資料庫不存在時回傳 None"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+
+    db_path = Path(DATABASE_PATH)
+    if not db_path.exists():
+        return None
+
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=DATABASE_BUSY_TIMEOUT_MS / 1000)
+    except sqlite3.Error as e:
+        logger.error(f"Error opening database {db_path}: {e}")
+        return None
+    _local.conn = conn
+    return conn
+
+
+def _execute(query: str, params: Tuple = ()) -> List[Tuple]:
+    conn = get_connection()
+    if conn is None:
+        return []
+    try:
+        return conn.execute(query, params).fetchall()
+    except sqlite3.OperationalError as e:
+        # 資料庫尚未建立 schema，或寫入端持有鎖超過 timeout
+        logger.error(f"Error querying database: {e}")
+        return []
+
+
+def _to_bool(value: Optional[int]) -> Optional[bool]:
+    return None if value is None else bool(value)
+
+
+def has_date(date: str) -> bool:
+    return bool(_execute("SELECT 1 FROM sessions WHERE date = ? LIMIT 1", (date,)))
+
+
+def list_dates() -> List[str]:
+    return [date for (date,) in _execute("SELECT DISTINCT date FROM sessions")]
+
+
+def read_sessions(date: str) -> List[Dict[str, Any]]:
+    """讀取某天所有 session 的完整資料"""
+    rows = _execute("SELECT document FROM sessions WHERE date = ? ORDER BY id", (date,))
+    return [loads(document) for (document,) in rows]
+
+
+def iter_documents(date: str, batch_size: int = 1000) -> Iterator[bytes]:
+    """
+    逐批讀取某天所有 session 的原始 JSON
+
+    每個批次是一個獨立的查詢（以 id 接續），查詢之間不持有讀取鎖，長時間的匯出不會擋住 worker 寫入。
+    使用獨立的連線，迭代可以跨執行緒進行。
+    """
+    db_path = Path(DATABASE_PATH)
+    if not db_path.exists():
+        return
+
+    try:
+        conn = sqlite3.connect(
+            f"file:{db_path}?mode=ro", uri=True,
+            timeout=DATABASE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False
+        )
+    except sqlite3.Error as e:
+        logger.error(f"Error opening database {db_path}: {e}")
+        return
+
+    try:
+        last_id = 0
+        while True:
+            try:
+                rows = conn.execute(
+                    "SELECT id, document FROM sessions WHERE date = ? AND id > ? ORDER BY id LIMIT ?",
+                    (date, last_id, batch_size)
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                logger.error(f"Error querying database: {e}")
+                return
+            if not rows:
+                return
+            for _, document in rows:
+                yield document
+            last_id = rows[-1][0]
+    finally:
+        conn.close()
+
+
+def find_session(uuid: str) -> Optional[Dict[str, Any]]:
+    """以 sess_uuid 索引查詢單一 session（不限日期）"""
+    rows = _execute("SELECT document FROM sessions WHERE sess_uuid = ?", (uuid,))
+    return loads(rows[0][0]) if rows else None
+
+
+def query_sessions(
+    date: str,
+    threat_level: Optional[str] = None,
+    attack_type: Optional[str] = None,
+    min_risk: Optional[int] = None,
+    peer_ip: Optional[str] = None,
+    sess_uuid: Optional[str] = None,
+    requires_review: Optional[bool] = None,
+    limit: int = 50,
+    offset: int = 0,
+    sort_by: str = "processed_at",
+    order: str = "desc",
+    cursor: Optional[Cursor] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    以 SQL 過濾、排序、分頁
+
+    依 (排序鍵, sess_uuid) 排序；指定 cursor 時以索引定位到游標之後（忽略 offset）。
+    start_time / end_time 限制 processed_at 的範圍 [start_time, end_time)。
+
+    Returns:
+        (符合條件的總數, 本頁的會話摘要列表)
+    """
+    conditions = ["s.date = ?"]
+    params: List[Any] = [date]
+
+    if threat_level:
+        conditions.append("s.threat_level = ?")
+        params.append(threat_level)
+    if attack_type:
+        conditions.append("s.id IN (SELECT session_id FROM session_attack_types WHERE attack_type = ?)")
+        params.append(attack_type)
+    if min_risk is not None:
+        conditions.append("COALESCE(s.risk_score, 0) >= ?")
+        params.append(min_risk)
+    if peer_ip:
+        # 部分匹配（LIKE 不分大小寫）
+        conditions.append("s.peer_ip LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(peer_ip))
+    if sess_uuid:
+        conditions.append("s.sess_uuid LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(sess_uuid))
+    if requires_review is not None:
+        conditions.append("COALESCE(s.requires_review, 0) = ?")
+        params.append(int(requires_review))
+    # processed_at 範圍 [start_time, end_time)
+    if start_time:
+        conditions.append("s.processed_at >= ?")
+        params.append(start_time)
+    if end_time:
+        conditions.append("s.processed_at < ?")
+        params.append(end_time)
+
+    where = " AND ".join(conditions)
+
+    rows = _execute(f"SELECT COUNT(*) FROM sessions s WHERE {where}", tuple(params))
+    total = rows[0][0] if rows else 0
+    if total == 0:
+        return 0, []
+
+    direction = "DESC" if order == "desc" else "ASC"
+    # 與檔案路徑相同：同分時依 sess_uuid
+    sort_columns = ["s.sess_uuid"]
+    if sort_by in ("risk_score", "processed_at"):
+        sort_columns.insert(0, f"s.{sort_by}")
+    order_by = ", ".join(f"{column} {direction}" for column in sort_columns)
+
+    if cursor is not None:
+        value, uuid = cursor
+        comparison = "<" if order == "desc" else ">"
+        if len(sort_columns) == 2:
+            conditions.append(f"({sort_columns[0]}, s.sess_uuid) {comparison} (?, ?)")
+            params.extend([value, uuid])
+        else:
+            conditions.append(f"s.sess_uuid {comparison} ?")
+            params.append(uuid)
+        where = " AND ".join(conditions)
+        offset = 0
+
+    rows = _execute(
+        f"SELECT {SUMMARY_COLUMNS} FROM sessions s WHERE {where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+        tuple(params) + (limit, offset)
+    )
+
+    summaries = []
+    for row in rows:
+        (uuid, ip, port, user_agent, risk_score, threat, alert, processed_at,
+         total_requests, has_malicious, is_scanner, tool, attack_types) = row
+        summaries.append({
+            "sess_uuid": uuid,
+            "peer_ip": ip,
+            "peer_port": port,
+            "user_agent": user_agent,
+            "attack_types": attack_types.split("\x1f") if attack_types else [],
+            "risk_score": risk_score,
+            "threat_level": threat,
+            "alert_level": alert,
+            "processed_at": processed_at,
+            "total_requests": total_requests,
+            "has_malicious_activity": _to_bool(has_malicious),
+            "is_scanner": _to_bool(is_scanner),
+            "tool_identified": tool
+        })
+
+    return total, summaries
+
+
+def _like_pattern(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
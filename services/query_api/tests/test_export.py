@@ -0,0 +1,120 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import anyio.to_thread
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+
+import export
+import main
+
+
+class SlowExport:
+    """第二塊要等 release 才產生：用來讓連線在 next() 執行中時中斷"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.in_next = threading.Event()
+        self.closed = threading.Event()
+
+    def stream(self, sessions, fmt, gzip=False):
+        try:
+            yield b'{"sess_uuid": "a"}\n'
+            self.in_next.set()
+            self.release.wait(5)
+            yield b'{"sess_uuid": "b"}\n'
+            yield b'{"sess_uuid": "c"}\n'
+        except GeneratorExit:
+            self.closed.set()
+            raise
+
+
+class ExportDisconnectTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(None)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_export(self, slow):
+        sent = []
+        received = []
+        first_chunk = asyncio.Event()
+
+        async def receive():
+            received.append(True)
+            if len(received) == 1:
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await first_chunk.wait()
+            # 中斷時 producer 執行緒正停在 next() 中
+            await asyncio.get_running_loop().run_in_executor(None, slow.in_next.wait, 5)
+            threading.Timer(0.1, slow.release.set).start()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+            if message["type"] == "http.response.body" and message.get("body"):
+                first_chunk.set()
+
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/api/export",
+            "raw_path": b"/api/export",
+            "root_path": "",
+            "query_string": b"date=2025-10-26",
+            "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 12345),
+            "server": ("testserver", 80),
+        }
+
+        async def run():
+            await main.app(scope, receive, send)
+
+        self.loop.run_until_complete(asyncio.wait_for(run(), 10))
+        return sent
+
+    def check_disconnect(self, abandon_on_cancel):
+        slow = SlowExport()
+        run_sync = anyio.to_thread.run_sync
+
+        async def threadpool_run_sync(func, *args, **kwargs):
+            kwargs.setdefault("abandon_on_cancel", abandon_on_cancel)
+            return await run_sync(func, *args, **kwargs)
+
+        with mock.patch.object(main, "iter_sessions_range", return_value=iter(())), \
+                mock.patch.object(export, "export_stream", slow.stream), \
+                mock.patch.object(anyio.to_thread, "run_sync", threadpool_run_sync):
+            sent = self.run_export(slow)
+
+        bodies = [m.get("body", b"") for m in sent if m["type"] == "http.response.body"]
+        self.assertEqual(bodies[0], b'{"sess_uuid": "a"}\n')
+        self.assertNotIn(b'{"sess_uuid": "c"}\n', bodies)
+
+        # 產生器由 producer 執行緒在 next() 結束後關閉
+        self.assertTrue(slow.closed.wait(5))
+        # 名額已釋放
+        deadline = time.monotonic() + 5
+        while main._export_slots.locked() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(main._export_slots._value, main.EXPORT_MAX_CONCURRENT)
+
+    def test_disconnect_mid_export(self):
+        self.check_disconnect(abandon_on_cancel=False)
+
+    def test_disconnect_mid_export_abandoned_worker(self):
+        # 中斷時不等待執行緒：body() 的 finally 在 next(chunks) 仍在執行時就開始
+        self.check_disconnect(abandon_on_cancel=True)
+
+
+if __name__ == "__main__":
+    unittest.main()